@@ -2,59 +2,113 @@
 Babywise Assistant - Analytics API Router
 
 This module implements the analytics-related API endpoints.
+
+With a thread_id the endpoints return that thread's stats; without one
+they return fleet-wide stats from the global counters, which are kept up
+to date as events are written, so no endpoint scans threads.
 """
 
 import logging
-from typing import Optional
-from datetime import datetime
+from typing import List, Optional
+from datetime import datetime, timedelta
 from fastapi import APIRouter, HTTPException
 from backend.services.analytics_service import (
     get_daily_stats,
     get_weekly_stats,
-    get_pattern_stats
+    get_pattern_stats,
+    get_global_stats
 )
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Longest range the global pattern view sums over
+MAX_PATTERN_DAYS = 90
+
 # Create router
 router = APIRouter()
 
+def _parse_date(date: Optional[str]) -> datetime:
+    """Parse a YYYY-MM-DD query parameter, defaulting to today (UTC)."""
+    if not date:
+        return datetime.utcnow()
+    try:
+        return datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date '{date}', expected YYYY-MM-DD")
+
+def _days(start: datetime, count: int) -> List[str]:
+    return [(start + timedelta(days=offset)).date().isoformat() for offset in range(count)]
+
+async def _global_stats(days: List[str]):
+    stats = await get_global_stats(days)
+    if stats is None:
+        raise HTTPException(status_code=503, detail="Analytics store unavailable")
+    return stats
+
 @router.get("/daily")
-async def get_daily_analytics(date: Optional[str] = None):
+async def get_daily_analytics(date: Optional[str] = None, thread_id: Optional[str] = None, routine_type: str = "sleep"):
     """
     Get daily analytics for a specific date
     """
+    target_date = _parse_date(date)
     try:
-        target_date = datetime.strptime(date, "%Y-%m-%d").date() if date else datetime.now().date()
-        stats = await get_daily_stats(target_date)
-        return stats
+        if thread_id:
+            return await get_daily_stats(thread_id, routine_type, target_date) or {}
+        stats = await _global_stats(_days(target_date, 1))
+        return stats["days"][0]
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting daily analytics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/weekly")
-async def get_weekly_analytics(date: Optional[str] = None):
+async def get_weekly_analytics(date: Optional[str] = None, thread_id: Optional[str] = None, routine_type: str = "sleep"):
     """
     Get weekly analytics for the week containing the specified date
     """
+    target_date = _parse_date(date)
     try:
-        target_date = datetime.strptime(date, "%Y-%m-%d").date() if date else datetime.now().date()
-        stats = await get_weekly_stats(target_date)
+        if thread_id:
+            return await get_weekly_stats(thread_id, routine_type, target_date) or {}
+        week_start = target_date - timedelta(days=target_date.weekday())
+        stats = await _global_stats(_days(week_start, 7))
+        stats["week_start"] = week_start.date().isoformat()
         return stats
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting weekly analytics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/patterns")
-async def get_pattern_analytics():
+async def get_pattern_analytics(thread_id: Optional[str] = None, routine_type: str = "sleep", days: int = 7):
     """
     Get pattern analytics for sleep and feeding routines
     """
     try:
-        stats = await get_pattern_stats()
-        return stats
+        if thread_id:
+            return await get_pattern_stats(thread_id, routine_type) or {}
+        days = max(1, min(days, MAX_PATTERN_DAYS))
+        today = datetime.utcnow()
+        stats = await _global_stats(_days(today - timedelta(days=days - 1), days))
+        totals = stats["totals"]
+        type_hours = [0] * 24
+        for day in stats["days"]:
+            type_hours = [a + b for a, b in zip(type_hours, day["hours_by_type"].get(routine_type, [0] * 24))]
+        return {
+            "days": days,
+            "routine_type": routine_type,
+            "events_by_hour": totals["events_by_hour"],
+            "routine_events_by_hour": type_hours,
+            "events_by_type": totals["events_by_type"],
+            "active_threads": totals["active_threads"],
+            "average_sleep_minutes_per_period": round(totals["sleep_minutes"] / totals["sleep_periods"], 2) if totals["sleep_periods"] else 0
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting pattern analytics: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
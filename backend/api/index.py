@@ -8,6 +8,7 @@ import logging
 import json
 import asyncio
 import contextlib
+import hashlib
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Optional, Any, Union, AsyncGenerator
@@ -39,7 +40,7 @@ logger.info("Using redis.asyncio for Redis operations")
 
 # Now import the rest of the modules
 from fastapi import FastAPI, Request, HTTPException, Depends
-from fastapi.responses import JSONResponse, HTMLResponse, FileResponse
+from fastapi.responses import JSONResponse, HTMLResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
@@ -95,8 +96,11 @@ except Exception as e:
 # Redis connection configuration
 REDIS_URL = os.environ.get("STORAGE_URL", "redis://localhost:6379/0")
 
-# In-memory fallback cache when Redis is unavailable
-_memory_cache = {}
+# In-memory fallback cache when Redis is unavailable (the bounded LRU shared
+# with the Redis service)
+from backend.services.memory_cache import memory_cache as _memory_cache
+from backend.services.single_flight import single_flight_stats
+from backend.services.codec import codec
 
 # Local Backend imports - Redis
 from backend.services.redis_service import (
@@ -106,6 +110,9 @@ from backend.services.redis_service import (
     delete_redis,
     exists_redis,
     ping_redis,
+    get_event_version,
+    get_thread_state_version,
+    get_latest_event_pointer,
 )
 
 @contextlib.asynccontextmanager
@@ -121,18 +128,14 @@ async def redis_connection():
     logger.info(f"[Redis:{connection_id}] Creating Redis connection via redis_service")
     
     try:
-        # Just return the client from redis_service
-        if redis_service.client is not None:
-            logger.info(f"[Redis:{connection_id}] Providing existing redis client from redis_service")
-            yield redis_service.client
-        else:
-            logger.warning(f"[Redis:{connection_id}] Redis client not available from redis_service")
-            yield None
-            
-    except Exception as e:
-        # Connection creation failed
-        logger.error(f"[Redis:{connection_id}] Error providing Redis connection: {e}")
-        yield None
+        # Return the client from redis_service; its circuit breaker yields None
+        # while Redis is failing and records the outcome of this block
+        async with redis_service.connection() as client:
+            if client is not None:
+                logger.info(f"[Redis:{connection_id}] Providing existing redis client from redis_service")
+            else:
+                logger.warning(f"[Redis:{connection_id}] Redis client not available from redis_service")
+            yield client
     finally:
         duration = time.time() - start_time
         logger.info(f"[Redis:{connection_id}] Redis connection operation completed in {duration:.2f}s")
@@ -168,7 +171,9 @@ async def get_thread_state(thread_id: str) -> Optional[Dict[str, Any]]:
     
     # Try Redis first using our service
     try:
-        state = await get_redis(key)
+        # Reads go through the per-process L1 cache, kept coherent across
+        # workers by Redis pub/sub invalidation
+        state = await redis_service.get_thread_state(thread_id)
         if state:
             duration = time.time() - start_time
             logger.info(f"[State:{operation_id}] Successfully retrieved thread state from Redis in {duration:.2f}s: {thread_id}")
@@ -180,9 +185,9 @@ async def get_thread_state(thread_id: str) -> Optional[Dict[str, Any]]:
     
     # Fall back to memory cache
     try:
-        if key in _memory_cache:
+        state = _memory_cache.get(key)
+        if state is not None:
             logger.info(f"[State:{operation_id}] Using memory cache fallback for {key}")
-            state = _memory_cache.get(key)
             duration = time.time() - start_time
             logger.info(f"[State:{operation_id}] Retrieved thread state from memory cache in {duration:.2f}s: {thread_id}")
             return state
@@ -231,7 +236,7 @@ async def save_thread_state(thread_id: str, state: Dict[str, Any]) -> bool:
     
     # Try to save the state using our Redis service with expiration (24 hours)
     try:
-        result = await set_redis(key, serializable_state, 86400)
+        result = await redis_service.save_thread_state(thread_id, serializable_state)
         if result:
             duration = time.time() - start_time
             logger.info(f"[State:{operation_id}] Successfully saved thread state in {duration:.2f}s: {thread_id}")
@@ -239,7 +244,7 @@ async def save_thread_state(thread_id: str, state: Dict[str, Any]) -> bool:
             logger.warning(f"[State:{operation_id}] Failed to save thread state: {thread_id}")
         
         # Always update memory cache
-        _memory_cache[key] = serializable_state
+        _memory_cache.set(key, serializable_state, 86400)
         
         return result
     except Exception as e:
@@ -255,11 +260,11 @@ async def save_thread_state(thread_id: str, state: Dict[str, Any]) -> bool:
             }
             
             # Try saving the simplified state
-            result = await set_redis(key, simplified_state, 86400)
+            result = await redis_service.save_thread_state(thread_id, simplified_state)
             if result:
                 duration = time.time() - start_time
                 logger.info(f"[State:{operation_id}] Saved simplified thread state in {duration:.2f}s: {thread_id}")
-                _memory_cache[key] = simplified_state
+                _memory_cache.set(key, simplified_state, 86400)
                 return True
             else:
                 logger.warning(f"[State:{operation_id}] Failed to save simplified thread state: {thread_id}")
@@ -502,13 +507,71 @@ async def chat(chat_request: ChatRequest):
             "thread_id": chat_request.thread_id or f"thread_{uuid.uuid4().hex[:12]}"
         }
 
+# An ongoing sleep's duration in a summary grows with the clock, not with the
+# event version, so while one is open summary ETags also roll over this often
+SUMMARY_ETAG_WINDOW_SECONDS = 60
+
+def _make_etag(*parts: Any) -> str:
+    """Build a weak ETag from the write version and request parameters."""
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:16]
+    return f'W/"{digest}"'
+
+def _not_modified(request: Request, etag: Optional[str]) -> Optional[Response]:
+    """Return a 304 response if the client already holds this ETag."""
+    if not etag:
+        return None
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    if header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
+
+def _summary_period_start(period: str) -> str:
+    """The UTC date a summary period starts on, so summary ETags change when a new period begins."""
+    today = datetime.now(timezone.utc).date()
+    if period == "week":
+        return (today - timedelta(days=today.weekday())).isoformat()
+    if period == "month":
+        return today.replace(day=1).isoformat()
+    return today.isoformat()
+
+async def _open_sleep_window(thread_id: str) -> Optional[int]:
+    """
+    The current ETag time window if the thread's latest sleep has no later
+    wake-up (two pointer reads), else None. Events without an epoch
+    timestamp count as open.
+    """
+    latest_sleep = await get_latest_event_pointer(thread_id, "sleep")
+    if not latest_sleep:
+        return None
+    latest_wake = await get_latest_event_pointer(thread_id, "sleep_end")
+    sleep_ts = latest_sleep.get("event_ts")
+    wake_ts = latest_wake.get("event_ts") if latest_wake else None
+    if isinstance(sleep_ts, int) and isinstance(wake_ts, int) and wake_ts >= sleep_ts:
+        return None
+    return int(time.time()) // SUMMARY_ETAG_WINDOW_SECONDS
+
+def _with_etag(response: JSONResponse, etag: Optional[str]) -> JSONResponse:
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
 @app.get("/api/chat/context/{thread_id}")
-async def direct_get_context(thread_id: str):
+async def direct_get_context(thread_id: str, request: Request):
     """
     Direct implementation of the context endpoint to bypass import issues.
+    Answers If-None-Match from the thread state version alone.
     """
     logger.info(f"Direct context endpoint called for thread: {thread_id}")
     
+    version = await get_thread_state_version(thread_id)
+    etag = _make_etag("context", thread_id, version) if version is not None else None
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    
     try:
         # Try to use the backend implementation if available
         try:
@@ -536,17 +599,17 @@ async def direct_get_context(thread_id: str):
                             "type": msg_type
                         })
                 
-                return JSONResponse({
+                return _with_etag(JSONResponse({
                     "thread_id": thread_id,
                     "messages": messages,
                     "status": "success"
-                })
+                }), etag)
             else:
-                return JSONResponse({
+                return _with_etag(JSONResponse({
                     "thread_id": thread_id,
                     "messages": [],
                     "status": "success"
-                })
+                }), etag)
                 
         except Exception as e:
             logger.error(f"Error using backend context implementation: {str(e)}")
@@ -621,6 +684,14 @@ except Exception as e:
     logger.error(f"Failed to mount chat router: {str(e)}")
     logger.error(traceback.format_exc())
 
+try:
+    from backend.api.analytics import router as analytics_router
+    app.include_router(analytics_router, prefix="/api/analytics", tags=["analytics"])
+    logger.info("Mounted analytics router")
+except Exception as e:
+    logger.error(f"Failed to mount analytics router: {str(e)}")
+    logger.error(traceback.format_exc())
+
 # Root path handler to serve a simple HTML page
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -695,12 +766,19 @@ async def favicon():
 
 # Direct implementation of routine endpoints
 @app.get("/api/routines/events")
-async def direct_get_events(thread_id: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None):
+async def direct_get_events(request: Request, thread_id: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None):
     """
     Direct implementation of the get events endpoint to bypass import issues.
+    Answers If-None-Match from the thread's event version alone.
     """
     logger.info(f"Direct get events endpoint called for thread: {thread_id}")
     
+    version = await get_event_version(thread_id) if thread_id else None
+    etag = _make_etag("events", thread_id, start_date, end_date, version) if version is not None else None
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    
     try:
         # Try to use the backend implementation if available
         try:
@@ -708,10 +786,10 @@ async def direct_get_events(thread_id: Optional[str] = None, start_date: Optiona
             
             events = await routine_db.get_events(thread_id, start_date, end_date)
             
-            return JSONResponse({
+            return _with_etag(JSONResponse({
                 "events": events,
                 "status": "success"
-            })
+            }), etag)
                 
         except Exception as e:
             logger.error(f"Error using backend get events implementation: {str(e)}")
@@ -729,6 +807,20 @@ async def direct_get_events(thread_id: Optional[str] = None, start_date: Optiona
             "error": str(e)
         })
 
+def _event_args_from_body(body: dict):
+    """Extract add_event arguments from a client event payload."""
+    # Map start_time to event_time (the field expected by routine_db)
+    event_time = body.get("start_time")
+    if not event_time:
+        event_time = body.get("event_time")  # Fallback to event_time if provided
+        
+    # Prepare event_data from notes field if present
+    event_data = body.get("event_data", {})
+    if not event_data and "notes" in body:
+        event_data = {"notes": body.get("notes")}
+        
+    return body.get("thread_id"), body.get("event_type"), event_time, event_data, body.get("local_id")
+
 @app.post("/api/routines/events")
 async def direct_add_event(request: Request):
     """
@@ -743,22 +835,7 @@ async def direct_add_event(request: Request):
         try:
             import backend.db.routine_db as routine_db
             
-            # Extract event data from request body
-            thread_id = body.get("thread_id")
-            event_type = body.get("event_type")
-            
-            # Map start_time to event_time (the field expected by routine_db)
-            event_time = body.get("start_time")
-            if not event_time:
-                event_time = body.get("event_time")  # Fallback to event_time if provided
-                
-            # Prepare event_data from notes field if present
-            event_data = body.get("event_data", {})
-            if not event_data and "notes" in body:
-                event_data = {"notes": body.get("notes")}
-                
-            # Get local_id if present
-            local_id = body.get("local_id")
+            thread_id, event_type, event_time, event_data, local_id = _event_args_from_body(body)
             
             # Log the parameters being passed to add_event
             logger.info(f"Calling add_event with: thread_id={thread_id}, event_type={event_type}, event_time={event_time}")
@@ -791,6 +868,61 @@ async def direct_add_event(request: Request):
             "error": str(e)
         })
 
+# Largest number of events accepted by one batch request
+MAX_EVENT_BATCH_SIZE = int(os.environ.get("MAX_EVENT_BATCH_SIZE", "500"))
+
+@app.post("/api/routines/events/batch")
+async def direct_add_events_batch(request: Request):
+    """
+    Add many routine events in one request.
+
+    Expects {"events": [...]} where each item has the same fields as the
+    single event endpoint. All valid events are written with one Redis
+    pipeline, and the response carries one status per item in request order.
+    """
+    try:
+        body = await request.json()
+        items = body.get("events") if isinstance(body, dict) else None
+        if not isinstance(items, list):
+            return JSONResponse({"status": "error", "error": "events must be a list"}, status_code=400)
+        if len(items) > MAX_EVENT_BATCH_SIZE:
+            return JSONResponse({
+                "status": "error",
+                "error": f"Batch too large: {len(items)} events (max {MAX_EVENT_BATCH_SIZE})"
+            }, status_code=413)
+        logger.info(f"Direct batch add endpoint called with {len(items)} events")
+        
+        import backend.db.routine_db as routine_db
+        
+        events = []
+        for item in items:
+            thread_id, event_type, event_time, event_data, local_id = _event_args_from_body(item if isinstance(item, dict) else {})
+            events.append({
+                "thread_id": thread_id,
+                "event_type": event_type,
+                "event_time": event_time,
+                "event_data": event_data,
+                "local_id": local_id
+            })
+        
+        results = await routine_db.add_events(events)
+        failed = sum(1 for result in results if result["status"] != "success")
+        
+        return JSONResponse({
+            "results": results,
+            "stored": len(results) - failed,
+            "failed": failed,
+            "status": "success" if not failed else "partial"
+        })
+        
+    except Exception as e:
+        logger.error(f"Error in direct batch add endpoint: {str(e)}")
+        logger.error(traceback.format_exc())
+        return JSONResponse({
+            "status": "error",
+            "error": str(e)
+        })
+
 @app.get("/api/routines/events/latest/{thread_id}/{event_type}")
 async def direct_get_latest_event(thread_id: str, event_type: str):
     """
@@ -826,8 +958,155 @@ async def direct_get_latest_event(thread_id: str, event_type: str):
             "error": str(e)
         })
 
+@app.delete("/api/routines/events/{thread_id}/{event_type}/{event_id}")
+async def direct_delete_event(thread_id: str, event_type: str, event_id: str):
+    """
+    Direct implementation of the delete event endpoint.
+    """
+    logger.info(f"Direct delete event endpoint called for thread: {thread_id}, event type: {event_type}, event id: {event_id}")
+    
+    try:
+        import backend.db.routine_db as routine_db
+        
+        deleted = await routine_db.delete_event(thread_id, event_type, event_id)
+        
+        return JSONResponse({
+            "deleted": deleted,
+            "status": "success" if deleted else "error"
+        })
+            
+    except Exception as e:
+        logger.error(f"Error in direct delete event endpoint: {str(e)}")
+        logger.error(traceback.format_exc())
+        
+        # Return a fallback response
+        return JSONResponse({
+            "deleted": False,
+            "status": "error",
+            "error": str(e)
+        })
+
+@app.get("/api/routines/changes")
+async def direct_get_changes(thread_id: str, since: int = 0, limit: int = 500, start_date: Optional[str] = None):
+    """
+    Return the events of a thread that changed after the client's cursor.
+    A client without a cursor, or with one older than the archived events'
+    last changes, gets a snapshot ("snapshot": true) to replace its copy
+    with; start_date limits it to the events from then on, instead of the
+    whole history including archived events.
+    """
+    logger.info(f"Direct get changes endpoint called for thread: {thread_id}, since: {since}, start_date: {start_date}")
+    
+    try:
+        import backend.db.routine_db as routine_db
+        
+        result = await routine_db.get_changes(thread_id, since, limit, start_date)
+        if result is None:
+            return JSONResponse({
+                "changes": [],
+                "cursor": since,
+                "status": "error",
+                "error": "Change feed unavailable"
+            }, status_code=503)
+        
+        result["status"] = "success"
+        return JSONResponse(result)
+            
+    except Exception as e:
+        logger.error(f"Error in direct get changes endpoint: {str(e)}")
+        logger.error(traceback.format_exc())
+        
+        # Return a fallback response
+        return JSONResponse({
+            "changes": [],
+            "cursor": since,
+            "status": "error",
+            "error": str(e)
+        })
+
+@app.get("/api/routines/patterns")
+async def direct_get_patterns(thread_id: str, event_type: str = "sleep", utc_offset_minutes: int = 0):
+    """
+    Return when a thread's events of a type usually happen (and, for sleep,
+    how long naps usually last) from the pattern counters.
+    """
+    logger.info(f"Direct get patterns endpoint called for thread: {thread_id}, event_type: {event_type}")
+    
+    try:
+        import backend.db.routine_db as routine_db
+        
+        result = await routine_db.get_patterns(thread_id, event_type, utc_offset_minutes)
+        if result is None:
+            return JSONResponse({
+                "status": "error",
+                "error": "Patterns unavailable"
+            }, status_code=503)
+        
+        result["status"] = "success"
+        return JSONResponse(result)
+            
+    except Exception as e:
+        logger.error(f"Error in direct get patterns endpoint: {str(e)}")
+        logger.error(traceback.format_exc())
+        
+        return JSONResponse({
+            "status": "error",
+            "error": str(e)
+        })
+
+@app.get("/api/routines/retention")
+async def direct_get_retention_progress():
+    """
+    Return the progress of the event retention job.
+    """
+    try:
+        from backend.services.event_retention import get_retention_progress
+        
+        progress = await get_retention_progress()
+        if progress is None:
+            return JSONResponse({
+                "status": "error",
+                "error": "Retention progress unavailable"
+            }, status_code=503)
+        
+        progress["status"] = "success"
+        return JSONResponse(progress)
+            
+    except Exception as e:
+        logger.error(f"Error in retention progress endpoint: {str(e)}")
+        logger.error(traceback.format_exc())
+        
+        return JSONResponse({
+            "status": "error",
+            "error": str(e)
+        })
+
+@app.post("/api/routines/retention/run")
+async def direct_run_retention():
+    """
+    Run the event retention job for one time-bounded batch, continuing the
+    current pass. Meant to be called on a schedule.
+    """
+    logger.info("Retention run endpoint called")
+    
+    try:
+        from backend.services.event_retention import run_retention
+        
+        result = await run_retention()
+        result["status"] = "success"
+        return JSONResponse(result)
+            
+    except Exception as e:
+        logger.error(f"Error in retention run endpoint: {str(e)}")
+        logger.error(traceback.format_exc())
+        
+        return JSONResponse({
+            "status": "error",
+            "error": str(e)
+        })
+
 # Direct implementation of get_routine_summary
-async def _get_summary(thread_id: str, period: str = "day", force_refresh: bool = True) -> Dict[str, Any]:
+async def _get_summary(thread_id: str, period: str = "day", force_refresh: bool = False) -> Dict[str, Any]:
     """
     Enhanced implementation of the get summary endpoint with isolated Redis operations and timeout handling.
     """
@@ -958,20 +1237,38 @@ async def _get_summary(thread_id: str, period: str = "day", force_refresh: bool
         }
 
 @app.get("/api/routines/summary/{thread_id}")
-async def direct_get_summary(thread_id: str, period: str = "day", force_refresh: bool = True):
+async def direct_get_summary(thread_id: str, request: Request, period: str = "day", force_refresh: bool = False):
     """
     Direct implementation of the get summary endpoint to bypass import issues.
-    Always forces a refresh by default to ensure we get the latest data.
+    Serves the cached summary stale-while-revalidate; pass force_refresh=true
+    to rebuild it before returning.
+    If-None-Match is answered from the thread's event version and the
+    period without building the summary. The ETag sent with a summary is
+    keyed on the event version that summary was built from, so a stale
+    cached copy never carries the current version's ETag. While a sleep is
+    open the ETag also changes every SUMMARY_ETAG_WINDOW_SECONDS.
     """
     logger.info(f"Direct get summary endpoint called for thread: {thread_id}, period: {period}, force_refresh: {force_refresh}")
     
+    period_start = _summary_period_start(period)
+    sleep_window = await _open_sleep_window(thread_id)
+    version = await get_event_version(thread_id)
+    etag = _make_etag("summary", thread_id, period, period_start, sleep_window, version) if version is not None else None
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    
     try:
         summary = await _get_summary(thread_id, period, force_refresh)
         
-        return JSONResponse({
+        response = JSONResponse({
             "summary": summary,
             "status": "success"
         })
+        built_from = (summary.get("cache") or {}).get("event_version")
+        if "error" in summary or built_from is None:
+            return response
+        return _with_etag(response, _make_etag("summary", thread_id, period, period_start, sleep_window, built_from))
             
     except Exception as e:
         logger.error(f"Error in direct get summary endpoint: {str(e)}")
@@ -1054,6 +1351,20 @@ async def health_check():
                 "traceback": traceback.format_exc().split("\n")[-5:]
             }
         
+        # In-process fallback cache usage
+        results["memory_cache"] = _memory_cache.stats()
+        results["l1_cache"] = dict(redis_service.l1.stats(), active=redis_service._l1_active)
+        results["single_flight"] = single_flight_stats()
+        results["codec"] = codec.stats()
+        
+        # Redis circuit breaker; an open circuit means Redis calls are being
+        # short-circuited to the memory fallback
+        breaker = redis_service.breaker.stats()
+        results["services"]["redis_circuit_breaker"] = dict(
+            breaker, status="working" if breaker["state"] == "closed" else "failing"
+        )
+        results["redis_pool"] = redis_service.pool_stats()
+        
         # Check if backend modules are available
         backend_available = False
         try:
@@ -1615,9 +1926,10 @@ async def get_redis_diagnostics() -> Dict[str, Any]:
             try:
                 logger.info(f"[Redis:{diagnostics_id}] Getting Redis server info")
                 
-                if redis_service.client:
+                client = redis_service.client
+                if client:
                     info_start = time.time()
-                    server_info = await redis_service.client.info()
+                    server_info = await client.info()
                     info_duration = time.time() - info_start
                     
                     # Extract version and memory info
@@ -5,17 +5,215 @@
 Database module for handling routine events
 """
 
-import logging
+import os
 import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Union
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Any, Tuple, Union
 from backend.services.redis_service import (
     redis_connection, RedisKeyPrefix, get_with_fallback, set_with_fallback, 
-    delete_with_fallback, add_event_to_thread, list_append
+    delete_with_fallback, list_append, get_events_with_fallback, queue_event_payload,
+    get_cached_with_fallback, set_cached_with_fallback, delete_cached_with_fallback,
+    set_latest_event, get_latest_event_pointer, remove_event_from_thread,
+    write_daily_rollups, get_daily_rollups, write_events, register_local_ids,
+    record_event_changes, get_event_changes, seed_event_changes, get_event_version,
+    adjust_counter_arrays, replace_counter_arrays, get_counter_arrays, get_archived_events
+)
+from backend.services.event_retention import archive_month, month_start
+from backend.services.sleep_pairing import pair_sleep_events
+from backend.services.pattern_engine import (
+    HOURS_PER_WEEK, SLEEP_DURATION_BUCKETS, hour_of_week, duration_bucket,
+    encode_histogram, decode_histogram, histogram_delta, summarize_hours, summarize_durations
 )
+from backend.services.single_flight import single_flight_group
+from backend.services.codec import codec
+from backend.services.analytics_service import record_global_events, record_global_sleep
 
 logger = logging.getLogger(__name__)
 
+# Concurrent identical summary requests share one computation
+_summary_flight = single_flight_group("summaries")
+
+def _parse_event_time(event_time_str: Optional[str]) -> Optional[datetime]:
+    """Parse a stored event time into a naive UTC datetime, or None if unparseable."""
+    if not event_time_str or not isinstance(event_time_str, str):
+        return None
+
+    try:
+        # Handle Z vs +00:00 timezone formats
+        event_dt = datetime.fromisoformat(event_time_str.replace("Z", "+00:00"))
+        if event_dt.tzinfo is not None:
+            event_dt = event_dt.astimezone(timezone.utc).replace(tzinfo=None)
+        return event_dt
+    except ValueError as e:
+        logger.warning(f"Failed to parse event time '{event_time_str}' with fromisoformat: {e}")
+
+    # Try the formats older clients used to send
+    for fmt in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%d %H:%M:%S.%f"):
+        try:
+            return datetime.strptime(event_time_str, fmt)
+        except ValueError:
+            pass
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(event_time_str.split('.')[0], fmt)
+        except ValueError:
+            pass
+
+    logger.error(f"All parsing attempts failed for event time '{event_time_str}'")
+    return None
+
+def _to_epoch(dt: datetime) -> int:
+    """Convert a datetime (naive values are treated as UTC) to epoch seconds."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+def _event_epoch(event: Dict[str, Any]) -> Optional[int]:
+    """
+    Get an event's UTC epoch time.
+
+    Events store it as event_ts at write time; events written before that
+    fall back to parsing event_time.
+    """
+    event_ts = event.get("event_ts")
+    if isinstance(event_ts, int):
+        return event_ts
+    event_dt = _parse_event_time(event.get("event_time"))
+    return _to_epoch(event_dt) if event_dt else None
+
+def _event_datetime(event: Dict[str, Any]) -> Optional[datetime]:
+    """Get an event's time as a naive UTC datetime."""
+    event_ts = _event_epoch(event)
+    return datetime.utcfromtimestamp(event_ts) if event_ts is not None else None
+
+def _to_naive_utc(value: Optional[Union[str, datetime]], label: str) -> Optional[datetime]:
+    """Normalize a date filter argument to a naive UTC datetime."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        parsed = _parse_event_time(value)
+        if parsed is None:
+            logger.warning(f"Invalid {label} format: {value}")
+        return parsed
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _event_id(event_type: str, event_time: str, local_id: Optional[str] = None) -> str:
+    """Build the event ID used in event keys - ensure strings and handle special chars safely."""
+    safe_event_time = str(event_time).replace(':', '-').replace('.', '-').replace(' ', 'T')
+    return f"{safe_event_time}-{local_id or event_type}"
+
+def _match_sleep_periods(
+    sleep_events: List[Dict[str, Any]],
+    sleep_end_events: List[Dict[str, Any]],
+    window_start: datetime,
+    now: datetime,
+    include_ongoing: bool = True
+) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Pair sleep start events with sleep end events.
+
+    Each event time is parsed once and the pairing itself is delegated to the
+    sort-and-sweep engine in backend.services.sleep_pairing.
+
+    Returns:
+        The sleep periods and their total duration in hours
+    """
+    def timed(events: List[Dict[str, Any]]) -> List[Tuple[datetime, Dict[str, Any]]]:
+        timed_events = []
+        for event in events:
+            event_dt = _event_datetime(event)
+            if event_dt is None:
+                logger.warning(f"Skipping sleep event with invalid time: {event.get('event_time')}")
+                continue
+            timed_events.append((event_dt, event))
+        return timed_events
+    
+    return pair_sleep_events(
+        timed(sleep_events), timed(sleep_end_events), window_start, now, include_ongoing
+    )
+
+def _build_event(
+    thread_id: str,
+    event_type: str,
+    event_time: Optional[str],
+    event_data: Optional[Dict[str, Any]] = None,
+    local_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Validate inputs and build the stored event object."""
+    if not thread_id:
+        logger.error("Cannot add event with empty thread_id")
+        raise ValueError("thread_id is required")
+        
+    if not event_type:
+        logger.error("Cannot add event with empty event_type")
+        raise ValueError("event_type is required")
+        
+    # Handle None or empty event_time
+    if not event_time:
+        logger.warning(f"Event time is empty or None, using current UTC time")
+        event_time = datetime.utcnow().isoformat()
+    
+    # Normalize the event time to UTC epoch seconds once, at write time;
+    # event_time keeps the client's original string for display
+    event_dt = _parse_event_time(str(event_time))
+    event_ts = _to_epoch(event_dt) if event_dt else None
+    if event_ts is None:
+        logger.warning(f"Could not parse event time '{event_time}', event will not be time-indexed")
+    
+    return {
+        "thread_id": thread_id,
+        "event_type": event_type,
+        "event_time": event_time,
+        "event_ts": event_ts,
+        "event_data": event_data or {},
+        "local_id": local_id,
+        "event_id": _event_id(event_type, event_time, local_id),
+        "created_at": datetime.utcnow().isoformat()
+    }
+
+def _write_entry(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Describe an event for redis_service.write_events."""
+    return {
+        "thread_id": event["thread_id"],
+        "event_type": event["event_type"],
+        "event_key": f"{RedisKeyPrefix.EVENT}:{event['thread_id']}:{event['event_type']}:{event['event_id']}",
+        "event_ts": event["event_ts"],
+        "event_json": json.dumps(event),
+        "local_id": event.get("local_id")
+    }
+
+async def _store_events(events: List[Dict[str, Any]]) -> Optional[List[Tuple[Dict[str, Any], bool]]]:
+    """
+    Write built events and resolve local_id replays.
+
+    Returns:
+        (stored event, whether it was newly written) per event, or None if the
+        write failed. A replayed event resolves to the event already recorded
+        under its local_id.
+    """
+    entries = [_write_entry(event) for event in events]
+    stored_keys = await write_events(entries)
+    if stored_keys is None:
+        return None
+    
+    replayed = [key for entry, key in zip(entries, stored_keys) if key != entry["event_key"]]
+    existing = dict(zip(replayed, await get_events_with_fallback(replayed))) if replayed else {}
+    
+    stored = []
+    for event, entry, key in zip(events, entries, stored_keys):
+        if key == entry["event_key"]:
+            stored.append((event, True))
+        else:
+            logger.info(f"Event with local_id {event.get('local_id')} already recorded as {key}, skipping write")
+            previous = existing.get(key)
+            stored.append((previous if isinstance(previous, dict) else event, False))
+    return stored
+
 async def add_event(
     thread_id: str,
     event_type: str,
@@ -25,49 +223,25 @@ async def add_event(
 ) -> Dict[str, Any]:
     """Add a routine event to the database."""
     try:
-        # Validate inputs
-        if not thread_id:
-            logger.error("Cannot add event with empty thread_id")
-            raise ValueError("thread_id is required")
-            
-        if not event_type:
-            logger.error("Cannot add event with empty event_type")
-            raise ValueError("event_type is required")
-            
-        # Handle None or empty event_time
-        if not event_time:
-            logger.warning(f"Event time is empty or None, using current UTC time")
-            event_time = datetime.utcnow().isoformat()
-        
-        # Create event object
-        event = {
-            "thread_id": thread_id,
-            "event_type": event_type,
-            "event_time": event_time,
-            "event_data": event_data or {},
-            "local_id": local_id,
-            "created_at": datetime.utcnow().isoformat()
-        }
-        
-        # Generate event ID and key - ensure strings and handle special chars safely
-        safe_event_time = str(event_time).replace(':', '-').replace('.', '-').replace(' ', 'T')
-        event_id = f"{safe_event_time}-{local_id or event_type}"
-        event_key = f"{RedisKeyPrefix.EVENT}:{thread_id}:{event_type}:{event_id}"
+        event = _build_event(thread_id, event_type, event_time, event_data, local_id)
         
-        # Store event in Redis
-        event_json = json.dumps(event)
-        store_success = await set_with_fallback(event_key, event_json)
+        # Store the event, its list entry, time index score and latest-event
+        # pointer; a retried local_id returns the event already recorded
+        stored = await _store_events([event])
         
-        if not store_success:
+        if not stored:
             logger.error(f"Failed to store event for thread {thread_id}")
             raise Exception("Failed to store event")
-            
-        # Add to thread's event list
-        list_success = await add_event_to_thread(thread_id, event_key)
         
-        if not list_success:
-            logger.warning(f"Failed to add event to thread list for {thread_id}")
-            # Continue since the event is still stored
+        event, created = stored[0]
+        if not created:
+            return event
+        
+        await adjust_counter_arrays(_hour_pattern_updates([event], 1))
+        await record_global_events([event])
+        if event["event_ts"] is not None:
+            await _refresh_daily_rollups(thread_id, datetime.utcfromtimestamp(event["event_ts"]))
+        await _invalidate_summaries(thread_id)
             
         logger.info(f"Successfully added {event_type} event for thread {thread_id}")
         return event
@@ -83,60 +257,99 @@ async def add_event(
             "status": "failed"
         }
 
+async def add_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Add a batch of routine events with a single Redis pipeline.
+
+    Each item takes the add_event arguments (thread_id, event_type,
+    event_time, event_data, local_id). Invalid items are reported without
+    failing the rest of the batch.
+
+    Returns:
+        One result per item, in order, with a status of "success" or "failed"
+    """
+    results: List[Dict[str, Any]] = []
+    valid = []
+    for index, item in enumerate(events):
+        try:
+            event = _build_event(
+                item.get("thread_id"),
+                item.get("event_type"),
+                item.get("event_time"),
+                item.get("event_data"),
+                item.get("local_id")
+            )
+            valid.append((index, event))
+            results.append({"index": index, "status": "success"})
+        except Exception as e:
+            results.append({"index": index, "status": "failed", "error": str(e)})
+    
+    if not valid:
+        return results
+    
+    stored = await _store_events([event for _, event in valid])
+    if stored is None:
+        logger.error(f"Failed to store batch of {len(valid)} events")
+        for index, _ in valid:
+            results[index].update({"status": "failed", "error": "Failed to store event"})
+        return results
+    
+    created_events = [event for event, created in stored if created]
+    await adjust_counter_arrays(_hour_pattern_updates(created_events, 1))
+    await record_global_events(created_events)
+    
+    # Refresh the rollups once per thread over the span the batch touched
+    spans: Dict[str, List[datetime]] = {}
+    for (index, _), (event, created) in zip(valid, stored):
+        results[index]["event"] = event
+        if not created:
+            results[index]["replayed"] = True
+        elif event.get("event_ts") is not None:
+            spans.setdefault(event["thread_id"], []).append(datetime.utcfromtimestamp(event["event_ts"]))
+    for thread_id, times in spans.items():
+        await _refresh_daily_rollups(thread_id, min(times), max(times))
+    for thread_id in {event["thread_id"] for (_, event), (_, created) in zip(valid, stored) if created}:
+        await _invalidate_summaries(thread_id)
+    
+    logger.info(f"Added batch of {len(valid)} events ({len(events) - len(valid)} rejected)")
+    return results
+
+async def _backfill_time_index(thread_id: str, backfill: Dict[str, int], local_ids: Dict[str, str]) -> None:
+    """Write the time index and local_id index of a thread that predates them, and mark it indexed."""
+    try:
+        async with redis_connection() as client:
+            if client:
+                pipe = client.pipeline(transaction=False)
+                if backfill:
+                    pipe.zadd(f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}", backfill)
+                pipe.set(f"{RedisKeyPrefix.THREAD_EVENTS_INDEXED}:{thread_id}", "1")
+                await pipe.execute()
+                logger.info(f"Backfilled time index for thread {thread_id} with {len(backfill)} events")
+    except Exception as e:
+        logger.warning(f"Failed to backfill time index for thread {thread_id}: {e}")
+    await register_local_ids(thread_id, local_ids)
+
 async def get_events(
     thread_id: str,
     event_type: Optional[str] = None,
     start_date: Optional[Union[str, datetime]] = None,
     end_date: Optional[Union[str, datetime]] = None
 ) -> List[Dict[str, Any]]:
-    """Get routine events with robust error handling."""
+    """
+    Get routine events with robust error handling.
+
+    Date-range reads go through the thread's time index (one ZRANGEBYSCORE plus
+    one MGET). Threads written before the index existed fall back to the event
+    list, and the index is backfilled from that scan. Ranges reaching back
+    into archived months also read those months' archive blobs.
+    """
     logger.info(f"Getting events for thread {thread_id} with filters: type={event_type}, start={start_date}, end={end_date}")
     
-    # Convert date strings to datetime objects for comparison
-    start_dt = None
-    end_dt = None
-    
-    if start_date:
-        if isinstance(start_date, str):
-            try:
-                # Parse the string to a timezone-aware datetime
-                start_dt = datetime.fromisoformat(start_date.replace("Z", "+00:00"))
-                # Convert to naive datetime in UTC for consistent comparison
-                start_dt = start_dt.replace(tzinfo=None)
-                logger.info(f"Converted start_date string to naive datetime: {start_dt}")
-            except ValueError:
-                logger.warning(f"Invalid start date format: {start_date}")
-        else:
-            # If it's already a datetime, ensure it's timezone-naive
-            if start_date.tzinfo is not None:
-                # Convert to UTC then remove timezone
-                from datetime import timezone
-                start_dt = start_date.astimezone(timezone.utc).replace(tzinfo=None)
-                logger.info(f"Converted timezone-aware start_date to naive: {start_dt}")
-            else:
-                start_dt = start_date
-                logger.info(f"Using naive start_date as is: {start_dt}")
-    
-    if end_date:
-        if isinstance(end_date, str):
-            try:
-                # Parse the string to a timezone-aware datetime
-                end_dt = datetime.fromisoformat(end_date.replace("Z", "+00:00"))
-                # Convert to naive datetime in UTC for consistent comparison
-                end_dt = end_dt.replace(tzinfo=None)
-                logger.info(f"Converted end_date string to naive datetime: {end_dt}")
-            except ValueError:
-                logger.warning(f"Invalid end date format: {end_date}")
-        else:
-            # If it's already a datetime, ensure it's timezone-naive
-            if end_date.tzinfo is not None:
-                # Convert to UTC then remove timezone
-                from datetime import timezone
-                end_dt = end_date.astimezone(timezone.utc).replace(tzinfo=None)
-                logger.info(f"Converted timezone-aware end_date to naive: {end_dt}")
-            else:
-                end_dt = end_date
-                logger.info(f"Using naive end_date as is: {end_dt}")
+    # Convert date filters to epoch seconds for comparison
+    start_dt = _to_naive_utc(start_date, "start date")
+    end_dt = _to_naive_utc(end_date, "end date")
+    start_ts = _to_epoch(start_dt) if start_dt else None
+    end_ts = _to_epoch(end_dt) if end_dt else None
     
     events = []
     try:
@@ -145,134 +358,86 @@ async def get_events(
                 logger.error("Failed to get Redis connection for retrieving events")
                 return []
             
-            # Get the thread's event keys
-            thread_events_key = f"{RedisKeyPrefix.THREAD_EVENTS}:{thread_id}"
-            event_keys = await client.lrange(thread_events_key, 0, -1)
+            # Look up the event keys in the time index first
+            index_key = f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}"
+            indexed_key = f"{RedisKeyPrefix.THREAD_EVENTS_INDEXED}:{thread_id}"
+            min_score = start_ts if start_ts is not None else "-inf"
+            max_score = end_ts if end_ts is not None else "+inf"
+            pipe = client.pipeline(transaction=False)
+            pipe.zrangebyscore(index_key, min_score, max_score)
+            pipe.exists(indexed_key)
+            pipe.zrangebyscore(
+                f"{RedisKeyPrefix.EVENT_ARCHIVE_MONTHS}:{thread_id}",
+                month_start(archive_month(start_ts)) if start_ts is not None else "-inf",
+                max_score
+            )
+            event_keys, is_indexed, archived_months = await pipe.execute()
+            
+            backfill = None
+            if not is_indexed:
+                # Thread predates the time index - scan the full event list once
+                thread_events_key = f"{RedisKeyPrefix.THREAD_EVENTS}:{thread_id}"
+                event_keys = list(dict.fromkeys(await client.lrange(thread_events_key, 0, -1)))
+                backfill = {}
+                local_ids = {}
             
-            if not event_keys:
+            archived = await get_archived_events(thread_id, archived_months) if archived_months else {}
+            if archived:
+                # An event still in the hot store (a retention run that
+                # stopped halfway) is read from there
+                hot_keys = set(event_keys)
+                archived = {key: event for key, event in archived.items() if key not in hot_keys}
+            
+            if not event_keys and not archived:
                 logger.info(f"No events found for thread {thread_id}")
                 return []
             
-            # Debug the event keys
-            logger.info(f"Found {len(event_keys)} event keys for thread {thread_id}")
-            for i, key in enumerate(event_keys):
-                logger.info(f"Event key {i+1}: {key}")
+            logger.info(f"Found {len(event_keys)} candidate event keys and {len(archived)} archived events for thread {thread_id}")
+            
+            # Retrieve all event payloads in a single batched round trip
+            payloads = await get_events_with_fallback(event_keys)
             
-            # Retrieve the actual event data for each key
-            events = []
-            for event_key in event_keys:
+            for event_key, event in list(zip(event_keys, payloads)) + list(archived.items()):
                 try:
-                    # Get the event data from Redis
-                    event_data = await client.get(event_key)
-                    if not event_data:
+                    if not event:
                         logger.warning(f"No event data found for key: {event_key}")
                         continue
                     
-                    # Parse the event data
-                    try:
-                        event = json.loads(event_data)
-                    except json.JSONDecodeError:
+                    if not isinstance(event, dict):
                         logger.warning(f"Error decoding JSON for event key {event_key}")
                         continue
                     
+                    event_ts = _event_epoch(event)
+                    if event_ts is None:
+                        logger.warning(f"Event has missing or invalid event_time, skipping: {event_key}")
+                        continue
+                    
+                    if backfill is not None and event_key not in archived:
+                        backfill[event_key] = event_ts
+                        if event.get("local_id"):
+                            local_ids.setdefault(event["local_id"], event_key)
+                    
                     # Apply type filter if specified
                     if event_type and event.get("event_type") != event_type:
                         continue
                     
-                    # Parse event time for date filtering
-                    try:
-                        event_time_str = event.get("event_time", "")
-                        if not event_time_str:
-                            logger.warning(f"Event missing event_time: {event}")
-                            continue
-                        
-                        logger.info(f"Processing event of type {event.get('event_type')} with time: {event_time_str}")
-                        
-                        # Handle potential None values or format issues
-                        try:
-                            # First try direct parsing of ISO format with timezone handling
-                            if event_time_str.endswith('Z'):
-                                logger.info(f"Converting Z timezone format to +00:00 for event time: {event_time_str}")
-                                event_time_str = event_time_str.replace("Z", "+00:00")
-                                
-                            # Parse to timezone-aware datetime, then convert to naive in UTC for comparison
-                            event_dt = datetime.fromisoformat(event_time_str)
-                            
-                            # If it has timezone info, convert to UTC and remove timezone
-                            if event_dt.tzinfo is not None:
-                                from datetime import timezone
-                                old_dt = event_dt
-                                event_dt = event_dt.astimezone(timezone.utc).replace(tzinfo=None)
-                                logger.info(f"Converted timezone-aware datetime {old_dt} to UTC naive datetime: {event_dt}")
-                            else:
-                                logger.info(f"Event time is already a naive datetime: {event_dt}")
-                                
-                        except (AttributeError, ValueError) as e:
-                            # If that fails, try to handle common format issues
-                            logger.warning(f"Failed to parse event time '{event_time_str}' with fromisoformat: {e}")
-                            
-                            # Try fallback approaches
-                            try:
-                                # If it's None or not a string
-                                if event_time_str is None:
-                                    logger.error("Event time is None, skipping event")
-                                    continue
-                                    
-                                # Try different formats
-                                if 'T' in event_time_str:
-                                    event_dt = datetime.strptime(event_time_str, "%Y-%m-%dT%H:%M:%S.%f")
-                                    logger.info(f"Parsed with ISO format without timezone: {event_dt}")
-                                else:
-                                    event_dt = datetime.strptime(event_time_str, "%Y-%m-%d %H:%M:%S.%f")
-                                    logger.info(f"Parsed with standard datetime format: {event_dt}")
-                                # These are already naive datetimes, no need to modify
-                            except (ValueError, TypeError) as e:
-                                logger.error(f"Could not parse event time '{event_time_str}' with standard formats: {e}")
-                                
-                                # One last attempt with common formats
-                                try:
-                                    if 'T' in event_time_str:
-                                        # Try without milliseconds
-                                        event_dt = datetime.strptime(event_time_str.split('.')[0], "%Y-%m-%dT%H:%M:%S")
-                                        logger.info(f"Parsed with ISO format without milliseconds: {event_dt}")
-                                    else:
-                                        # Try without milliseconds
-                                        event_dt = datetime.strptime(event_time_str.split('.')[0], "%Y-%m-%d %H:%M:%S")
-                                        logger.info(f"Parsed with standard format without milliseconds: {event_dt}")
-                                except (ValueError, TypeError, IndexError):
-                                    # Last resort - skip this event
-                                    logger.error(f"All parsing attempts failed for event time '{event_time_str}', skipping event")
-                                    continue
-                        
-                        # Log filter checks
-                        if start_dt:
-                            logger.info(f"Checking if event time {event_dt} is after start date {start_dt}")
-                            
-                        if end_dt:
-                            logger.info(f"Checking if event time {event_dt} is before end date {end_dt}")
-                            
-                        # Apply date filters
-                        if start_dt and event_dt < start_dt:
-                            logger.info(f"Event time {event_dt} is before start date {start_dt}, skipping")
-                            continue
-                            
-                        if end_dt and event_dt > end_dt:
-                            logger.info(f"Event time {event_dt} is after end date {end_dt}, skipping")
-                            continue
-                        
-                        # Event passed all filters
-                        logger.info(f"Event passed all filters: {event.get('event_type')} at {event_dt}")
-                        events.append(event)
+                    # Apply date filters
+                    if start_ts is not None and event_ts < start_ts:
+                        continue
                         
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"Error parsing event time '{event.get('event_time')}': {e}")
+                    if end_ts is not None and event_ts > end_ts:
                         continue
+                    
+                    events.append((event_ts, event))
                 except Exception as e:
                     logger.warning(f"Error processing event key {event_key}: {e}")
                     continue
         
+        if backfill is not None:
+            await _backfill_time_index(thread_id, backfill, local_ids)
+        
         # Sort events by time
-        sorted_events = sorted(events, key=lambda x: x.get("event_time", ""))
+        sorted_events = [event for _, event in sorted(events, key=lambda x: x[0])]
         logger.info(f"Retrieved {len(sorted_events)} events for thread {thread_id}")
         return sorted_events
         
@@ -280,10 +445,180 @@ async def get_events(
         logger.error(f"Error getting events: {e}")
         return []
 
+async def backfill_event_timestamps(thread_id: str) -> int:
+    """
+    Add the canonical event_ts field to a thread's events written before it
+    existed, and score them in the time index.
+
+    Returns:
+        The number of events updated
+    """
+    try:
+        async with redis_connection() as client:
+            if not client:
+                logger.error("Failed to get Redis connection for backfilling event timestamps")
+                return 0
+            
+            thread_events_key = f"{RedisKeyPrefix.THREAD_EVENTS}:{thread_id}"
+            event_keys = list(dict.fromkeys(await client.lrange(thread_events_key, 0, -1)))
+            payloads = await get_events_with_fallback(event_keys)
+            
+            updated = {}
+            for event_key, event in zip(event_keys, payloads):
+                if not isinstance(event, dict) or isinstance(event.get("event_ts"), int):
+                    continue
+                event_ts = _event_epoch(event)
+                if event_ts is None:
+                    logger.warning(f"Cannot backfill event with invalid event_time: {event_key}")
+                    continue
+                event["event_ts"] = event_ts
+                updated[event_key] = event
+            
+            if not updated:
+                return 0
+            
+            pipe = client.pipeline(transaction=False)
+            for event_key, event in updated.items():
+                queue_event_payload(pipe, event_key, codec.encode(event))
+            pipe.zadd(
+                f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}",
+                {event_key: event["event_ts"] for event_key, event in updated.items()}
+            )
+            await pipe.execute()
+            await record_event_changes(thread_id, list(updated))
+            
+            logger.info(f"Backfilled event_ts for {len(updated)} events in thread {thread_id}")
+            return len(updated)
+    except Exception as e:
+        logger.error(f"Error backfilling event timestamps for thread {thread_id}: {e}")
+        return 0
+
+async def delete_event(thread_id: str, event_type: str, event_id: str) -> bool:
+    """
+    Delete a routine event, moving the latest-event pointer and daily rollups with it.
+
+    Archived events are read-only: an event the retention job has moved into
+    an archive blob (even one still in the hot store after a run that stopped
+    halfway) is not deleted, and False is returned, as for a missing event.
+    """
+    try:
+        event_key = f"{RedisKeyPrefix.EVENT}:{thread_id}:{event_type}:{event_id}"
+        event = (await get_events_with_fallback([event_key]))[0]
+        if not isinstance(event, dict):
+            logger.warning(f"No {event_type} event {event_id} in the hot store of thread {thread_id} to delete")
+            return False
+        event_dt = _event_datetime(event)
+        if event_dt and event_key in await get_archived_events(thread_id, [archive_month(_to_epoch(event_dt))]):
+            logger.warning(f"{event_type} event {event_id} of thread {thread_id} is archived and can't be deleted")
+            return False
+        removed = await remove_event_from_thread(thread_id, event_type, event_key, event.get("local_id"))
+        if removed:
+            logger.info(f"Deleted {event_type} event {event_id} for thread {thread_id}")
+            if event_dt:
+                await adjust_counter_arrays(_hour_pattern_updates([event], -1))
+                await record_global_events([event], -1)
+                await _refresh_daily_rollups(thread_id, event_dt)
+            await _invalidate_summaries(thread_id)
+        else:
+            logger.warning(f"Failed to delete {event_type} event {event_id} for thread {thread_id}")
+        return removed
+    except Exception as e:
+        logger.error(f"Error deleting event: {e}")
+        return False
+
+# Default and maximum page size for the change feed
+CHANGES_PAGE_SIZE = 500
+
+async def get_changes(
+    thread_id: str,
+    since: int = 0,
+    limit: int = CHANGES_PAGE_SIZE,
+    start_date: Optional[Union[str, datetime]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Get the events of a thread that changed after a sync cursor.
+
+    Every event write, update and delete advances the thread's change
+    sequence, so a client that keeps the returned cursor only receives new
+    activity. The log covers events in the hot store: archiving takes an
+    event out of it without a change, as the event still exists.
+
+    A cursor of 0, or one older than the last change of an archived event,
+    gets a snapshot instead: every event including archived ones, or with
+    start_date only the events from start_date on, as upserts in one page
+    with the current cursor and "snapshot" set. The client replaces its copy
+    with it.
+
+    Returns:
+        The changes in sequence order, each either an "upsert" with the event
+        or a "delete" with its event_type and event_id, plus the next cursor.
+        None if Redis is unavailable.
+    """
+    limit = max(1, min(limit, CHANGES_PAGE_SIZE))
+    result = await get_event_changes(thread_id, since, limit)
+    if result is None:
+        return None
+    
+    if not result["seeded"]:
+        # Events written before the change log existed: make sure the time
+        # index is backfilled, enter it into the log and read again
+        await get_events(thread_id)
+        await seed_event_changes(thread_id)
+        result = await get_event_changes(thread_id, since, limit)
+        if result is None:
+            return None
+    
+    if since == 0 or since < result["trimmed_seq"]:
+        # Read the cursor before the events, so anything written in between
+        # is sent again on the next sync rather than missed
+        cursor = await get_event_version(thread_id)
+        if cursor is None:
+            return None
+        events = await get_events(thread_id, start_date=_to_naive_utc(start_date, "start date"))
+        return {
+            "thread_id": thread_id,
+            "since": since,
+            "cursor": cursor,
+            "has_more": False,
+            "snapshot": True,
+            "changes": [{"seq": cursor, "op": "upsert", "event": event} for event in events]
+        }
+    
+    event_keys = [key for key, _ in result["changes"]]
+    payloads = await get_events_with_fallback(event_keys) if event_keys else []
+    key_prefix = f"{RedisKeyPrefix.EVENT}:{thread_id}:"
+    
+    changes = []
+    for (event_key, seq), event in zip(result["changes"], payloads):
+        if isinstance(event, dict):
+            changes.append({"seq": seq, "op": "upsert", "event": event})
+        else:
+            event_type, _, event_id = event_key[len(key_prefix):].partition(":")
+            changes.append({"seq": seq, "op": "delete", "event_type": event_type, "event_id": event_id})
+    
+    return {
+        "thread_id": thread_id,
+        "since": since,
+        "cursor": changes[-1]["seq"] if changes else since,
+        "has_more": result["has_more"],
+        "snapshot": False,
+        "changes": changes
+    }
+
 async def get_latest_event(thread_id: str, event_type: str) -> Optional[Dict[str, Any]]:
-    """Get the latest event of a specific type for a thread with improved error handling."""
+    """
+    Get the latest event of a specific type for a thread with improved error handling.
+
+    Reads the per-type latest-event pointer (one HGET). Threads written before
+    pointers existed are scanned once and the pointer is seeded from the result.
+    """
     try:
-        # Get events filtered by type
+        latest = await get_latest_event_pointer(thread_id, event_type)
+        if latest:
+            logger.info(f"Found latest {event_type} event for thread {thread_id}: {latest.get('event_time')}")
+            return latest
+        
+        # No pointer yet - get events filtered by type
         events = await get_events(thread_id=thread_id, event_type=event_type)
         
         if not events:
@@ -291,20 +626,548 @@ async def get_latest_event(thread_id: str, event_type: str) -> Optional[Dict[str
             return None
         
         # Find the latest event by time
-        latest = max(events, key=lambda x: x.get("event_time", ""))
+        latest = max(events, key=_event_epoch)
         logger.info(f"Found latest {event_type} event for thread {thread_id}: {latest.get('event_time')}")
+        
+        # Seed the pointer so the next lookup is a single read
+        event_id = latest.get("event_id") or _event_id(event_type, latest.get("event_time"), latest.get("local_id"))
+        event_key = f"{RedisKeyPrefix.EVENT}:{thread_id}:{event_type}:{event_id}"
+        event_ts = _event_epoch(latest)
+        await set_latest_event(thread_id, event_type, event_key, event_ts, json.dumps(latest))
         return latest
         
     except Exception as e:
         logger.error(f"Error getting latest event: {e}")
         return None
 
+async def _invalidate_summaries(thread_id: str) -> None:
+    """
+    Mark a thread's cached summaries as out of date after its events change.
+    They keep being served until rebuilt, per the stale-while-revalidate policy.
+    """
+    await set_cached_with_fallback(
+        f"{RedisKeyPrefix.ROUTINE_SUMMARY_STALE}:{thread_id}",
+        str(time.time()),
+        max(hard_ttl for _, hard_ttl in SUMMARY_CACHE_TTLS.values())
+    )
+
+# Periods answered from the per-day rollup buckets instead of raw events
+ROLLUP_PERIODS = ("week", "month")
+
+def _compute_daily_rollups(events: List[Dict[str, Any]], now: datetime) -> Dict[str, Dict[str, Any]]:
+    """
+    Aggregate events into per-day buckets keyed by ISO date.
+
+    Sleep periods are attributed to the day they start on; ongoing sleep is
+    left out because it depends on the read time.
+    """
+    rollups: Dict[str, Dict[str, Any]] = {}
+    sleep_events = []
+    sleep_end_events = []
+    
+    for event in events:
+        event_ts = _event_epoch(event)
+        if event_ts is None:
+            continue
+        event_dt = datetime.utcfromtimestamp(event_ts)
+        bucket = rollups.setdefault(event_dt.date().isoformat(), {
+            "event_count": 0, "feed_count": 0, "sleep_periods": 0, "sleep_minutes": 0.0,
+            "first_ts": event_ts, "last_ts": event_ts
+        })
+        bucket["event_count"] += 1
+        bucket["first_ts"] = min(bucket["first_ts"], event_ts)
+        bucket["last_ts"] = max(bucket["last_ts"], event_ts)
+        
+        event_type = event.get("event_type")
+        if event_type in ["feed", "feeding"]:
+            bucket["feed_count"] += 1
+        elif event_type == "sleep":
+            sleep_events.append(event)
+        elif event_type == "sleep_end":
+            sleep_end_events.append(event)
+    
+    sleep_periods, _ = _match_sleep_periods(
+        sleep_events, sleep_end_events, datetime.min, now, include_ongoing=False
+    )
+    histograms: Dict[str, List[int]] = {}
+    for period in sleep_periods:
+        period_start = _parse_event_time(period["start"])
+        period_end = _parse_event_time(period["end"])
+        bucket = rollups.get(period_start.date().isoformat())
+        if bucket is None:
+            # Virtual start on a day without events of its own
+            start_ts = _to_epoch(period_start)
+            bucket = rollups.setdefault(period_start.date().isoformat(), {
+                "event_count": 0, "feed_count": 0, "sleep_periods": 0, "sleep_minutes": 0.0,
+                "first_ts": start_ts, "last_ts": start_ts
+            })
+        minutes = (period_end - period_start).total_seconds() / 60
+        bucket["sleep_periods"] += 1
+        bucket["sleep_minutes"] = round(bucket["sleep_minutes"] + minutes, 2)
+        histogram = histograms.setdefault(period_start.date().isoformat(), [0] * SLEEP_DURATION_BUCKETS)
+        histogram[duration_bucket(minutes)] += 1
+    
+    # Sleep duration histogram per day, so refreshes can adjust the
+    # thread's duration pattern by the difference
+    for day, histogram in histograms.items():
+        rollups[day]["sleep_hist"] = encode_histogram(histogram)
+    
+    return rollups
+
+async def _refresh_daily_rollups(thread_id: str, first_dt: datetime, last_dt: Optional[datetime] = None) -> None:
+    """
+    Recompute the buckets around written or deleted events.
+
+    Only the touched days and their neighbours can change (sleep pairs span
+    at most 24 hours), so this reads the touched span plus two days on each
+    side through the time index and rewrites the touched days plus one on
+    each side.
+    """
+    try:
+        first_day = first_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        last_day = (last_dt or first_dt).replace(hour=0, minute=0, second=0, microsecond=0)
+        events = await get_events(
+            thread_id=thread_id,
+            start_date=first_day - timedelta(days=2),
+            end_date=last_day + timedelta(days=3) - timedelta(microseconds=1)
+        )
+        rollups = _compute_daily_rollups(events, datetime.utcnow())
+        affected_days = [
+            (first_day + timedelta(days=offset)).date().isoformat()
+            for offset in range(-1, (last_day - first_day).days + 2)
+        ]
+        previous = await get_daily_rollups(thread_id, affected_days)
+        refreshed = {day: rollups.get(day, {}) for day in affected_days}
+        if await write_daily_rollups(thread_id, refreshed) and previous is not None:
+            await _apply_rollup_changes(thread_id, affected_days, previous, [refreshed[day] for day in affected_days])
+    except Exception as e:
+        logger.error(f"Error refreshing daily rollups for thread {thread_id}: {e}")
+
+async def _ensure_daily_rollups(thread_id: str) -> bool:
+    """Build the buckets from the full history once for threads that predate them."""
+    ready_key = f"{RedisKeyPrefix.ROUTINE_DAILY_READY}:{thread_id}"
+    if await get_with_fallback(ready_key):
+        return True
+    
+    logger.info(f"Backfilling daily rollups for thread {thread_id}")
+    events = await get_events(thread_id=thread_id)
+    rollups = _compute_daily_rollups(events, datetime.utcnow())
+    if not await _write_backfilled_rollups(thread_id, rollups):
+        return False
+    await set_with_fallback(ready_key, "1")
+    logger.info(f"Backfilled {len(rollups)} daily rollups for thread {thread_id}")
+    return True
+
+async def _write_backfilled_rollups(thread_id: str, rollups: Dict[str, Dict[str, Any]]) -> bool:
+    """
+    Write buckets built from a thread's full history, moving the derived
+    counters (fleet-wide sleep totals included) by the change from the
+    buckets they replace, so a thread's history is counted once however
+    many of its days were already bucketed.
+    """
+    days = sorted(rollups)
+    previous = await get_daily_rollups(thread_id, days)
+    if not await write_daily_rollups(thread_id, rollups):
+        return False
+    if previous is not None and days:
+        await _apply_rollup_changes(thread_id, days, previous, [rollups[day] for day in days])
+    return True
+
+def _pattern_hours_key(thread_id: str, event_type: str) -> str:
+    return f"{RedisKeyPrefix.PATTERN_HOURS}:{thread_id}:{event_type}"
+
+def _pattern_durations_key(thread_id: str) -> str:
+    return f"{RedisKeyPrefix.PATTERN_DURATIONS}:{thread_id}:sleep"
+
+def _hour_pattern_updates(events: List[Dict[str, Any]], delta: int) -> Dict[str, Dict[int, int]]:
+    """Hour-of-week slot deltas for written (+1) or deleted (-1) events."""
+    updates: Dict[str, Dict[int, int]] = {}
+    for event in events:
+        event_dt = _event_datetime(event)
+        if event_dt is None:
+            continue
+        slots = updates.setdefault(_pattern_hours_key(event["thread_id"], event["event_type"]), {})
+        slot = hour_of_week(event_dt)
+        slots[slot] = slots.get(slot, 0) + delta
+    return updates
+
+async def _apply_rollup_changes(
+    thread_id: str,
+    days: List[str],
+    previous: List[Dict[str, Any]],
+    refreshed: List[Dict[str, Any]]
+) -> None:
+    """
+    Move the counters derived from the day buckets by the change between the
+    buckets before and after a refresh: the thread's sleep duration
+    histogram and the fleet-wide daily sleep totals.
+    """
+    before = [0] * SLEEP_DURATION_BUCKETS
+    after = [0] * SLEEP_DURATION_BUCKETS
+    sleep_changes = {}
+    for day, old, new in zip(days, previous, refreshed):
+        before = [a + b for a, b in zip(before, decode_histogram(old.get("sleep_hist")))]
+        after = [a + b for a, b in zip(after, decode_histogram(new.get("sleep_hist")))]
+        sleep_changes[day] = (
+            float(new.get("sleep_minutes", 0)) - float(old.get("sleep_minutes", 0)),
+            int(new.get("sleep_periods", 0)) - int(old.get("sleep_periods", 0))
+        )
+    await adjust_counter_arrays({_pattern_durations_key(thread_id): histogram_delta(before, after)})
+    sleeping_days = [day for day, new in zip(days, refreshed) if int(new.get("sleep_periods", 0))]
+    await record_global_sleep(thread_id, sleep_changes, sleeping_days)
+
+async def _ensure_routine_patterns(thread_id: str) -> bool:
+    """
+    Build the pattern counters from the full history once for threads that
+    predate them. The daily buckets are rewritten from the same pass so each
+    carries the sleep histogram later refreshes take their deltas from.
+    """
+    ready_key = f"{RedisKeyPrefix.PATTERNS_READY}:{thread_id}"
+    if await get_with_fallback(ready_key):
+        return True
+    
+    logger.info(f"Backfilling routine patterns for thread {thread_id}")
+    events = await get_events(thread_id=thread_id)
+    rollups = _compute_daily_rollups(events, datetime.utcnow())
+    if not await _write_backfilled_rollups(thread_id, rollups):
+        return False
+    
+    arrays: Dict[str, List[int]] = {}
+    for event in events:
+        event_dt = _event_datetime(event)
+        if event_dt is None or not event.get("event_type"):
+            continue
+        counts = arrays.setdefault(_pattern_hours_key(thread_id, event["event_type"]), [0] * HOURS_PER_WEEK)
+        counts[hour_of_week(event_dt)] += 1
+    durations = [0] * SLEEP_DURATION_BUCKETS
+    for bucket in rollups.values():
+        durations = [a + b for a, b in zip(durations, decode_histogram(bucket.get("sleep_hist")))]
+    arrays[_pattern_durations_key(thread_id)] = durations
+    if not await replace_counter_arrays(arrays):
+        return False
+    
+    await set_with_fallback(f"{RedisKeyPrefix.ROUTINE_DAILY_READY}:{thread_id}", "1")
+    await set_with_fallback(ready_key, "1")
+    logger.info(f"Backfilled routine patterns from {len(events)} events for thread {thread_id}")
+    return True
+
+async def get_patterns(thread_id: str, event_type: str = "sleep", utc_offset_minutes: int = 0) -> Optional[Dict[str, Any]]:
+    """
+    Get when events of a type usually happen, from the hour-of-week counters,
+    and for sleep how long periods usually last.
+
+    Reads a fixed number of counters regardless of history length.
+
+    Args:
+        thread_id: The thread to describe
+        event_type: The event type, e.g. "sleep" or "feeding"
+        utc_offset_minutes: The parent's UTC offset, so hours are reported in local time
+
+    Returns:
+        The hour and duration summaries, or None if Redis is unavailable
+    """
+    if not await _ensure_routine_patterns(thread_id):
+        return None
+    
+    hours_key = _pattern_hours_key(thread_id, event_type)
+    arrays = {hours_key: HOURS_PER_WEEK}
+    if event_type == "sleep":
+        arrays[_pattern_durations_key(thread_id)] = SLEEP_DURATION_BUCKETS
+    counters = await get_counter_arrays(arrays)
+    if counters is None:
+        return None
+    
+    result = {
+        "thread_id": thread_id,
+        "event_type": event_type,
+        "hours": summarize_hours(counters[hours_key], utc_offset_minutes)
+    }
+    if event_type == "sleep":
+        result["durations"] = summarize_durations(counters[_pattern_durations_key(thread_id)])
+    return result
+
+async def _window_boundary_sleep(
+    thread_id: str,
+    window_start: datetime,
+    now: datetime
+) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Sleep periods that start before window_start and end inside the window,
+    clamped to start at window_start. Pairs cover at most 24 hours, so the
+    day on each side of the boundary holds every candidate.
+
+    Returns:
+        The clamped periods and their total duration in minutes
+    """
+    events = await get_events(
+        thread_id=thread_id,
+        start_date=window_start - timedelta(days=1),
+        end_date=min(now, window_start + timedelta(days=1))
+    )
+    sleep_periods, _ = _match_sleep_periods(
+        [e for e in events if e.get("event_type") == "sleep"],
+        [e for e in events if e.get("event_type") == "sleep_end"],
+        datetime.min, now, include_ongoing=False
+    )
+    clamped = []
+    minutes = 0.0
+    for period in sleep_periods:
+        period_start = _parse_event_time(period["start"])
+        period_end = _parse_event_time(period["end"])
+        if period_start is None or period_end is None or not period_start < window_start <= period_end:
+            continue
+        if period_end <= now:
+            minutes += (period_end - window_start).total_seconds() / 60
+            clamped.append({
+                **period,
+                "start": window_start.isoformat(),
+                "duration": round((period_end - window_start).total_seconds() / 3600, 2),
+                "start_id": None,
+                "is_virtual": True
+            })
+    return clamped, minutes
+
+async def _latest_feed_in_window(thread_id: str, start_date: datetime, now: datetime) -> Optional[Dict[str, Any]]:
+    """
+    The latest feeding between start_date and now, from the all-time
+    latest-event pointers. Only if a pointer is ahead of now are the
+    window's feedings read.
+    """
+    latest, latest_dt, ahead = None, None, False
+    for event_type in ("feeding", "feed"):
+        event = await get_latest_event(thread_id, event_type)
+        event_dt = _event_datetime(event) if event else None
+        if event_dt is None or event_dt < start_date:
+            continue
+        if event_dt > now:
+            ahead = True
+        elif latest_dt is None or event_dt > latest_dt:
+            latest, latest_dt = event, event_dt
+    if ahead:
+        events = await get_events(thread_id=thread_id, start_date=start_date, end_date=now)
+        feeds = [e for e in events if e.get("event_type") in ["feed", "feeding"]]
+        return feeds[-1] if feeds else None
+    return latest
+
+async def _get_rollup_summary(
+    thread_id: str,
+    period: str,
+    period_name: str,
+    start_date: datetime,
+    now: datetime
+) -> Optional[Dict[str, Any]]:
+    """
+    Build a period summary by summing per-day buckets (at most 31 reads in
+    one pipeline), plus the latest-event pointers for ongoing sleep and the
+    two days around the window start for sleep that crosses it.
+
+    Totals and the latest feeding match a raw-event summary of the period.
+    Unlike it, the "events" lists are not every event of the period: sleep
+    lists only ongoing sleep and sleep crossing the window start, and
+    feeding is empty. The per-day counts are under "daily", and
+    "source" is "daily_rollups".
+
+    Returns:
+        The summary, or None if the buckets are unavailable
+    """
+    if not await _ensure_daily_rollups(thread_id):
+        return None
+    
+    days = [
+        (start_date + timedelta(days=offset)).date().isoformat()
+        for offset in range((now.date() - start_date.date()).days + 1)
+    ]
+    buckets = await get_daily_rollups(thread_id, days)
+    if buckets is None:
+        return None
+    
+    total_sleep_minutes = 0.0
+    total_sleep_periods = 0
+    total_feeds = 0
+    daily = []
+    for day, bucket in zip(days, buckets):
+        if not bucket:
+            continue
+        sleep_minutes = float(bucket.get("sleep_minutes", 0))
+        sleep_count = int(bucket.get("sleep_periods", 0))
+        feed_count = int(bucket.get("feed_count", 0))
+        total_sleep_minutes += sleep_minutes
+        total_sleep_periods += sleep_count
+        total_feeds += feed_count
+        daily.append({
+            "date": day,
+            "sleep_minutes": sleep_minutes,
+            "sleep_periods": sleep_count,
+            "feed_count": feed_count,
+            "first_event": datetime.utcfromtimestamp(int(bucket["first_ts"])).isoformat(),
+            "last_event": datetime.utcfromtimestamp(int(bucket["last_ts"])).isoformat()
+        })
+    
+    # Sleep the buckets attribute to the day before the window but that ends
+    # inside it is counted from the window start, as a raw-event summary would
+    sleep_periods, boundary_minutes = await _window_boundary_sleep(thread_id, start_date, now)
+    if sleep_periods:
+        total_sleep_minutes += boundary_minutes
+        total_sleep_periods += len(sleep_periods)
+        first_day = start_date.date().isoformat()
+        if daily and daily[0]["date"] == first_day:
+            daily[0]["sleep_minutes"] = round(daily[0]["sleep_minutes"] + boundary_minutes, 2)
+            daily[0]["sleep_periods"] += len(sleep_periods)
+
+    total_sleep_duration = total_sleep_minutes / 60
+
+    # Ongoing sleep depends on the current time, so it comes from the pointers
+    latest_sleep = await get_latest_event(thread_id, "sleep")
+    latest_wake = await get_latest_event(thread_id, "sleep_end")
+    latest_sleep_dt = _event_datetime(latest_sleep) if latest_sleep else None
+    latest_wake_dt = _event_datetime(latest_wake) if latest_wake else None
+    if latest_sleep_dt and latest_sleep_dt >= start_date and (latest_wake_dt is None or latest_wake_dt < latest_sleep_dt):
+        time_since_sleep = now - latest_sleep_dt
+        if time_since_sleep.total_seconds() < 12 * 3600:
+            duration_hours = time_since_sleep.total_seconds() / 3600
+            total_sleep_duration += duration_hours
+            total_sleep_periods += 1
+            sleep_periods.append({
+                "start": latest_sleep.get("event_time"),
+                "end": None,  # Ongoing sleep
+                "duration": round(duration_hours, 2),
+                "start_id": latest_sleep.get("local_id"),
+                "end_id": None,
+                "is_ongoing": True
+            })
+    
+    latest_feed = await _latest_feed_in_window(thread_id, start_date, now)
+    avg_sleep_duration = total_sleep_duration / total_sleep_periods if total_sleep_periods else 0
+    
+    return {
+        "period": period,
+        "period_name": period_name,
+        "start_date": start_date.isoformat(),
+        "end_date": now.isoformat(),
+        "thread_id": thread_id,
+        "source": "daily_rollups",
+        "routines": {
+            "sleep": {
+                "total_events": total_sleep_periods,
+                "total_duration": round(total_sleep_duration, 2),
+                "average_duration": round(avg_sleep_duration, 2),
+                "latest_event": sleep_periods[-1] if sleep_periods else None,
+                "events": sleep_periods
+            },
+            "feeding": {
+                "total_events": total_feeds,
+                "latest_event": latest_feed,
+                "events": []
+            }
+        },
+        "daily": daily
+    }
+
+# Seconds a cached summary is served without revalidation (soft) and served
+# at all (hard), per period. Between the two, the cached copy is returned
+# immediately while a background task rebuilds it.
+SUMMARY_CACHE_TTLS = {
+    "day": (int(os.environ.get("SUMMARY_DAY_SOFT_TTL", "30")), int(os.environ.get("SUMMARY_DAY_HARD_TTL", "600"))),
+    "week": (int(os.environ.get("SUMMARY_WEEK_SOFT_TTL", "120")), int(os.environ.get("SUMMARY_WEEK_HARD_TTL", "1800"))),
+    "month": (int(os.environ.get("SUMMARY_MONTH_SOFT_TTL", "300")), int(os.environ.get("SUMMARY_MONTH_HARD_TTL", "3600")))
+}
+
+# Background revalidation tasks by thread and period, kept referenced until they finish
+_revalidations: Dict[str, asyncio.Task] = {}
+
 async def get_summary(thread_id: str, period: str = "day", force_refresh: bool = False) -> Dict[str, Any]:
-    """Get a summary of routine events for a thread with enhanced error handling."""
+    """
+    Get a summary of routine events for a thread.
+
+    With force_refresh the summary is rebuilt. Otherwise the cached summary
+    is served stale-while-revalidate: within the period's soft TTL it is
+    returned as is; after the soft TTL, or once the thread's events have
+    changed, it is still returned but rebuilt in the background; past the
+    hard TTL it is rebuilt before returning. Concurrent requests for the
+    same summary share one computation.
+
+    The summary's "cache" field gives its status, age and the thread event
+    version it was built from.
+    """
+    if force_refresh:
+        return await _summary_flight.do(
+            f"{thread_id}:{period}",
+            lambda: _build_and_cache_summary(thread_id, period)
+        )
+    
+    soft_ttl, hard_ttl = SUMMARY_CACHE_TTLS.get(period, SUMMARY_CACHE_TTLS["day"])
+    cache_key = f"{RedisKeyPrefix.ROUTINE_SUMMARY}:{thread_id}:{period}"
+    cached = await get_cached_with_fallback(cache_key)
+    
+    if isinstance(cached, dict) and isinstance(cached.get("summary"), dict) and "generated_at" in cached:
+        age = time.time() - cached["generated_at"]
+        if age < hard_ttl:
+            changed_at = await get_cached_with_fallback(f"{RedisKeyPrefix.ROUTINE_SUMMARY_STALE}:{thread_id}")
+            stale = age >= soft_ttl or (changed_at is not None and float(changed_at) > cached["generated_at"])
+            if stale:
+                _schedule_summary_revalidation(thread_id, period)
+            logger.info(f"Serving {'stale' if stale else 'fresh'} cached {period} summary for thread {thread_id} ({age:.0f}s old)")
+            # The cached entry can be shared with other callers (in-process cache)
+            summary = dict(cached["summary"])
+            summary["cache"] = {
+                "status": "stale" if stale else "fresh",
+                "age_seconds": round(age, 1),
+                "event_version": cached.get("event_version")
+            }
+            return summary
+    
+    return await _summary_flight.do(
+        f"{thread_id}:{period}",
+        lambda: _build_and_cache_summary(thread_id, period)
+    )
+
+async def _build_and_cache_summary(thread_id: str, period: str) -> Dict[str, Any]:
+    """
+    Rebuild a summary and store it with the time the rebuild started and the
+    thread's event version read before it, which the summary covers at least.
+    """
+    started_at = time.time()
+    event_version = await get_event_version(thread_id)
+    summary = await _generate_summary(thread_id, period)
+    if "error" in summary:
+        return summary
+    _, hard_ttl = SUMMARY_CACHE_TTLS.get(period, SUMMARY_CACHE_TTLS["day"])
+    try:
+        # Convert datetime objects to strings for proper serialization
+        serializable_summary = json.loads(json.dumps(summary, default=str))
+        await set_cached_with_fallback(
+            f"{RedisKeyPrefix.ROUTINE_SUMMARY}:{thread_id}:{period}",
+            {"generated_at": started_at, "event_version": event_version, "summary": serializable_summary},
+            hard_ttl
+        )
+    except Exception as e:
+        logger.error(f"Error caching summary: {str(e)}")
+    return {**summary, "cache": {"status": "fresh", "age_seconds": 0.0, "event_version": event_version}}
+
+def _schedule_summary_revalidation(thread_id: str, period: str) -> None:
+    """Rebuild a cached summary in the background, once per thread and period."""
+    async def revalidate():
+        try:
+            await _summary_flight.do(
+                f"{thread_id}:{period}",
+                lambda: _build_and_cache_summary(thread_id, period)
+            )
+        except Exception as e:
+            logger.error(f"Error revalidating {period} summary for thread {thread_id}: {e}")
+    
+    key = f"{thread_id}:{period}"
+    if key in _revalidations:
+        return
+    task = asyncio.get_running_loop().create_task(revalidate())
+    _revalidations[key] = task
+    task.add_done_callback(lambda _: _revalidations.pop(key, None))
+
+async def _generate_summary(thread_id: str, period: str = "day", now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Build a summary of routine events for a thread with enhanced error handling."""
     try:
         # Calculate time range based on period
-        now = datetime.utcnow()
-        logger.info(f"Generating {period} summary for thread {thread_id}, force_refresh={force_refresh}")
+        now = now or datetime.utcnow()
+        logger.info(f"Generating {period} summary for thread {thread_id}")
         logger.info(f"Current server time (UTC): {now.isoformat()}")
         
         if period == "day":
@@ -324,31 +1187,13 @@ async def get_summary(thread_id: str, period: str = "day", force_refresh: bool =
         
         logger.info(f"Generating {period} summary for thread {thread_id} from {start_date.isoformat()} to {now.isoformat()}")
         
-        # Try to get cached summary first if not forcing refresh
-        cache_key = f"{RedisKeyPrefix.ROUTINE_SUMMARY}:{thread_id}:{period}"
-        
-        if force_refresh:
-            logger.info(f"Force refreshing summary for thread {thread_id}")
-            # Force clear any existing cache
-            await delete_with_fallback(cache_key)
-            logger.info(f"Cleared cache for key: {cache_key}")
-        else:
-            logger.info(f"Checking for cached summary with key: {cache_key}")
-            cached_summary = await get_with_fallback(cache_key)
-            if cached_summary:
-                logger.info(f"Found cached summary for thread {thread_id}, period {period}")
-                # Validate the cached summary structure
-                if "routines" in cached_summary:
-                    sleep_data = cached_summary.get("routines", {}).get("sleep", {})
-                    feed_data = cached_summary.get("routines", {}).get("feeding", {})
-                    logger.info(f"Cached summary has {sleep_data.get('total_events', 0)} sleep events and {feed_data.get('total_events', 0)} feeding events")
-                    # Return the valid cached summary
-                    return cached_summary
-                else:
-                    logger.warning(f"Cached summary missing expected structure, forcing refresh")
-                    await delete_with_fallback(cache_key)
-            else:
-                logger.info(f"No cached summary found for key: {cache_key}")
+        # Week and month summaries are sums over the per-day buckets
+        if period in ROLLUP_PERIODS:
+            summary = await _get_rollup_summary(thread_id, period, period_name, start_date, now)
+            if summary is not None:
+                logger.info(f"Generated {period} summary for thread {thread_id} from {len(summary['daily'])} daily rollups")
+                return summary
+            logger.warning(f"Daily rollups unavailable for thread {thread_id}, scanning raw events")
         
         # Get events for the period
         logger.info(f"Retrieving events for thread {thread_id} from {start_date.isoformat()} to {now.isoformat()}")
@@ -373,15 +1218,8 @@ async def get_summary(thread_id: str, period: str = "day", force_refresh: bool =
                 "thread_id": thread_id,
                 "routines": {}
             }
-            
-            # Cache the empty summary briefly to avoid repeated processing
-            await set_with_fallback(cache_key, empty_summary, 60)  # Cache for 1 minute to allow for retries
             return empty_summary
         
-        # Force clear any existing cache to ensure fresh results
-        await delete_with_fallback(cache_key)
-        logger.info(f"Cleared existing summary cache for thread {thread_id}")
-        
         # Process sleep events
         sleep_events = [e for e in events if e.get("event_type") == "sleep"]
         sleep_end_events = [e for e in events if e.get("event_type") == "sleep_end"]
@@ -395,160 +1233,15 @@ async def get_summary(thread_id: str, period: str = "day", force_refresh: bool =
         for i, event in enumerate(sleep_end_events):
             logger.info(f"Sleep end event {i+1}: time={event.get('event_time')}, id={event.get('local_id')}, data={event.get('event_data')}")
         
-        total_sleep_duration = 0
-        sleep_periods = []
-        
-        # Sort both event arrays for proper matching
-        sorted_sleep_events = sorted(sleep_events, key=lambda x: x.get("event_time", ""))
-        sorted_sleep_end_events = sorted(sleep_end_events, key=lambda x: x.get("event_time", ""))
-        
-        # Log the sorted events for troubleshooting
-        logger.info(f"After sorting, processing {len(sorted_sleep_events)} sleep events and {len(sorted_sleep_end_events)} sleep end events")
-        
-        # Track processed sleep end events to avoid duplicates
-        processed_sleep_ends = set()
-        
-        # Match sleep events with sleep end events
-        for sleep_event in sorted_sleep_events:
-            try:
-                sleep_event_time = sleep_event.get("event_time", "")
-                logger.info(f"Processing sleep event with time: {sleep_event_time}")
-                
-                # Handle Z vs +00:00 timezone formats
-                sleep_start = datetime.fromisoformat(sleep_event_time.replace("Z", "+00:00"))
-                if sleep_start.tzinfo:
-                    sleep_start = sleep_start.replace(tzinfo=None)
-                
-                # Find matching end event
-                matching_end = None
-                closest_time_diff = timedelta(days=1)  # Start with a large value
-                
-                for end_event in sorted_sleep_end_events:
-                    # Skip already processed end events
-                    end_id = end_event.get("local_id")
-                    if end_id in processed_sleep_ends:
-                        logger.info(f"Skipping already processed end event with id: {end_id}")
-                        continue
-                    
-                    end_time_str = end_event.get("event_time", "")
-                    logger.info(f"Checking sleep end event with time: {end_time_str}")
-                    
-                    try:
-                        end_time = datetime.fromisoformat(end_time_str.replace("Z", "+00:00"))
-                        if end_time.tzinfo:
-                            end_time = end_time.replace(tzinfo=None)
-                    except (ValueError, AttributeError) as e:
-                        logger.warning(f"Error parsing end time '{end_time_str}': {e}")
-                        continue
-                        
-                    # End time must be after start time
-                    if end_time > sleep_start:
-                        time_diff = end_time - sleep_start
-                        
-                        # If it's within a reasonable time frame (less than 24 hours)
-                        if time_diff.total_seconds() < 86400:  # 24 hours in seconds
-                            # If it's the closest end time so far, use it
-                            if time_diff < closest_time_diff:
-                                closest_time_diff = time_diff
-                                matching_end = end_event
-                
-                if matching_end:
-                    end_id = matching_end.get("local_id")
-                    logger.info(f"Found matching end event with id: {end_id} and time: {matching_end.get('event_time')}")
-                    
-                    if end_id:  # Mark as processed if it has an ID
-                        processed_sleep_ends.add(end_id)
-                    
-                    sleep_end = datetime.fromisoformat(matching_end.get("event_time", "").replace("Z", "+00:00"))
-                    if sleep_end.tzinfo:
-                        sleep_end = sleep_end.replace(tzinfo=None)
-                        
-                    duration_minutes = int((sleep_end - sleep_start).total_seconds() / 60)  # Duration in minutes
-                    duration_hours = duration_minutes / 60  # Convert to hours
-                    
-                    # Validate duration - skip unreasonable values
-                    if duration_hours > 24:  # More than a day of sleep
-                        logger.warning(f"Unreasonable sleep duration: {duration_hours} hours. Skipping.")
-                        continue
-                    
-                    total_sleep_duration += duration_hours
-                    
-                    sleep_periods.append({
-                        "start": sleep_event.get("event_time"),
-                        "end": matching_end.get("event_time"),
-                        "duration": round(duration_hours, 2),
-                        "start_id": sleep_event.get("local_id"),
-                        "end_id": matching_end.get("local_id")
-                    })
-                    logger.info(f"Matched sleep period: {sleep_start} to {sleep_end}, duration: {duration_hours} hours")
-                else:
-                    # If no matching end event, create a sleep period with estimated end time
-                    # Assume baby is still sleeping if sleep event is recent (within 12 hours)
-                    time_since_sleep = now - sleep_start
-                    
-                    if time_since_sleep.total_seconds() < 12 * 3600:  # 12 hours
-                        logger.info(f"No end event found, but sleep start is recent. Creating open-ended sleep period.")
-                        
-                        # For ongoing sleep, use current time as temporary end
-                        duration_hours = time_since_sleep.total_seconds() / 3600
-                        
-                        sleep_periods.append({
-                            "start": sleep_event.get("event_time"),
-                            "end": None,  # Ongoing sleep
-                            "duration": round(duration_hours, 2),
-                            "start_id": sleep_event.get("local_id"),
-                            "end_id": None,
-                            "is_ongoing": True
-                        })
-                        
-                        # Add to total duration (ongoing sleep counts too)
-                        total_sleep_duration += duration_hours
-                        
-                        logger.info(f"Created ongoing sleep period: {sleep_start} to (now), duration so far: {duration_hours} hours")
-            except (ValueError, AttributeError) as e:
-                logger.warning(f"Error processing sleep event: {e}")
-                continue
+        # get_events returns events in time order, so both lists are already sorted
+        sorted_sleep_events = sleep_events
+        sorted_sleep_end_events = sleep_end_events
         
-        # Process unmatched sleep end events that might not have a corresponding start
-        # This is valuable when parents only logged the wake-up time but not the sleep time
-        for end_event in sorted_sleep_end_events:
-            end_id = end_event.get("local_id")
-            if end_id not in processed_sleep_ends:
-                try:
-                    logger.info(f"Processing unmatched sleep end event with id: {end_id}")
-                    
-                    end_time = datetime.fromisoformat(end_event.get("event_time", "").replace("Z", "+00:00"))
-                    if end_time.tzinfo:
-                        end_time = end_time.replace(tzinfo=None)
-                    
-                    # Assume a reasonable sleep duration (2 hours) before the end time
-                    start_time = end_time - timedelta(hours=2)
-                    
-                    # If start time would be before our date range, adjust it
-                    if start_time < start_date:
-                        start_time = start_date
-                    
-                    duration_hours = (end_time - start_time).total_seconds() / 3600
-                    
-                    if duration_hours <= 0:
-                        logger.warning(f"Calculated non-positive duration: {duration_hours} for sleep end event. Skipping.")
-                        continue
-                    
-                    total_sleep_duration += duration_hours
-                    
-                    sleep_periods.append({
-                        "start": start_time.isoformat(),
-                        "end": end_event.get("event_time"),
-                        "duration": round(duration_hours, 2),
-                        "start_id": None,  # Virtual sleep start
-                        "end_id": end_event.get("local_id"),
-                        "is_virtual": True
-                    })
-                    
-                    logger.info(f"Created virtual sleep period for unmatched end event: {start_time} to {end_time}, duration: {duration_hours} hours")
-                except (ValueError, AttributeError) as e:
-                    logger.warning(f"Error processing unmatched sleep end event: {e}")
-                    continue
+        # Match sleep starts with sleep ends, including ongoing and virtual periods
+        sleep_periods, total_sleep_duration = _match_sleep_periods(
+            sorted_sleep_events, sorted_sleep_end_events, start_date, now
+        )
+        logger.info(f"Matched {len(sleep_periods)} sleep periods totalling {total_sleep_duration:.2f} hours")
 
         # If we have sleep_end events but no sleep events, and no sleep periods were created yet
         # try to create sleep periods for them as a last resort failsafe
@@ -560,9 +1253,9 @@ async def get_summary(thread_id: str, period: str = "day", force_refresh: bool =
                     end_time_str = end_event.get("event_time", "")
                     logger.info(f"Creating virtual sleep period for end event with time: {end_time_str}")
                     
-                    end_time = datetime.fromisoformat(end_time_str.replace("Z", "+00:00"))
-                    if end_time.tzinfo:
-                        end_time = end_time.replace(tzinfo=None)
+                    end_time = _event_datetime(end_event)
+                    if end_time is None:
+                        raise ValueError(f"Invalid sleep end time: {end_time_str}")
                     
                     # Use a reasonable default sleep duration for infants (2 hours)
                     start_time = end_time - timedelta(hours=2)
@@ -602,9 +1295,9 @@ async def get_summary(thread_id: str, period: str = "day", force_refresh: bool =
                     start_time_str = sleep_event.get("event_time", "")
                     logger.info(f"Creating virtual sleep period for start event with time: {start_time_str}")
                     
-                    start_time = datetime.fromisoformat(start_time_str.replace("Z", "+00:00"))
-                    if start_time.tzinfo:
-                        start_time = start_time.replace(tzinfo=None)
+                    start_time = _event_datetime(sleep_event)
+                    if start_time is None:
+                        raise ValueError(f"Invalid sleep start time: {start_time_str}")
                     
                     # Use a reasonable default sleep duration for infants (2 hours)
                     end_time = start_time + timedelta(hours=2)
@@ -670,17 +1363,6 @@ async def get_summary(thread_id: str, period: str = "day", force_refresh: bool =
             }
         }
         
-        # Cache the summary with proper serialization
-        logger.info(f"Caching summary for thread {thread_id} with key: {cache_key}")
-        try:
-            # Convert datetime objects to strings for proper serialization
-            serializable_summary = json.loads(json.dumps(summary, default=str))
-            await set_with_fallback(cache_key, serializable_summary, 300)  # Cache for 5 minutes
-            logger.info(f"Successfully cached summary for thread {thread_id}")
-        except Exception as e:
-            logger.error(f"Error caching summary: {str(e)}")
-            # Continue without caching
-        
         logger.info(f"Generated summary for thread {thread_id} with {len(sleep_periods)} sleep periods and {len(feed_events)} feedings")
         return summary
         
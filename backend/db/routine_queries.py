@@ -0,0 +1,139 @@
+"""
+Babywise Chatbot - Routine Tracker SQL
+
+Schema and statements of the local-development SQLite routine tracker.
+They are constants so each pooled connection's prepared statement cache
+reuses them, and they live apart from routine_tracker so query plans can
+be checked without the rest of the service.
+
+Every tracker query is scoped to one thread, and most to one event type,
+so the table has a single composite index on (thread_id, event_type,
+start_time). It replaces the separate thread_id and start_time indexes,
+which queries could only use one at a time. Queries name the columns they
+return rather than SELECT *.
+"""
+
+import sqlite3
+
+SCHEMA_STATEMENTS = (
+    '''
+    CREATE TABLE IF NOT EXISTS routine_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        thread_id TEXT NOT NULL,
+        event_type TEXT NOT NULL,
+        start_time TIMESTAMP NOT NULL,
+        end_time TIMESTAMP,
+        notes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Covers the sleep pairing scan, which reads only id, event_type and
+    # start_time (the rowid is part of every index), and seeks straight to a
+    # thread's events of one type in time order; other queries look up each
+    # matching row for end_time and notes
+    '''
+    CREATE INDEX IF NOT EXISTS idx_thread_type_start
+    ON routine_events(thread_id, event_type, start_time)
+    ''',
+    # Superseded by idx_thread_type_start
+    "DROP INDEX IF EXISTS idx_thread_id",
+    "DROP INDEX IF EXISTS idx_start_time"
+)
+
+INSERT_EVENT_SQL = '''
+INSERT INTO routine_events (thread_id, event_type, start_time, end_time, notes)
+VALUES (?, ?, ?, ?, ?)
+'''
+
+SELECT_EVENT_REF_SQL = "SELECT thread_id, event_type FROM routine_events WHERE id = ?"
+
+# NULL parameters leave the column unchanged
+UPDATE_EVENT_SQL = '''
+UPDATE routine_events
+SET end_time = COALESCE(?, end_time), notes = COALESCE(?, notes)
+WHERE id = ?
+'''
+
+DELETE_EVENT_SQL = "DELETE FROM routine_events WHERE id = ?"
+
+LATEST_EVENT_SQL = '''
+SELECT id, thread_id, event_type, start_time, end_time, notes, created_at
+FROM routine_events
+WHERE thread_id = ? AND event_type = ?
+ORDER BY start_time DESC
+LIMIT 1
+'''
+
+# Sleep starts in the range, each with the first sleep_end after it as its
+# end_time. The thread's sleep and sleep_end rows from the range start on
+# (plus the first sleep_end past the range, the latest end a sleep in the
+# range can need) are read once in time order from the index, and a
+# running MIN over the later rows finds every start's next end in the same
+# pass. LEAD() alone can't, since SQLite has no IGNORE NULLS to step over
+# a second sleep start; GROUPS leaves out rows at the same time, so an end
+# must be strictly later, as before.
+# Params: thread_id, start, end, thread_id, end
+SLEEP_EVENTS_SQL = '''
+WITH candidates AS (
+    SELECT id, event_type, start_time
+    FROM routine_events
+    WHERE thread_id = ? AND
+        event_type IN ('sleep', 'sleep_end') AND
+        start_time >= ? AND
+        start_time <= ?
+    UNION ALL
+    SELECT id, event_type, start_time FROM (
+        SELECT id, event_type, start_time
+        FROM routine_events
+        WHERE thread_id = ? AND
+            event_type = 'sleep_end' AND
+            start_time > ?
+        ORDER BY start_time ASC
+        LIMIT 1
+    )
+),
+paired AS (
+    SELECT
+        id,
+        event_type,
+        start_time,
+        MIN(CASE WHEN event_type = 'sleep_end' THEN start_time END) OVER (
+            ORDER BY start_time DESC
+            GROUPS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+        ) AS end_time
+    FROM candidates
+)
+SELECT e.id, e.thread_id, e.event_type, e.start_time, p.end_time, e.notes
+FROM paired p
+JOIN routine_events e ON e.id = p.id
+WHERE p.event_type = 'sleep'
+ORDER BY p.start_time ASC, p.id ASC
+'''
+
+# Events overlapping the range: started by its end, and started, ended or
+# still open at its start. Kept as one sargable range on start_time so the
+# index seeks to the thread (and type) instead of OR-ing three ranges.
+# Params: thread_id, end, start, start
+RANGE_EVENTS_SQL = '''
+SELECT id, thread_id, event_type, start_time, end_time, notes, created_at
+FROM routine_events
+WHERE thread_id = ? AND
+    start_time <= ? AND
+    (start_time >= ? OR end_time >= ? OR end_time IS NULL)
+ORDER BY start_time ASC
+'''
+# Params: thread_id, event_type, end, start, start
+RANGE_EVENTS_BY_TYPE_SQL = '''
+SELECT id, thread_id, event_type, start_time, end_time, notes, created_at
+FROM routine_events
+WHERE thread_id = ? AND
+    event_type = ? AND
+    start_time <= ? AND
+    (start_time >= ? OR end_time >= ? OR end_time IS NULL)
+ORDER BY start_time ASC
+'''
+
+def create_schema(conn: sqlite3.Connection) -> None:
+    """Create the routine_events table and its index, dropping superseded indexes."""
+    for statement in SCHEMA_STATEMENTS:
+        conn.execute(statement)
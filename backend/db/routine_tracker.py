@@ -5,7 +5,6 @@ This module implements the database operations for the Baby Routine Tracker feat
 allowing parents to log and retrieve routine events such as sleep and feeding.
 """
 
-import sqlite3
 import os
 import json
 import logging
@@ -19,7 +18,7 @@ from backend.services.redis_service import (
     cache_active_routine,
     get_active_routine,
     invalidate_routine_cache,
-    get_redis,
+    redis_service,
     RedisKeyPrefix
 )
 from backend.services.analytics_service import (
@@ -27,6 +26,11 @@ from backend.services.analytics_service import (
     update_weekly_stats,
     update_pattern_stats
 )
+from backend.db.sqlite_engine import AsyncSQLiteEngine
+from backend.db.routine_queries import (
+    INSERT_EVENT_SQL, SELECT_EVENT_REF_SQL, UPDATE_EVENT_SQL, DELETE_EVENT_SQL, LATEST_EVENT_SQL,
+    SLEEP_EVENTS_SQL, RANGE_EVENTS_SQL, RANGE_EVENTS_BY_TYPE_SQL, create_schema
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -47,6 +51,9 @@ if not IS_VERCEL:
         logger.warning(f"Could not create data directory: {e}. Switching to Redis-only mode.")
         IS_VERCEL = True
 
+# Pooled connections for local development; queries run off the event loop
+_engine = AsyncSQLiteEngine(DB_PATH)
+
 def check_db_connection() -> bool:
     """Check if database connection is working"""
     if IS_VERCEL:
@@ -61,22 +68,16 @@ def check_db_connection() -> bool:
     else:
         # In local development, use SQLite
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1")
-            result = cursor.fetchone()
+            result = _engine.submit(lambda conn: conn.execute("SELECT 1").fetchone()).result()
             return result is not None and result[0] == 1
         except Exception as e:
             logger.error(f"Database connection check failed: {str(e)}")
             return False
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
 async def test_redis_connection() -> bool:
     """Test Redis connection"""
     try:
-        redis = await get_redis()
+        redis = redis_service.client
         if redis is None:
             return False
         await redis.ping()
@@ -92,41 +93,13 @@ def init_db():
         return True
 
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Create events table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS routine_events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            thread_id TEXT NOT NULL,
-            event_type TEXT NOT NULL,
-            start_time TIMESTAMP NOT NULL,
-            end_time TIMESTAMP,
-            notes TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Create index on thread_id for faster queries
-        cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_thread_id ON routine_events(thread_id)
-        ''')
-        
-        # Create index on start_time for faster date range queries
-        cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_start_time ON routine_events(start_time)
-        ''')
-        
-        conn.commit()
+        # Runs at import time, before any event loop, so wait on the pool directly
+        _engine.submit(create_schema).result()
         logger.info("Database initialized successfully")
         return True
     except Exception as e:
         logger.error(f"Error initializing database: {str(e)}", exc_info=True)
         return False
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 async def add_event(thread_id: str, event_type: str, start_time: datetime, 
                    end_time: Optional[datetime] = None, notes: Optional[str] = None) -> int:
@@ -167,7 +140,7 @@ async def add_event(thread_id: str, event_type: str, start_time: datetime,
     if IS_VERCEL:
         # Use Redis in Vercel environment
         try:
-            redis = await get_redis()
+            redis = redis_service.client
             if redis is None:
                 logger.error("Failed to get Redis connection")
                 raise Exception("Redis connection failed")
@@ -206,22 +179,13 @@ async def add_event(thread_id: str, event_type: str, start_time: datetime,
             raise
     else:
         # Use SQLite in local development
-        conn = None
         try:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
             # Insert the event
             logger.info(f"Executing SQL INSERT with values: ({thread_id}, {event_type}, {start_time_iso}, {end_time_iso}, {notes})")
-            cursor.execute('''
-            INSERT INTO routine_events (thread_id, event_type, start_time, end_time, notes)
-            VALUES (?, ?, ?, ?, ?)
-            ''', (thread_id, event_type, start_time_iso, end_time_iso, notes))
-            
-            # Get the ID of the newly inserted event
-            event_id = cursor.lastrowid
+            event_id, _ = await _engine.execute(
+                INSERT_EVENT_SQL, (thread_id, event_type, start_time_iso, end_time_iso, notes)
+            )
             
-            conn.commit()
             logger.info(f"Added {event_type} event for thread {thread_id}: ID={event_id}, start={start_time_iso}, end={end_time_iso}")
             
             # Invalidate cache for this routine type
@@ -231,9 +195,6 @@ async def add_event(thread_id: str, event_type: str, start_time: datetime,
         except Exception as e:
             logger.error(f"Error adding event to SQLite: {str(e)}", exc_info=True)
             raise
-        finally:
-            if conn:
-                conn.close()
 
 async def update_event(event_id: int, end_time: Optional[datetime] = None, 
                       notes: Optional[str] = None) -> bool:
@@ -248,53 +209,37 @@ async def update_event(event_id: int, end_time: Optional[datetime] = None,
     Returns:
         True if the update was successful, False otherwise
     """
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
+    # Normalize datetime objects to remove timezone info for consistent storage
+    def normalize_datetime(dt):
+        if dt is None:
+            return None
+        # If datetime has timezone info, convert to UTC and remove timezone
+        if dt.tzinfo is not None:
+            from datetime import timezone
+            dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+        return dt
+    
+    if end_time is None and notes is None:
+        logger.warning("No update parameters provided")
+        return False
+    end_time_iso = normalize_datetime(end_time).isoformat() if end_time is not None else None
+    
+    def update(conn):
         # First, get the event to know which cache to invalidate
-        cursor.execute("SELECT thread_id, event_type FROM routine_events WHERE id = ?", (event_id,))
-        result = cursor.fetchone()
+        result = conn.execute(SELECT_EVENT_REF_SQL, (event_id,)).fetchone()
         if not result:
+            return None
+        cursor = conn.execute(UPDATE_EVENT_SQL, (end_time_iso, notes, event_id))
+        return result["thread_id"], result["event_type"], cursor.rowcount
+    
+    try:
+        result = await _engine.run(update)
+        if result is None:
             logger.warning(f"Event {event_id} not found")
             return False
             
-        thread_id, event_type = result
-        
-        # Normalize datetime objects to remove timezone info for consistent storage
-        def normalize_datetime(dt):
-            if dt is None:
-                return None
-            # If datetime has timezone info, convert to UTC and remove timezone
-            if dt.tzinfo is not None:
-                from datetime import timezone
-                dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
-            return dt
-        
-        # Build the update query dynamically based on provided parameters
-        update_parts = []
-        params = []
-        
-        if end_time is not None:
-            update_parts.append("end_time = ?")
-            end_time_normalized = normalize_datetime(end_time)
-            params.append(end_time_normalized.isoformat())
-            
-        if notes is not None:
-            update_parts.append("notes = ?")
-            params.append(notes)
-            
-        if not update_parts:
-            logger.warning("No update parameters provided")
-            return False
-            
-        query = f"UPDATE routine_events SET {', '.join(update_parts)} WHERE id = ?"
-        params.append(event_id)
-        
-        cursor.execute(query, params)
-        conn.commit()
-        
-        if cursor.rowcount > 0:
+        thread_id, event_type, rowcount = result
+        if rowcount > 0:
             logger.info(f"Updated event {event_id}")
             # Invalidate cache for this routine type
             await invalidate_routine_cache(thread_id, event_type)
@@ -305,9 +250,6 @@ async def update_event(event_id: int, end_time: Optional[datetime] = None,
     except Exception as e:
         logger.error(f"Error updating event: {str(e)}", exc_info=True)
         return False
-    finally:
-        if conn:
-            conn.close()
 
 async def get_events_by_date_range(thread_id: str, start_date: datetime, 
                                   end_date: datetime, event_type: Optional[str] = None) -> List[Dict[str, Any]]:
@@ -323,28 +265,10 @@ async def get_events_by_date_range(thread_id: str, start_date: datetime,
     Returns:
         List of events as dictionaries
     """
-    conn = None
     try:
         # Log the input parameters
         logger.info(f"Getting events for thread {thread_id} from {start_date} to {end_date}, type: {event_type}")
         
-        # Try to get from cache first
-        if event_type:
-            cached_events = await get_cached_recent_events(thread_id, event_type)
-            if cached_events:
-                logger.info(f"Retrieved {event_type} events from cache for thread {thread_id}")
-                # Convert ISO strings back to datetime objects
-                for event in cached_events:
-                    if event.get('start_time'):
-                        event['start_time'] = datetime.fromisoformat(event['start_time'])
-                    if event.get('end_time'):
-                        event['end_time'] = datetime.fromisoformat(event['end_time'])
-                return cached_events
-        
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row  # This enables dictionary-like access to rows
-        cursor = conn.cursor()
-        
         # Normalize datetime objects to remove timezone info for consistent storage
         def normalize_datetime(dt):
             if dt is None:
@@ -362,63 +286,42 @@ async def get_events_by_date_range(thread_id: str, start_date: datetime,
         # Convert to ISO format for SQLite
         start_date_iso = start_date_normalized.isoformat()
         end_date_iso = end_date_normalized.isoformat()
+        window = f"{start_date_iso}/{end_date_iso}"
+        
+        # Try to get from cache first
+        if event_type:
+            cached_events = await get_cached_recent_events(thread_id, event_type, window)
+            if cached_events:
+                logger.info(f"Retrieved {event_type} events from cache for thread {thread_id}")
+                # Convert ISO strings back to datetime objects
+                for event in cached_events:
+                    if event.get('start_time'):
+                        event['start_time'] = datetime.fromisoformat(event['start_time'])
+                    if event.get('end_time'):
+                        event['end_time'] = datetime.fromisoformat(event['end_time'])
+                return cached_events
         
         # Modified query to handle sleep events differently
         if event_type == 'sleep':
-            # For sleep events, we want to get both sleep starts and their corresponding end events
-            query = '''
-            WITH sleep_events AS (
-                SELECT 
-                    e1.id,
-                    e1.thread_id,
-                    e1.event_type,
-                    e1.start_time,
-                    MIN(e2.start_time) as end_time,
-                    e1.notes
-                FROM routine_events e1
-                LEFT JOIN routine_events e2 ON 
-                    e2.thread_id = e1.thread_id AND
-                    e2.event_type = 'sleep_end' AND
-                    e2.start_time > e1.start_time
-                WHERE e1.thread_id = ? AND
-                    e1.event_type = 'sleep' AND
-                    e1.start_time >= ? AND
-                    e1.start_time <= ?
-                GROUP BY e1.id
-            )
-            SELECT * FROM sleep_events
-            ORDER BY start_time ASC
-            '''
-            params = [thread_id, start_date_iso, end_date_iso]
+            # Pair each sleep with the next sleep_end in one ordered pass
+            query = SLEEP_EVENTS_SQL
+            params = [thread_id, start_date_iso, end_date_iso, thread_id, end_date_iso]
+        elif event_type:
+            # Events overlapping the range
+            query = RANGE_EVENTS_BY_TYPE_SQL
+            params = [thread_id, event_type, end_date_iso, start_date_iso, start_date_iso]
         else:
-            # For other event types, use the original query
-            query = '''
-            SELECT * FROM routine_events 
-            WHERE thread_id = ? AND 
-            (
-                (start_time >= ? AND start_time <= ?) OR  -- Events that start within the range
-                (end_time >= ? AND end_time <= ?) OR      -- Events that end within the range
-                (start_time <= ? AND (end_time >= ? OR end_time IS NULL))  -- Events that span the range
-            )
-            '''
-            params = [thread_id, start_date_iso, end_date_iso, start_date_iso, end_date_iso, start_date_iso, start_date_iso]
-        
-        if event_type and event_type != 'sleep':
-            query += ' AND event_type = ?'
-            params.append(event_type)
-            
-        query += ' ORDER BY start_time ASC'
+            query = RANGE_EVENTS_SQL
+            params = [thread_id, end_date_iso, start_date_iso, start_date_iso]
         
         logger.info(f"Retrieving events for thread {thread_id} from {start_date_iso} to {end_date_iso}")
         logger.info(f"Executing query: {query} with params: {params}")
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        rows = await _engine.fetchall(query, params)
         
         # Convert rows to list of dictionaries
         events = []
-        for row in rows:
-            event_dict = dict(row)
+        for event_dict in rows:
             # Convert ISO strings back to datetime objects
             if event_dict.get('start_time'):
                 event_dict['start_time'] = datetime.fromisoformat(event_dict['start_time'])
@@ -442,15 +345,12 @@ async def get_events_by_date_range(thread_id: str, start_date: datetime,
                     cache_event['end_time'] = cache_event['end_time'].isoformat()
                 cache_events.append(cache_event)
                 
-            await cache_recent_events(thread_id, event_type, cache_events)
+            await cache_recent_events(thread_id, event_type, cache_events, window)
             
         return events
     except Exception as e:
         logger.error(f"Error retrieving events: {str(e)}", exc_info=True)
         return []
-    finally:
-        if conn:
-            conn.close()
 
 async def get_routine_summary(thread_id: str, routine_type: str) -> Optional[Dict[str, Any]]:
     """
@@ -577,37 +477,11 @@ async def get_latest_event(thread_id: str, event_type: str) -> Optional[Dict[str
         The latest event as a dictionary, or None if no events found
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        SELECT id, thread_id, event_type, start_time, end_time, notes, created_at
-        FROM routine_events
-        WHERE thread_id = ? AND event_type = ?
-        ORDER BY start_time DESC
-        LIMIT 1
-        ''', (thread_id, event_type))
-        
-        result = cursor.fetchone()
-        
-        if result:
-            return {
-                "id": result[0],
-                "thread_id": result[1],
-                "event_type": result[2],
-                "start_time": result[3],
-                "end_time": result[4],
-                "notes": result[5],
-                "created_at": result[6]
-            }
-        return None
+        return await _engine.fetchone(LATEST_EVENT_SQL, (thread_id, event_type))
         
     except Exception as e:
         logger.error(f"Error getting latest event: {str(e)}", exc_info=True)
         return None
-    finally:
-        if conn:
-            conn.close()
 
 async def delete_event(event_id: int) -> bool:
     """
@@ -619,18 +493,16 @@ async def delete_event(event_id: int) -> bool:
     Returns:
         True if the event was deleted successfully, False otherwise
     """
-    try:
+    def delete(conn):
         # Get event details first for cache invalidation
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT thread_id, event_type FROM routine_events WHERE id = ?",
-            (event_id,)
-        )
-        
-        event = cursor.fetchone()
+        event = conn.execute(SELECT_EVENT_REF_SQL, (event_id,)).fetchone()
+        if event:
+            # Delete the event
+            conn.execute(DELETE_EVENT_SQL, (event_id,))
+        return event
+    
+    try:
+        event = await _engine.run(delete)
         if not event:
             logger.warning(f"Event with ID {event_id} not found")
             return False
@@ -638,15 +510,6 @@ async def delete_event(event_id: int) -> bool:
         thread_id = event['thread_id']
         event_type = event['event_type']
         
-        # Delete the event
-        cursor.execute(
-            "DELETE FROM routine_events WHERE id = ?",
-            (event_id,)
-        )
-        
-        conn.commit()
-        conn.close()
-        
         # Invalidate cache
         await invalidate_routine_cache(thread_id, event_type)
         
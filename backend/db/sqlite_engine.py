@@ -0,0 +1,124 @@
+"""
+Babywise Chatbot - Async SQLite Engine
+
+Runs SQLite queries for the local-development routine tracker off the event
+loop. Queries run on a small dedicated thread pool; each pool thread owns
+one connection, opened on first use and kept for the life of the process,
+so the pool size is also the connection count.
+
+Every connection is opened in WAL mode, so reads don't wait on the writer,
+with synchronous=NORMAL (safe under WAL, without an fsync per commit), a
+larger page cache and a busy timeout for concurrent writers. The sqlite3
+module keeps a per-connection cache of prepared statements keyed by SQL
+text, so callers should pass constant SQL strings and vary only the
+parameters.
+"""
+
+import os
+import sqlite3
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "4"))
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+# Page cache per connection, in KiB
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "8192"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Prepared statements kept per connection
+SQLITE_STATEMENT_CACHE = int(os.environ.get("SQLITE_STATEMENT_CACHE", "128"))
+
+class AsyncSQLiteEngine:
+    """Run SQLite work on a dedicated thread pool with one pooled connection per thread."""
+
+    def __init__(self, path: str, pool_size: int = SQLITE_POOL_SIZE):
+        self.path = path
+        self.pool_size = max(1, pool_size)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=SQLITE_STATEMENT_CACHE
+        )
+        conn.row_factory = sqlite3.Row
+        journal_mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        if journal_mode.lower() != "wal":
+            logger.warning(f"SQLite database {self.path} is using journal mode {journal_mode}, not WAL")
+        conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        with self._lock:
+            self._connections.append(conn)
+        logger.info(f"Opened SQLite connection {len(self._connections)}/{self.pool_size} to {self.path}")
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        conn = self._connection()
+        with conn:
+            # Commits on success, rolls back on error
+            return fn(conn)
+
+    def submit(self, fn: Callable[[sqlite3.Connection], T]) -> "Future[T]":
+        """
+        Run fn(connection) in one transaction on the pool.
+        Usable without an event loop (e.g. at startup) via .result().
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="sqlite")
+            executor = self._executor
+        return executor.submit(self._run, fn)
+
+    async def run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Run fn(connection) in one transaction without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn))
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        """Run a query and return its rows as dicts."""
+        return await self.run(lambda conn: [dict(row) for row in conn.execute(sql, params).fetchall()])
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
+        """Run a query and return its first row as a dict, or None."""
+        def query(conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            row = conn.execute(sql, params).fetchone()
+            return dict(row) if row is not None else None
+        return await self.run(query)
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> Tuple[Optional[int], int]:
+        """Run a statement and commit it, returning (lastrowid, rowcount)."""
+        def statement(conn: sqlite3.Connection) -> Tuple[Optional[int], int]:
+            cursor = conn.execute(sql, params)
+            return cursor.lastrowid, cursor.rowcount
+        return await self.run(statement)
+
+    def close(self) -> None:
+        """Shut down the pool and close its connections."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            connections, self._connections = self._connections, []
+        if executor is not None:
+            executor.shutdown(wait=True)
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.warning(f"Error closing SQLite connection: {e}")
@@ -3,13 +3,21 @@ Babywise Chatbot - Analytics Service
 
 This module provides Redis-based analytics for routine tracking,
 storing and retrieving aggregated statistics for baby routines.
+
+Statistics are stored as Redis hashes and merged server-side by a Lua
+script, so every update is a single atomic round trip and concurrent
+writers can't overwrite each other's counts. Derived values such as
+average_duration are not stored; they are computed when stats are read.
 """
 
+import os
 import json
+import math
+import zlib
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
-from backend.services.redis_service import initialize_redis
+from backend.services.redis_service import redis_connection, run_script
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,58 +33,222 @@ DAILY_STATS_EXPIRATION = 86400  # 24 hours
 WEEKLY_STATS_EXPIRATION = 604800  # 7 days
 PATTERN_STATS_EXPIRATION = 2592000  # 30 days
 
-async def update_daily_stats(thread_id: str, routine_type: str, stats: Dict[str, Any]) -> bool:
+# Fleet-wide counters, written as events arrive so the global views never
+# scan threads. Event and sleep counters are hashes split over shards so no
+# single key takes every write; active threads are HyperLogLogs.
+GLOBAL_EVENTS_PREFIX = "analytics:global:events:"      # {date}:{shard} -> hour and hour:type counts
+GLOBAL_SLEEP_PREFIX = "analytics:global:sleep:"        # {date}:{shard} -> minutes, periods
+GLOBAL_ACTIVE_PREFIX = "analytics:global:active:"      # {date} -> HLL of thread ids with events
+GLOBAL_SLEEPERS_PREFIX = "analytics:global:sleepers:"  # {date} -> HLL of thread ids with sleep
+GLOBAL_COUNTER_SHARDS = max(1, int(os.environ.get("ANALYTICS_COUNTER_SHARDS", "8")))
+GLOBAL_STATS_EXPIRATION = int(os.environ.get("ANALYTICS_GLOBAL_TTL", str(90 * 86400)))  # 90 days
+
+# Nested pattern fields are flattened into hash fields as "<group>.<name>"
+FIELD_SEPARATOR = "."
+
+# Pattern fields every pattern hash starts with
+PATTERN_DEFAULT_FIELDS = {
+    "time_ranges": ("morning", "afternoon", "night"),
+    "durations": ("short", "long")
+}
+
+# Merge operations understood by _MERGE_STATS_LUA
+OP_INCR = "incr"        # add to the field
+OP_MAX = "max"          # keep the larger of the stored and new value
+OP_FLAG = "flag"        # set to 1 if present, else to the value
+OP_DEFAULT = "default"  # set only if the field is missing
+OP_PUSH = "push"        # append items to a JSON list field
+OP_SET = "set"          # overwrite the field
+
+# KEYS[1] = stats hash; ARGV[1] = TTL seconds, ARGV[2] = JSON list of
+# [op, field, value]. A key still holding a legacy JSON string is converted
+# to a hash first so its counts carry over. cjson decodes [] and {} to the
+# same empty table, so an empty one is kept as "[]" when the legacy JSON
+# has a list under that name.
+_MERGE_STATS_LUA = """
+local function encode_legacy(raw, name, value)
+    if type(value) ~= 'table' then
+        return tostring(value)
+    end
+    if next(value) == nil then
+        local escaped = string.gsub(name, '%p', '%%%0')
+        return string.find(raw, '"' .. escaped .. '"%s*:%s*%[') and '[]' or '{}'
+    end
+    return cjson.encode(value)
+end
+if redis.call('TYPE', KEYS[1]).ok == 'string' then
+    local raw = redis.call('GET', KEYS[1])
+    local legacy = cjson.decode(raw)
+    redis.call('DEL', KEYS[1])
+    for field, value in pairs(legacy) do
+        if type(value) == 'table' then
+            if value[1] ~= nil or next(value) == nil then
+                redis.call('HSET', KEYS[1], field, encode_legacy(raw, field, value))
+            else
+                for subfield, subvalue in pairs(value) do
+                    redis.call('HSET', KEYS[1], field .. '.' .. subfield, encode_legacy(raw, subfield, subvalue))
+                end
+            end
+        elseif field ~= 'average_duration' then
+            redis.call('HSET', KEYS[1], field, tostring(value))
+        end
+    end
+end
+local ops = cjson.decode(ARGV[2])
+for _, op in ipairs(ops) do
+    local kind, field, value = op[1], op[2], op[3]
+    if kind == 'incr' then
+        redis.call('HINCRBYFLOAT', KEYS[1], field, value)
+    elseif kind == 'max' then
+        local current = tonumber(redis.call('HGET', KEYS[1], field))
+        if not current or tonumber(value) > current then
+            redis.call('HSET', KEYS[1], field, value)
+        end
+    elseif kind == 'flag' then
+        if redis.call('HEXISTS', KEYS[1], field) == 1 then
+            redis.call('HSET', KEYS[1], field, '1')
+        else
+            redis.call('HSET', KEYS[1], field, value)
+        end
+    elseif kind == 'default' then
+        redis.call('HSETNX', KEYS[1], field, value)
+    elseif kind == 'push' then
+        local current = redis.call('HGET', KEYS[1], field)
+        local items = {}
+        if current then
+            items = cjson.decode(current)
+        end
+        for _, item in ipairs(cjson.decode(value)) do
+            table.insert(items, item)
+        end
+        redis.call('HSET', KEYS[1], field, cjson.encode(items))
+    else
+        redis.call('HSET', KEYS[1], field, value)
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return #ops
+"""
+
+MergeOp = Tuple[str, str, str]
+
+def _number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _stats_ops(stats: Dict[str, Any], max_fields: Tuple[str, ...] = ()) -> List[MergeOp]:
+    """Translate a daily/weekly stats update into merge operations."""
+    ops = []
+    for key, value in stats.items():
+        if key == "average_duration":
+            # Derived from total_duration_hours / total_events at read time
+            continue
+        if _number(value):
+            ops.append((OP_MAX if key in max_fields else OP_INCR, key, str(value)))
+        elif isinstance(value, list):
+            if value:
+                ops.append((OP_PUSH, key, json.dumps(value)))
+        elif isinstance(value, dict):
+            ops.append((OP_SET, key, json.dumps(value)))
+        else:
+            ops.append((OP_SET, key, str(value)))
+    return ops
+
+def _pattern_ops(pattern: Dict[str, Any]) -> List[MergeOp]:
+    """Translate a pattern update into merge operations."""
+    ops = []
+    for key, value in pattern.items():
+        if isinstance(value, dict):
+            for subkey, subvalue in value.items():
+                if not _number(subvalue) or subvalue <= 0:
+                    continue
+                field = f"{key}{FIELD_SEPARATOR}{subkey}"
+                # Time ranges record that a range occurred; other groups accumulate
+                ops.append((OP_FLAG if key == "time_ranges" else OP_INCR, field, str(subvalue)))
+        elif _number(value):
+            if value > 0:
+                ops.append((OP_INCR, key, str(value)))
+        else:
+            ops.append((OP_SET, key, json.dumps(value) if isinstance(value, list) else str(value)))
+
+    for group, names in PATTERN_DEFAULT_FIELDS.items():
+        for name in names:
+            ops.append((OP_DEFAULT, f"{group}{FIELD_SEPARATOR}{name}", "0"))
+    return ops
+
+async def _merge_stats(cache_key: str, ops: List[MergeOp], ttl: int) -> bool:
+    """Apply merge operations to a stats hash in one atomic round trip."""
+    await run_script(_MERGE_STATS_LUA, [cache_key], [ttl, json.dumps(ops)])
+    return True
+
+def _decode_value(value: str) -> Any:
+    """Convert a stored hash value back to the type it was written as."""
+    try:
+        number = float(value)
+    except ValueError:
+        if value[:1] in ("[", "{"):
+            try:
+                return json.loads(value)
+            except ValueError:
+                pass
+        return value
+    if not math.isfinite(number):
+        return value
+    return int(number) if number.is_integer() and "e" not in value.lower() else number
+
+def _decode_stats(raw: Dict[str, str]) -> Dict[str, Any]:
+    """Rebuild a stats dictionary from a stats hash, deriving averages."""
+    stats: Dict[str, Any] = {}
+    for field, value in raw.items():
+        if FIELD_SEPARATOR in field:
+            group, name = field.split(FIELD_SEPARATOR, 1)
+            stats.setdefault(group, {})[name] = _decode_value(value)
+        else:
+            stats[field] = _decode_value(value)
+
+    total_events = stats.get("total_events")
+    if _number(total_events) and _number(stats.get("total_duration_hours")):
+        stats["average_duration"] = stats["total_duration_hours"] / total_events if total_events else 0
+    return stats
+
+async def _read_stats(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Read a stats hash, accepting keys still stored as legacy JSON strings."""
+    async with redis_connection() as client:
+        if not client:
+            logger.error("Redis is not available")
+            return None
+        key_type = await client.type(cache_key)
+        if key_type == "string":
+            stats_json = await client.get(cache_key)
+            return json.loads(stats_json) if stats_json else None
+        raw = await client.hgetall(cache_key)
+        return _decode_stats(raw) if raw else None
+
+async def update_daily_stats(thread_id: str, routine_type: str, stats: Optional[Dict[str, Any]] = None) -> bool:
     """
     Update daily statistics for a specific routine type.
-    
+
+    Numeric values are added to the stored totals, lists are extended and
+    other values overwrite the stored ones, all in one atomic Redis call.
+
     Args:
         thread_id: The conversation thread ID
         routine_type: Type of routine (sleep, feeding, diaper)
         stats: Statistics to update
-        
+
     Returns:
         True if successful, False otherwise
     """
+    if not stats:
+        logger.debug(f"No daily stats to update for {routine_type} (thread {thread_id})")
+        return True
     try:
-        redis_client = await initialize_redis()
-        if not redis_client:
-            logger.error("Failed to initialize Redis client")
-            return False
-            
         # Create key with date
         today = datetime.utcnow().date().isoformat()
         cache_key = f"{DAILY_STATS_PREFIX}{thread_id}:{routine_type}:{today}"
-        
-        # Get existing stats
-        existing_stats = await redis_client.get(cache_key)
-        if existing_stats:
-            existing_stats = json.loads(existing_stats)
-            # Merge new stats with existing stats
-            for key, value in stats.items():
-                if key in existing_stats:
-                    if isinstance(value, (int, float)):
-                        if key == "average_duration":
-                            # Recalculate average duration
-                            total_events = existing_stats["total_events"] + stats["total_events"]
-                            total_duration = (
-                                existing_stats["total_duration_hours"] + stats["total_duration_hours"]
-                            )
-                            existing_stats[key] = total_duration / total_events
-                        else:
-                            existing_stats[key] += value
-                    elif isinstance(value, list):
-                        existing_stats[key].extend(value)
-                    else:
-                        existing_stats[key] = value
-                else:
-                    existing_stats[key] = value
-            stats = existing_stats
-        
-        # Save updated stats
-        stats_json = json.dumps(stats)
-        result = await redis_client.set(cache_key, stats_json, ex=DAILY_STATS_EXPIRATION)
-        logger.info(f"Updated daily stats for {routine_type} (thread {thread_id}): {result}")
-        return bool(result)
+
+        await _merge_stats(cache_key, _stats_ops(stats), DAILY_STATS_EXPIRATION)
+        logger.info(f"Updated daily stats for {routine_type} (thread {thread_id})")
+        return True
     except Exception as e:
         logger.error(f"Error updating daily stats: {str(e)}")
         return False
@@ -84,93 +256,59 @@ async def update_daily_stats(thread_id: str, routine_type: str, stats: Dict[str,
 async def get_daily_stats(thread_id: str, routine_type: str, date: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
     """
     Get daily statistics for a specific routine type.
-    
+
     Args:
         thread_id: The conversation thread ID
         routine_type: Type of routine (sleep, feeding, diaper)
         date: The date to get stats for (defaults to today)
-        
+
     Returns:
         Statistics dictionary or None if not found
     """
     try:
-        redis_client = await initialize_redis()
-        if not redis_client:
-            logger.error("Failed to initialize Redis client")
-            return None
-            
         # Use provided date or today
         stats_date = (date or datetime.utcnow()).date().isoformat()
         cache_key = f"{DAILY_STATS_PREFIX}{thread_id}:{routine_type}:{stats_date}"
-        
-        # Get stats from Redis
-        stats_json = await redis_client.get(cache_key)
-        if stats_json:
+
+        stats = await _read_stats(cache_key)
+        if stats:
             logger.info(f"Retrieved daily stats for {routine_type} (thread {thread_id})")
-            return json.loads(stats_json)
-            
+            return stats
+
         logger.info(f"No daily stats found for {routine_type} (thread {thread_id})")
         return None
     except Exception as e:
         logger.error(f"Error retrieving daily stats: {str(e)}")
         return None
 
-async def update_weekly_stats(thread_id: str, routine_type: str, stats: Dict[str, Any]) -> bool:
+async def update_weekly_stats(thread_id: str, routine_type: str, stats: Optional[Dict[str, Any]] = None) -> bool:
     """
     Update weekly statistics for a specific routine type.
-    
+
+    Merges like update_daily_stats, except days_tracked keeps the larger
+    value so days aren't double counted.
+
     Args:
         thread_id: The conversation thread ID
         routine_type: Type of routine (sleep, feeding, diaper)
         stats: Statistics to update
-        
+
     Returns:
         True if successful, False otherwise
     """
+    if not stats:
+        logger.debug(f"No weekly stats to update for {routine_type} (thread {thread_id})")
+        return True
     try:
-        redis_client = await initialize_redis()
-        if not redis_client:
-            logger.error("Failed to initialize Redis client")
-            return False
-            
         # Create key with week number
         today = datetime.utcnow()
         week = today.strftime("%Y-W%W")  # Format: YYYY-WNN
         cache_key = f"{WEEKLY_STATS_PREFIX}{thread_id}:{routine_type}:{week}"
-        
-        # Get existing stats
-        existing_stats = await redis_client.get(cache_key)
-        if existing_stats:
-            existing_stats = json.loads(existing_stats)
-            # Merge new stats with existing stats
-            for key, value in stats.items():
-                if key in existing_stats:
-                    if isinstance(value, (int, float)):
-                        if key == "average_duration":
-                            # Recalculate average duration
-                            total_events = existing_stats["total_events"] + stats["total_events"]
-                            total_duration = (
-                                existing_stats["total_duration_hours"] + stats["total_duration_hours"]
-                            )
-                            existing_stats[key] = total_duration / total_events
-                        elif key == "days_tracked":
-                            # Don't double count days
-                            existing_stats[key] = max(existing_stats[key], value)
-                        else:
-                            existing_stats[key] += value
-                    elif isinstance(value, list):
-                        existing_stats[key].extend(value)
-                    else:
-                        existing_stats[key] = value
-                else:
-                    existing_stats[key] = value
-            stats = existing_stats
-        
-        # Save updated stats
-        stats_json = json.dumps(stats)
-        result = await redis_client.set(cache_key, stats_json, ex=WEEKLY_STATS_EXPIRATION)
-        logger.info(f"Updated weekly stats for {routine_type} (thread {thread_id}): {result}")
-        return bool(result)
+
+        ops = _stats_ops(stats, max_fields=("days_tracked",))
+        await _merge_stats(cache_key, ops, WEEKLY_STATS_EXPIRATION)
+        logger.info(f"Updated weekly stats for {routine_type} (thread {thread_id})")
+        return True
     except Exception as e:
         logger.error(f"Error updating weekly stats: {str(e)}")
         return False
@@ -178,117 +316,58 @@ async def update_weekly_stats(thread_id: str, routine_type: str, stats: Dict[str
 async def get_weekly_stats(thread_id: str, routine_type: str, date: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
     """
     Get weekly statistics for a specific routine type.
-    
+
     Args:
         thread_id: The conversation thread ID
         routine_type: Type of routine (sleep, feeding, diaper)
         date: Any date in the week to get stats for (defaults to current week)
-        
+
     Returns:
         Statistics dictionary or None if not found
     """
     try:
-        redis_client = await initialize_redis()
-        if not redis_client:
-            logger.error("Failed to initialize Redis client")
-            return None
-            
         # Use provided date or today to get week number
         stats_date = date or datetime.utcnow()
         week = stats_date.strftime("%Y-W%W")
         cache_key = f"{WEEKLY_STATS_PREFIX}{thread_id}:{routine_type}:{week}"
-        
-        # Get stats from Redis
-        stats_json = await redis_client.get(cache_key)
-        if stats_json:
+
+        stats = await _read_stats(cache_key)
+        if stats:
             logger.info(f"Retrieved weekly stats for {routine_type} (thread {thread_id})")
-            return json.loads(stats_json)
-            
+            return stats
+
         logger.info(f"No weekly stats found for {routine_type} (thread {thread_id})")
         return None
     except Exception as e:
         logger.error(f"Error retrieving weekly stats: {str(e)}")
         return None
 
-async def update_pattern_stats(thread_id: str, routine_type: str, pattern: Dict[str, Any]) -> bool:
+async def update_pattern_stats(thread_id: str, routine_type: str, pattern: Optional[Dict[str, Any]] = None) -> bool:
     """
     Update pattern statistics for routine analysis.
-    
+
+    Positive time-range values mark the range as seen, other positive
+    values accumulate, and the standard time-range and duration fields are
+    created at zero if missing, all in one atomic Redis call.
+
     Args:
         thread_id: The conversation thread ID
         routine_type: Type of routine (sleep, feeding, diaper)
         pattern: Pattern data to update
-        
+
     Returns:
         True if successful, False otherwise
     """
+    if not pattern:
+        logger.debug(f"No pattern stats to update for {routine_type} (thread {thread_id})")
+        return True
     try:
-        redis_client = await initialize_redis()
-        if not redis_client:
-            logger.error("Failed to initialize Redis client")
-            return False
-            
         cache_key = f"{PATTERN_STATS_PREFIX}{thread_id}:{routine_type}"
-        logger.info(f"Updating pattern stats for key {cache_key}")
-        logger.info(f"Input pattern: {pattern}")
-        
-        # Get existing patterns
-        existing_patterns = await redis_client.get(cache_key)
-        if existing_patterns:
-            existing_patterns = json.loads(existing_patterns)
-            logger.info(f"Existing patterns: {existing_patterns}")
-            
-            # Update pattern frequencies
-            for key, value in pattern.items():
-                if key in existing_patterns:
-                    if isinstance(value, dict):
-                        if key not in existing_patterns:
-                            existing_patterns[key] = {}
-                        for subkey, subvalue in value.items():
-                            if subvalue > 0:  # Only add if the new value is positive
-                                if subkey in existing_patterns[key]:
-                                    if key == "time_ranges":
-                                        # For time ranges, we want to preserve all occurrences
-                                        if subvalue > 0:
-                                            existing_patterns[key][subkey] = 1
-                                    else:
-                                        # For other stats, we want to accumulate
-                                        existing_patterns[key][subkey] += subvalue
-                                else:
-                                    existing_patterns[key][subkey] = subvalue
-                                logger.info(f"Updated {key}.{subkey} to {existing_patterns[key][subkey]}")
-                    elif isinstance(value, (int, float)):
-                        if value > 0:  # Only add if the new value is positive
-                            existing_patterns[key] += value
-                            logger.info(f"Updated {key} to {existing_patterns[key]}")
-                    else:
-                        existing_patterns[key] = value
-                        logger.info(f"Set {key} to {value}")
-                else:
-                    existing_patterns[key] = value
-                    logger.info(f"Added new key {key} with value {value}")
-            pattern = existing_patterns
-        else:
-            # Initialize pattern structure if it doesn't exist
-            pattern = {
-                "time_ranges": {
-                    "morning": pattern.get("time_ranges", {}).get("morning", 0),
-                    "afternoon": pattern.get("time_ranges", {}).get("afternoon", 0),
-                    "night": pattern.get("time_ranges", {}).get("night", 0)
-                },
-                "durations": {
-                    "short": pattern.get("durations", {}).get("short", 0),
-                    "long": pattern.get("durations", {}).get("long", 0)
-                }
-            }
-            logger.info(f"Initialized new pattern structure: {pattern}")
-        
-        # Save updated patterns
-        pattern_json = json.dumps(pattern)
-        result = await redis_client.set(cache_key, pattern_json, ex=PATTERN_STATS_EXPIRATION)
-        logger.info(f"Updated pattern stats for {routine_type} (thread {thread_id}): {result}")
-        logger.info(f"Final pattern: {pattern}")
-        return bool(result)
+        logger.debug(f"Updating pattern stats for key {cache_key} with {pattern}")
+
+        await _merge_stats(cache_key, _pattern_ops(pattern), PATTERN_STATS_EXPIRATION)
+        logger.info(f"Updated pattern stats for {routine_type} (thread {thread_id})")
+        return True
     except Exception as e:
         logger.error(f"Error updating pattern stats: {str(e)}")
         return False
@@ -296,30 +375,189 @@ async def update_pattern_stats(thread_id: str, routine_type: str, pattern: Dict[
 async def get_pattern_stats(thread_id: str, routine_type: str) -> Optional[Dict[str, Any]]:
     """
     Get pattern statistics for routine analysis.
-    
+
     Args:
         thread_id: The conversation thread ID
         routine_type: Type of routine (sleep, feeding, diaper)
-        
+
     Returns:
         Pattern statistics dictionary or None if not found
     """
     try:
-        redis_client = await initialize_redis()
-        if not redis_client:
-            logger.error("Failed to initialize Redis client")
-            return None
-            
         cache_key = f"{PATTERN_STATS_PREFIX}{thread_id}:{routine_type}"
-        
-        # Get patterns from Redis
-        pattern_json = await redis_client.get(cache_key)
-        if pattern_json:
+
+        stats = await _read_stats(cache_key)
+        if stats:
             logger.info(f"Retrieved pattern stats for {routine_type} (thread {thread_id})")
-            return json.loads(pattern_json)
-            
+            return stats
+
         logger.info(f"No pattern stats found for {routine_type} (thread {thread_id})")
         return None
     except Exception as e:
         logger.error(f"Error retrieving pattern stats: {str(e)}")
-        return None 
\ No newline at end of file
+        return None
+
+def _shard(thread_id: str) -> int:
+    """Stable shard for a thread, so one thread's writes stay on one key."""
+    return zlib.crc32(thread_id.encode("utf-8")) % GLOBAL_COUNTER_SHARDS
+
+async def record_global_events(events: List[Dict[str, Any]], delta: int = 1) -> bool:
+    """
+    Count written (delta=1) or deleted (delta=-1) events in the fleet-wide
+    per-hour counters, in one pipeline.
+
+    Written events also mark their thread active for the day. Deletes don't
+    unmark it; HyperLogLogs can't remove members.
+
+    Args:
+        events: Events with thread_id, event_type and event_ts (UTC epoch seconds)
+        delta: 1 for written events, -1 for deleted ones
+
+    Returns:
+        True if the counters were updated, False otherwise
+    """
+    timed = [event for event in events if isinstance(event.get("event_ts"), int) and event.get("thread_id")]
+    if not timed:
+        return True
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return False
+            pipe = client.pipeline(transaction=False)
+            for event in timed:
+                event_dt = datetime.utcfromtimestamp(event["event_ts"])
+                day = event_dt.date().isoformat()
+                hour = f"{event_dt.hour:02d}"
+                events_key = f"{GLOBAL_EVENTS_PREFIX}{day}:{_shard(event['thread_id'])}"
+                pipe.hincrby(events_key, hour, delta)
+                pipe.hincrby(events_key, f"{hour}:{event.get('event_type')}", delta)
+                pipe.expire(events_key, GLOBAL_STATS_EXPIRATION)
+                if delta > 0:
+                    active_key = f"{GLOBAL_ACTIVE_PREFIX}{day}"
+                    pipe.pfadd(active_key, event["thread_id"])
+                    pipe.expire(active_key, GLOBAL_STATS_EXPIRATION)
+            await pipe.execute()
+            return True
+    except Exception as e:
+        logger.error(f"Error updating global event counters: {str(e)}")
+        return False
+
+async def record_global_sleep(thread_id: str, changes: Dict[str, Tuple[float, int]], sleeping_days: List[str]) -> bool:
+    """
+    Apply a thread's change in sleep totals to the fleet-wide daily counters.
+
+    Args:
+        thread_id: The thread whose daily rollups changed
+        changes: (sleep minutes delta, sleep periods delta) keyed by ISO date
+        sleeping_days: ISO dates on which the thread now has sleep
+
+    Returns:
+        True if the counters were updated, False otherwise
+    """
+    changes = {day: change for day, change in changes.items() if change[0] or change[1]}
+    if not changes and not sleeping_days:
+        return True
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return False
+            pipe = client.pipeline(transaction=False)
+            for day, (minutes, periods) in changes.items():
+                sleep_key = f"{GLOBAL_SLEEP_PREFIX}{day}:{_shard(thread_id)}"
+                if minutes:
+                    pipe.hincrbyfloat(sleep_key, "minutes", round(minutes, 2))
+                if periods:
+                    pipe.hincrby(sleep_key, "periods", periods)
+                pipe.expire(sleep_key, GLOBAL_STATS_EXPIRATION)
+            for day in sleeping_days:
+                sleepers_key = f"{GLOBAL_SLEEPERS_PREFIX}{day}"
+                pipe.pfadd(sleepers_key, thread_id)
+                pipe.expire(sleepers_key, GLOBAL_STATS_EXPIRATION)
+            await pipe.execute()
+            return True
+    except Exception as e:
+        logger.error(f"Error updating global sleep counters for thread {thread_id}: {str(e)}")
+        return False
+
+async def get_global_stats(days: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Get fleet-wide statistics for a list of days from the global counters.
+
+    All shards and HyperLogLogs of all days are read in one pipeline, so the
+    cost depends on the number of days, not on the number of threads.
+
+    Args:
+        days: ISO dates to report, in order
+
+    Returns:
+        Per-day statistics plus totals over the range (active threads over the
+        range are a HyperLogLog union, not a sum of the days), or None if
+        Redis is unavailable
+    """
+    try:
+        async with redis_connection() as client:
+            if not client:
+                logger.error("Redis is not available")
+                return None
+            pipe = client.pipeline(transaction=False)
+            for day in days:
+                for shard in range(GLOBAL_COUNTER_SHARDS):
+                    pipe.hgetall(f"{GLOBAL_EVENTS_PREFIX}{day}:{shard}")
+                for shard in range(GLOBAL_COUNTER_SHARDS):
+                    pipe.hgetall(f"{GLOBAL_SLEEP_PREFIX}{day}:{shard}")
+                pipe.pfcount(f"{GLOBAL_ACTIVE_PREFIX}{day}")
+                pipe.pfcount(f"{GLOBAL_SLEEPERS_PREFIX}{day}")
+            if days:
+                pipe.pfcount(*[f"{GLOBAL_ACTIVE_PREFIX}{day}" for day in days])
+            results = await pipe.execute()
+    except Exception as e:
+        logger.error(f"Error retrieving global stats: {str(e)}")
+        return None
+
+    per_day = 2 * GLOBAL_COUNTER_SHARDS + 2
+    daily = []
+    totals = {"total_events": 0, "events_by_hour": [0] * 24, "events_by_type": {}, "sleep_minutes": 0.0, "sleep_periods": 0}
+    for index, day in enumerate(days):
+        chunk = results[index * per_day:(index + 1) * per_day]
+        event_shards = chunk[:GLOBAL_COUNTER_SHARDS]
+        sleep_shards = chunk[GLOBAL_COUNTER_SHARDS:2 * GLOBAL_COUNTER_SHARDS]
+        active_threads, sleeping_threads = chunk[-2], chunk[-1]
+
+        by_hour = [0] * 24
+        hours_by_type: Dict[str, List[int]] = {}
+        for counts in event_shards:
+            for field, value in counts.items():
+                hour, _, event_type = field.partition(":")
+                if event_type:
+                    hours_by_type.setdefault(event_type, [0] * 24)[int(hour)] += int(value)
+                else:
+                    by_hour[int(hour)] += int(value)
+        by_type = {event_type: sum(hours) for event_type, hours in hours_by_type.items()}
+        sleep_minutes = sum(float(counts.get("minutes", 0)) for counts in sleep_shards)
+        sleep_periods = sum(int(counts.get("periods", 0)) for counts in sleep_shards)
+
+        daily.append({
+            "date": day,
+            "total_events": sum(by_hour),
+            "events_by_hour": by_hour,
+            "events_by_type": by_type,
+            "hours_by_type": hours_by_type,
+            "active_threads": active_threads,
+            "sleep": {
+                "total_minutes": round(sleep_minutes, 2),
+                "periods": sleep_periods,
+                "sleeping_threads": sleeping_threads,
+                "average_minutes_per_thread": round(sleep_minutes / sleeping_threads, 2) if sleeping_threads else 0,
+                "average_period_minutes": round(sleep_minutes / sleep_periods, 2) if sleep_periods else 0
+            }
+        })
+        totals["total_events"] += sum(by_hour)
+        totals["events_by_hour"] = [a + b for a, b in zip(totals["events_by_hour"], by_hour)]
+        for event_type, count in by_type.items():
+            totals["events_by_type"][event_type] = totals["events_by_type"].get(event_type, 0) + count
+        totals["sleep_minutes"] += sleep_minutes
+        totals["sleep_periods"] += sleep_periods
+
+    totals["sleep_minutes"] = round(totals["sleep_minutes"], 2)
+    totals["active_threads"] = results[-1] if days else 0
+    return {"days": daily, "totals": totals}
@@ -0,0 +1,98 @@
+"""
+Babywise Chatbot - Circuit Breaker
+
+Stops calling a failing dependency for a cool-down period so callers fall
+back immediately instead of each waiting out its own timeouts.
+
+Closed: calls go through; consecutive failures are counted.
+Open: calls are refused until the reset timeout has passed.
+Half-open: a single probe call is let through; its success closes the
+circuit, its failure opens it again.
+"""
+
+import os
+import time
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Consecutive failures that open the circuit, and seconds before a probe
+REDIS_BREAKER_FAILURE_THRESHOLD = int(os.environ.get("REDIS_BREAKER_FAILURE_THRESHOLD", "3"))
+REDIS_BREAKER_RESET_TIMEOUT = float(os.environ.get("REDIS_BREAKER_RESET_TIMEOUT", "30"))
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    def __init__(self, name: str, failure_threshold: int = REDIS_BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = REDIS_BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started_at: Optional[float] = None
+        self.total_failures = 0
+        self.rejected_calls = 0
+        self.times_opened = 0
+
+    def allow_request(self) -> bool:
+        """Return True if a call may go to the dependency now."""
+        if self.state == CLOSED:
+            return True
+
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                self.rejected_calls += 1
+                return False
+            self.state = HALF_OPEN
+            logger.info(f"[{self.name}] Circuit half-open, probing")
+
+        # Half-open: one probe at a time; a probe that never reports back
+        # is replaced after another reset timeout
+        if self._probe_started_at is None or now - self._probe_started_at >= self.reset_timeout:
+            self._probe_started_at = now
+            return True
+        self.rejected_calls += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info(f"[{self.name}] Circuit closed after successful probe")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_started_at = None
+
+    def record_failure(self) -> None:
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+                logger.warning(f"[{self.name}] Circuit opened after {self.consecutive_failures} consecutive failures")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self._probe_started_at = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the breaker state and counters."""
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout_seconds": self.reset_timeout,
+            "retry_in_seconds": retry_in,
+            "total_failures": self.total_failures,
+            "rejected_calls": self.rejected_calls,
+            "times_opened": self.times_opened
+        }
@@ -0,0 +1,206 @@
+"""
+Babywise Chatbot - Value Codec
+
+Encodes the values the Redis service stores (thread state, events, cached
+summaries) and decodes them back, including values written before the
+codec existed.
+
+Values are serialized to compact JSON (orjson when installed, UTF-8 rather
+than \\u escapes, so Hebrew text is stored at its UTF-8 size). Values of at
+least CODEC_COMPRESS_MIN_BYTES are compressed when that makes them
+smaller. A compressed value is stored as
+
+    MARKER | format version | serializer | compressor | base85 payload
+
+The envelope stays text because the Redis client decodes responses as
+UTF-8, and base85 costs 25% where compression typically saves far more.
+Anything that doesn't start with MARKER is plain JSON, which is how
+uncompressed and legacy values are read.
+
+The serializer inside the envelope (json or msgpack) and the compressor
+(zlib or zstd) are chosen with CODEC_SERIALIZER and CODEC_COMPRESSION;
+msgpack and zstd are used only when their packages are installed. Every
+stored value names its own format, so the settings can change without
+breaking old values.
+"""
+
+import os
+import json
+import zlib
+import base64
+import logging
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# ASCII record separator: never the first character of JSON text
+MARKER = "\x1e"
+FORMAT_VERSION = "1"
+HEADER_LENGTH = 4
+
+CODEC_SERIALIZER = os.environ.get("CODEC_SERIALIZER", "json").lower()
+CODEC_COMPRESSION = os.environ.get("CODEC_COMPRESSION", "zlib").lower()
+CODEC_COMPRESS_MIN_BYTES = int(os.environ.get("CODEC_COMPRESS_MIN_BYTES", "1024"))
+CODEC_ZLIB_LEVEL = int(os.environ.get("CODEC_ZLIB_LEVEL", "6"))
+CODEC_ZSTD_LEVEL = int(os.environ.get("CODEC_ZSTD_LEVEL", "3"))
+
+def to_json(value: Any) -> str:
+    """Serialize a value to compact UTF-8 JSON; unknown types become strings."""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            # e.g. integers beyond 64 bits; the stdlib encoder handles them
+            pass
+    return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":"))
+
+def _msgpack_dumps(value: Any) -> bytes:
+    return msgpack.packb(value, default=str, use_bin_type=True)
+
+def _msgpack_loads(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+def _zstd_compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=CODEC_ZSTD_LEVEL).compress(data)
+
+def _zstd_decompress(data: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(data)
+
+# Format character -> (to bytes, from bytes); availability is checked when
+# choosing what to write, decoding only needs the package that wrote it
+SERIALIZERS: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "j": (lambda value: to_json(value).encode("utf-8"), lambda data: json.loads(data.decode("utf-8"))),
+    "m": (_msgpack_dumps, _msgpack_loads)
+}
+COMPRESSORS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "z": (lambda data: zlib.compress(data, CODEC_ZLIB_LEVEL), zlib.decompress),
+    "s": (_zstd_compress, _zstd_decompress)
+}
+
+def _choose_formats() -> Tuple[str, str]:
+    serializer = "j"
+    if CODEC_SERIALIZER == "msgpack":
+        if MSGPACK_AVAILABLE:
+            serializer = "m"
+        else:
+            logger.warning("CODEC_SERIALIZER=msgpack but msgpack is not installed, using json")
+    compressor = "z"
+    if CODEC_COMPRESSION == "zstd":
+        if ZSTD_AVAILABLE:
+            compressor = "s"
+        else:
+            logger.warning("CODEC_COMPRESSION=zstd but zstandard is not installed, using zlib")
+    elif CODEC_COMPRESSION == "none":
+        compressor = ""
+    return serializer, compressor
+
+class ValueCodec:
+    """Encode and decode stored values, counting what compression saves."""
+
+    def __init__(self, min_compress_bytes: int = CODEC_COMPRESS_MIN_BYTES):
+        self.serializer, self.compressor = _choose_formats()
+        self.min_compress_bytes = min_compress_bytes
+        self._lock = threading.Lock()
+        self.encoded = 0
+        self.compressed = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.decoded = 0
+        self.legacy_reads = 0
+
+    def encode(self, value: Any) -> str:
+        """Serialize a value for storage, compressing it if that pays off."""
+        return self._encode(to_json(value), value)
+
+    def encode_json(self, text: str) -> str:
+        """Encode a value that is already serialized as JSON text."""
+        return self._encode(text, None)
+
+    def _encode(self, text: str, value: Any) -> str:
+        raw_size = len(text.encode("utf-8"))
+        stored = text
+        if self.compressor and raw_size >= self.min_compress_bytes:
+            if self.serializer == "j":
+                data = text.encode("utf-8")
+            else:
+                data = SERIALIZERS[self.serializer][0](json.loads(text) if value is None else value)
+            payload = COMPRESSORS[self.compressor][0](data)
+            envelope = MARKER + FORMAT_VERSION + self.serializer + self.compressor + base64.b85encode(payload).decode("ascii")
+            # Header and base85 overhead can outweigh the savings on
+            # incompressible values
+            if len(envelope) < raw_size:
+                stored = envelope
+        with self._lock:
+            self.encoded += 1
+            self.raw_bytes += raw_size
+            self.stored_bytes += len(stored.encode("utf-8"))
+            if stored is not text:
+                self.compressed += 1
+        return stored
+
+    def decode(self, text: str) -> Any:
+        """
+        Decode a stored value; values without the envelope are read as JSON.
+
+        Raises:
+            ValueError: If the value is not valid JSON or names an unknown format
+        """
+        if not is_encoded(text):
+            with self._lock:
+                self.legacy_reads += 1
+            return json.loads(text)
+        version, serializer, compressor = text[1], text[2], text[3]
+        if version != FORMAT_VERSION or serializer not in SERIALIZERS or compressor not in COMPRESSORS:
+            raise ValueError(f"Unknown stored value format {text[1:HEADER_LENGTH]!r}")
+        try:
+            value = SERIALIZERS[serializer][1](COMPRESSORS[compressor][1](base64.b85decode(text[HEADER_LENGTH:])))
+        except ValueError:
+            raise
+        except Exception as e:
+            # zlib.error, missing optional packages, corrupt msgpack
+            raise ValueError(f"Could not decode stored value: {e}") from e
+        with self._lock:
+            self.decoded += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the formats in use and the bytes written before and after compression."""
+        with self._lock:
+            return {
+                "serializer": "msgpack" if self.serializer == "m" else ("orjson" if ORJSON_AVAILABLE else "json"),
+                "compression": {"z": "zlib", "s": "zstd"}.get(self.compressor, "none"),
+                "min_compress_bytes": self.min_compress_bytes,
+                "values_encoded": self.encoded,
+                "values_compressed": self.compressed,
+                "raw_bytes": self.raw_bytes,
+                "stored_bytes": self.stored_bytes,
+                "compression_ratio": round(self.raw_bytes / self.stored_bytes, 3) if self.stored_bytes else None,
+                "values_decoded": self.decoded,
+                "plain_json_reads": self.legacy_reads
+            }
+
+def is_encoded(value: Any) -> bool:
+    """Whether a stored value uses the compressed envelope."""
+    return isinstance(value, str) and value.startswith(MARKER)
+
+# Process-wide codec used by the Redis service
+codec = ValueCodec()
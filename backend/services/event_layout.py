@@ -0,0 +1,94 @@
+"""
+Babywise Chatbot - Routine Event Storage Layout
+
+Where a routine event's payload is stored. Events are addressed everywhere
+(thread lists, time index, change log, latest-event pointers) by their
+event key, event:{thread}:{type}:{id}. The payload itself lives either
+
+- at that key, one top-level key per event ("keys", the original layout), or
+- in a per-thread, per-month hash ("buckets"):
+
+      event_bucket:{thread}:{YYYY-MM}    field {type}:{id} -> payload
+
+Every top-level key costs Redis a dict entry, a key object and its own
+value object, which for events of a few hundred bytes is a large share of
+their memory. A bucket holds a month of a thread's events in one key, and
+while it stays within hash-max-listpack-entries and
+hash-max-listpack-value it is stored as a single listpack: fields and
+values packed back to back with a few bytes of overhead each. Buckets stay
+small because the month comes from the event ID, which starts with the
+event time, and a thread records a few hundred events a month at most.
+
+Redis defaults to 128 listpack entries and 64-byte listpack values, and
+payloads are a few hundred bytes, so on a default server every bucket is a
+hashtable and saves little. The service never changes server settings (they
+apply to every hash on a shared server), so deployments that use buckets set
+these in redis.conf or the managed service's configuration (Redis 6 names
+them hash-max-ziplist-*):
+
+    hash-max-listpack-entries 1024
+    hash-max-listpack-value 1024
+
+scripts/benchmark_event_layout.py reports the encoding the buckets get. On
+Redis 6.2 with 12,000 events of ~300 bytes, one key per event took 456
+bytes per event; buckets took 419 (hashtable) with the defaults and 362
+(listpack) with the settings above.
+
+The layout is chosen with EVENT_STORAGE_LAYOUT. Readers of the bucket
+layout fall back to the per-event key, so events written before the switch
+stay readable, and rewriting an event moves it into its bucket.
+"""
+
+import os
+import re
+import logging
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+KEYS = "keys"
+BUCKETS = "buckets"
+
+EVENT_STORAGE_LAYOUT = os.environ.get("EVENT_STORAGE_LAYOUT", KEYS).lower()
+if EVENT_STORAGE_LAYOUT not in (KEYS, BUCKETS):
+    logger.warning(f"Unknown EVENT_STORAGE_LAYOUT '{EVENT_STORAGE_LAYOUT}', using '{KEYS}'")
+    EVENT_STORAGE_LAYOUT = KEYS
+
+EVENT_BUCKET_PREFIX = "event_bucket"
+
+# Bucket for events whose ID doesn't start with a date
+UNDATED_BUCKET = "undated"
+
+_MONTH_RE = re.compile(r"^(\d{4}-\d{2})")
+
+def use_buckets() -> bool:
+    """Whether event payloads are written to per-month buckets."""
+    return EVENT_STORAGE_LAYOUT == BUCKETS
+
+def bucket_prefix(thread_id: str) -> str:
+    """Return the key prefix of a thread's event buckets."""
+    return f"{EVENT_BUCKET_PREFIX}:{thread_id}:"
+
+def bucket_month(event_id: str) -> str:
+    """Return the YYYY-MM bucket of an event ID, from the event time it starts with."""
+    match = _MONTH_RE.match(event_id)
+    return match.group(1) if match else UNDATED_BUCKET
+
+def bucket_location(event_key: str, key_prefix: str = "event") -> Optional[Tuple[str, str]]:
+    """
+    Locate an event key's payload in the bucket layout.
+
+    Args:
+        event_key: A key of the form event:{thread}:{type}:{id}
+        key_prefix: The event key namespace
+
+    Returns:
+        (bucket key, field), or None if the key is not an event key
+    """
+    if not event_key.startswith(f"{key_prefix}:"):
+        return None
+    thread_id, _, field = event_key[len(key_prefix) + 1:].partition(":")
+    event_type, _, event_id = field.partition(":")
+    if not thread_id or not event_type or not event_id:
+        return None
+    return f"{bucket_prefix(thread_id)}{bucket_month(event_id)}", field
@@ -0,0 +1,251 @@
+"""
+Babywise Chatbot - Routine Event Retention
+
+Moves routine events older than EVENT_RETENTION_DAYS out of the hot store
+into one compressed archive blob per thread and month:
+
+    event_archive:{thread}:{YYYY-MM}     {event_key: event}, stored through the codec
+    event_archive_months:{thread}        archived months, scored by month start
+
+and trims them from the thread's list, time index, change log and local_id
+index, so those stop growing with the thread's age. The cutoff is the start
+of the month the horizon falls in, so a month is archived whole and its
+blob is normally written once. routine_db.get_events reads the archives
+back for ranges before the cutoff, so month and year reports, rollup
+refreshes and pattern backfills still see every event. Daily rollups,
+pattern counters and fleet-wide analytics are aggregates and are kept.
+
+The job walks every time-indexed thread with SCAN. Each run works for at
+most a time budget, checked before every thread, and saves its SCAN cursor
+plus the threads of the current SCAN batch it didn't reach, so a pass spans
+as many runs (requests or script invocations) as it needs. A lock keeps runs
+from overlapping: the run extends it before every thread and stops if it no
+longer holds it, so two runs never merge into the same archive blob. Progress
+is kept in the event_retention hash.
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from backend.services.redis_service import (
+    redis_connection, RedisKeyPrefix, get_events_with_fallback, archive_thread_events, run_script
+)
+
+logger = logging.getLogger(__name__)
+
+# Events older than this are archived; 0 turns retention off
+EVENT_RETENTION_DAYS = int(os.environ.get("EVENT_RETENTION_DAYS", "180"))
+# Longest a single run works before saving its cursor
+RETENTION_RUN_SECONDS = float(os.environ.get("EVENT_RETENTION_RUN_SECONDS", "20"))
+# Least time between the end of one pass and the start of the next
+RETENTION_PASS_HOURS = float(os.environ.get("EVENT_RETENTION_PASS_HOURS", "24"))
+# SCAN COUNT hint per cursor step
+RETENTION_SCAN_COUNT = int(os.environ.get("EVENT_RETENTION_SCAN_COUNT", "200"))
+# The lock outlives a run that crashed by this much; runs extend it before
+# every thread
+RETENTION_LOCK_TTL = int(RETENTION_RUN_SECONDS * 3) + 30
+
+# Counters that restart with every pass
+PASS_COUNTERS = ("threads_scanned", "threads_archived", "events_archived", "months_written", "errors")
+
+# Delete the lock only if this run still holds it
+_RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Push the lock's expiry out only if this run still holds it.
+# ARGV[1] = token, ARGV[2] = TTL in milliseconds
+_EXTEND_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+def archive_month(event_ts: float) -> str:
+    """Return the YYYY-MM archive an event timestamp belongs to."""
+    return datetime.utcfromtimestamp(event_ts).strftime("%Y-%m")
+
+def month_start(month: str) -> int:
+    """Return the UTC epoch seconds at the start of a YYYY-MM month."""
+    return int((datetime.strptime(month, "%Y-%m") - datetime(1970, 1, 1)).total_seconds())
+
+def archive_cutoff(now: datetime, retention_days: int = EVENT_RETENTION_DAYS) -> int:
+    """Return the epoch seconds before which events are archived: the start of the horizon's month."""
+    return month_start((now - timedelta(days=retention_days)).strftime("%Y-%m"))
+
+async def archive_thread(thread_id: str, cutoff_ts: int) -> Dict[str, int]:
+    """
+    Archive a thread's events from before cutoff_ts.
+
+    Returns:
+        {"events": archived events, "months": archive blobs written}
+    """
+    async with redis_connection() as client:
+        if not client:
+            raise ConnectionError("Redis is not available")
+        event_keys = await client.zrangebyscore(
+            f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}", "-inf", f"({cutoff_ts}", withscores=True
+        )
+    if not event_keys:
+        return {"events": 0, "months": 0}
+
+    payloads = await get_events_with_fallback([key for key, _ in event_keys])
+    months: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    trimmed: Dict[str, Optional[str]] = {}
+    for (event_key, score), event in zip(event_keys, payloads):
+        if isinstance(event, dict):
+            months.setdefault(archive_month(score), {})[event_key] = event
+            trimmed[event_key] = event.get("local_id")
+        else:
+            # Index entry without a payload; nothing to keep
+            trimmed[event_key] = None
+
+    if not await archive_thread_events(thread_id, months, {month: month_start(month) for month in months}, trimmed):
+        raise RuntimeError(f"Archiving events of thread {thread_id} failed")
+    archived = sum(len(events) for events in months.values())
+    logger.info(f"Archived {archived} events of thread {thread_id} into {len(months)} months")
+    return {"events": archived, "months": len(months)}
+
+async def run_retention(run_seconds: float = RETENTION_RUN_SECONDS, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Archive old events for as many threads as fit in run_seconds, continuing
+    the current pass from its saved cursor. A new pass starts once the last
+    one finished at least EVENT_RETENTION_PASS_HOURS ago.
+
+    Returns:
+        The progress after the run, with "ran" False if retention is off, Redis
+        is unavailable or another run holds the lock
+    """
+    if EVENT_RETENTION_DAYS <= 0:
+        return {"ran": False, "reason": "Retention is disabled"}
+
+    now = now or datetime.utcnow()
+    cutoff_ts = archive_cutoff(now)
+    progress_key = RedisKeyPrefix.EVENT_RETENTION
+    lock_key = RedisKeyPrefix.EVENT_RETENTION_LOCK
+    token = uuid.uuid4().hex
+    started = time.monotonic()
+
+    async with redis_connection() as client:
+        if not client:
+            return {"ran": False, "reason": "Redis unavailable"}
+        if not await client.set(lock_key, token, nx=True, ex=RETENTION_LOCK_TTL):
+            progress = await get_retention_progress()
+            return {**(progress or {}), "ran": False, "reason": "Another run is in progress"}
+
+        try:
+            cursor, finished_at, pending = await client.hmget(progress_key, ["cursor", "pass_finished_at", "pending"])
+            cursor = int(cursor or 0)
+            pending = json.loads(pending) if pending else []
+            if cursor == 0 and not pending and finished_at and now - datetime.fromisoformat(finished_at) < timedelta(hours=RETENTION_PASS_HOURS):
+                progress = await get_retention_progress()
+                return {**(progress or {}), "ran": False, "reason": "The last pass finished recently"}
+            if cursor == 0 and not pending:
+                # New pass
+                pipe = client.pipeline(transaction=False)
+                pipe.hset(progress_key, mapping={
+                    **{counter: 0 for counter in PASS_COUNTERS},
+                    "pass_started_at": now.isoformat(),
+                    "cutoff": datetime.utcfromtimestamp(cutoff_ts).date().isoformat()
+                })
+                pipe.hdel(progress_key, "pass_finished_at")
+                await pipe.execute()
+
+            prefix = f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:"
+            lost_lock = False
+            worked = False
+            while True:
+                if pending:
+                    # Threads of the last SCAN batch a previous run didn't reach
+                    thread_ids, pending = pending, []
+                else:
+                    cursor, index_keys = await client.scan(cursor, match=f"{prefix}*", count=RETENTION_SCAN_COUNT)
+                    thread_ids = [index_key[len(prefix):] for index_key in index_keys]
+                counts = {counter: 0 for counter in PASS_COUNTERS}
+                for position, thread_id in enumerate(thread_ids):
+                    if worked and time.monotonic() - started >= run_seconds:
+                        pending = thread_ids[position:]
+                        break
+                    if not await run_script(_EXTEND_LOCK_LUA, [lock_key], [token, RETENTION_LOCK_TTL * 1000]):
+                        lost_lock = True
+                        break
+                    worked = True
+                    counts["threads_scanned"] += 1
+                    try:
+                        result = await archive_thread(thread_id, cutoff_ts)
+                    except Exception as e:
+                        logger.error(f"Error archiving events of thread {thread_id}: {e}")
+                        counts["errors"] += 1
+                        continue
+                    if result["events"]:
+                        counts["threads_archived"] += 1
+                        counts["events_archived"] += result["events"]
+                        counts["months_written"] += result["months"]
+                if lost_lock:
+                    # Another run may own the progress now; archiving is
+                    # idempotent, so whatever this batch did is redone safely
+                    logger.warning("Lost the retention lock, stopping without saving progress")
+                    break
+
+                # Save the cursor and unreached threads with the work they
+                # cover, so a run that dies resumes after the last finished step
+                finished = cursor == 0 and not pending
+                pipe = client.pipeline(transaction=False)
+                for counter, count in counts.items():
+                    if count:
+                        pipe.hincrby(progress_key, counter, count)
+                if counts["events_archived"]:
+                    pipe.hincrby(progress_key, "total_events_archived", counts["events_archived"])
+                pipe.hset(progress_key, mapping={"cursor": cursor, "last_run_at": now.isoformat()})
+                if pending:
+                    pipe.hset(progress_key, "pending", json.dumps(pending))
+                else:
+                    pipe.hdel(progress_key, "pending")
+                if finished:
+                    pipe.hset(progress_key, "pass_finished_at", datetime.utcnow().isoformat())
+                await pipe.execute()
+
+                if finished or pending or time.monotonic() - started >= run_seconds:
+                    break
+        finally:
+            try:
+                await run_script(_RELEASE_LOCK_LUA, [lock_key], [token])
+            except Exception as e:
+                logger.warning(f"Failed to release the retention lock: {e}")
+
+    progress = await get_retention_progress() or {}
+    progress["ran"] = True
+    progress["run_seconds"] = round(time.monotonic() - started, 2)
+    logger.info(f"Retention run finished: {progress}")
+    return progress
+
+async def get_retention_progress() -> Optional[Dict[str, Any]]:
+    """
+    Return the retention job's progress: the current pass's counters, when it
+    started and finished, its cursor and the cutoff it archives up to.
+    """
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return None
+            progress: Dict[str, Any] = await client.hgetall(RedisKeyPrefix.EVENT_RETENTION)
+    except Exception as e:
+        logger.error(f"Error reading retention progress: {e}")
+        return None
+    for counter in PASS_COUNTERS + ("total_events_archived", "cursor"):
+        if counter in progress:
+            progress[counter] = int(progress[counter])
+    pending = json.loads(progress.pop("pending", None) or "[]")
+    progress["pending_threads"] = len(pending)
+    progress["retention_days"] = EVENT_RETENTION_DAYS
+    progress["in_pass"] = progress.get("cursor", 0) != 0 or bool(pending)
+    return progress
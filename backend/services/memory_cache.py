@@ -0,0 +1,160 @@
+"""
+Babywise Chatbot - In-Process Memory Cache
+
+Bounded LRU cache used as the fallback store when Redis is unavailable.
+Entries are evicted least-recently-used first once either the entry budget
+or the byte budget is exceeded, and entries written with a TTL expire like
+their Redis counterparts.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cache budgets, overridable through the environment
+MEMORY_CACHE_MAX_ENTRIES = int(os.environ.get("MEMORY_CACHE_MAX_ENTRIES", "10000"))
+MEMORY_CACHE_MAX_BYTES = int(os.environ.get("MEMORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+_MISSING = object()
+
+def _estimate_size(key: str, value: Any) -> int:
+    """Approximate the memory held by an entry from its serialized size."""
+    if isinstance(value, (str, bytes)):
+        size = len(value)
+    else:
+        try:
+            size = len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            size = sys.getsizeof(value)
+    return size + len(key)
+
+class MemoryCache:
+    """
+    Least-recently-used cache with per-key TTLs and entry/byte budgets.
+
+    Supports the dict operations the fallback paths use (get, in, [], del,
+    pop, setdefault) so it can stand in for a plain dict, plus set() with a
+    TTL and stats() for the hit, miss and eviction counters.
+    """
+
+    def __init__(self, max_entries: int = MEMORY_CACHE_MAX_ENTRIES, max_bytes: int = MEMORY_CACHE_MAX_BYTES):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        # key -> (value, expires_at or None, size)
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[float], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _lookup(self, key: str) -> Any:
+        """Return the live value for key or _MISSING, dropping it if expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at, _ = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _remove(self, key: str) -> Any:
+        value, _, size = self._entries.pop(key)
+        self._bytes -= size
+        return value
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            logger.debug(f"Evicted {key} from memory cache")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """Store a value, expiring it after ttl seconds if given."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            size = _estimate_size(key, value)
+            expires_at = time.monotonic() + ttl if ttl else None
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            self._evict()
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            if self._lookup(key) is _MISSING:
+                return default
+            return self._remove(key)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.set(key, default)
+                return default
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the current size and the hit, miss and eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self._lookup(key) is not _MISSING
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.set(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        if self.pop(key, _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# Process-wide fallback cache shared by the Redis service and the API module
+memory_cache = MemoryCache()
@@ -0,0 +1,132 @@
+"""
+Babywise Chatbot - Routine Pattern Engine
+
+Keeps fixed-size counter arrays per thread and event type so pattern
+questions ("when does the baby usually nap?") are answered from a few
+hundred counters instead of a scan of the event history:
+
+- hour of week: 168 counters (7 days x 24 hours, UTC, Monday 00:00 first),
+  incremented when an event is written and decremented when it is deleted
+- sleep durations: one counter per duration bucket, fed by the sleep
+  periods of the daily rollups
+
+This module holds the pure computations; the counters live in Redis as
+BITFIELD arrays (see redis_service.adjust_counter_arrays).
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_DAY = 24
+HOURS_PER_WEEK = 7 * HOURS_PER_DAY
+
+# Upper bounds (minutes, exclusive) of the sleep duration buckets; the last
+# bucket is open-ended
+SLEEP_DURATION_BOUNDS = (30, 60, 90, 120, 180, 240, 360, 480, 720)
+SLEEP_DURATION_BUCKETS = len(SLEEP_DURATION_BOUNDS) + 1
+
+# Number of peak hours reported by summarize_hours
+PEAK_HOURS = 3
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+def hour_of_week(event_dt: datetime) -> int:
+    """Return the hour-of-week slot (0-167) of a naive UTC datetime."""
+    return event_dt.weekday() * HOURS_PER_DAY + event_dt.hour
+
+def duration_bucket(minutes: float) -> int:
+    """Return the duration bucket index for a sleep period length."""
+    for index, bound in enumerate(SLEEP_DURATION_BOUNDS):
+        if minutes < bound:
+            return index
+    return len(SLEEP_DURATION_BOUNDS)
+
+def duration_labels() -> List[str]:
+    """Return a readable label per duration bucket, e.g. "30-60m"."""
+    labels = []
+    lower = 0
+    for bound in SLEEP_DURATION_BOUNDS:
+        labels.append(f"{lower}-{bound}m")
+        lower = bound
+    labels.append(f"{lower}m+")
+    return labels
+
+def duration_histogram(durations_minutes: Sequence[float]) -> List[int]:
+    """Count sleep period lengths into the duration buckets."""
+    counts = [0] * SLEEP_DURATION_BUCKETS
+    for minutes in durations_minutes:
+        counts[duration_bucket(minutes)] += 1
+    return counts
+
+def encode_histogram(counts: Sequence[int]) -> str:
+    """Serialize a histogram for a daily rollup field."""
+    return ",".join(str(count) for count in counts)
+
+def decode_histogram(value: Optional[str], size: int = SLEEP_DURATION_BUCKETS) -> List[int]:
+    """Parse a histogram rollup field; missing or malformed fields count as empty."""
+    if not value:
+        return [0] * size
+    try:
+        counts = [int(count) for count in value.split(",")]
+    except ValueError:
+        logger.warning(f"Ignoring malformed histogram field: {value}")
+        return [0] * size
+    if len(counts) != size:
+        logger.warning(f"Ignoring histogram with {len(counts)} buckets, expected {size}")
+        return [0] * size
+    return counts
+
+def histogram_delta(old: Sequence[int], new: Sequence[int]) -> Dict[int, int]:
+    """Return the non-zero per-index differences new - old."""
+    return {index: n - o for index, (o, n) in enumerate(zip(old, new)) if n != o}
+
+def rotate_hours(counts: Sequence[int], utc_offset_minutes: int = 0) -> List[int]:
+    """
+    Shift hour-of-week counters from UTC to a local time offset.
+
+    Offsets are rounded to whole hours, the resolution of the counters.
+    """
+    shift = round(utc_offset_minutes / 60) % HOURS_PER_WEEK
+    if not shift:
+        return list(counts)
+    # Local slot s holds the UTC slot s - shift
+    return list(counts[-shift:]) + list(counts[:-shift])
+
+def summarize_hours(counts: Sequence[int], utc_offset_minutes: int = 0) -> Dict[str, Any]:
+    """
+    Summarize hour-of-week counters in local time.
+
+    Returns:
+        The raw hour-of-week counters, the counters folded to hour of day and
+        to day of week, the peak hours of the day, and the event total
+    """
+    local = rotate_hours(counts, utc_offset_minutes)
+    by_hour = [sum(local[day * HOURS_PER_DAY + hour] for day in range(7)) for hour in range(HOURS_PER_DAY)]
+    by_day = {WEEKDAYS[day]: sum(local[day * HOURS_PER_DAY:(day + 1) * HOURS_PER_DAY]) for day in range(7)}
+    total = sum(by_hour)
+    peaks = sorted((hour for hour in range(HOURS_PER_DAY) if by_hour[hour]), key=lambda hour: (-by_hour[hour], hour))
+    return {
+        "total_events": total,
+        "utc_offset_minutes": utc_offset_minutes,
+        "hour_of_week": local,
+        "hour_of_day": by_hour,
+        "day_of_week": by_day,
+        "peak_hours": [
+            {"hour": hour, "count": by_hour[hour], "share": round(by_hour[hour] / total, 3)}
+            for hour in peaks[:PEAK_HOURS]
+        ]
+    }
+
+def summarize_durations(counts: Sequence[int]) -> Dict[str, Any]:
+    """Summarize the sleep duration histogram with its most common bucket."""
+    labels = duration_labels()
+    total = sum(counts)
+    most_common = max(range(len(counts)), key=lambda index: counts[index]) if total else None
+    return {
+        "total_periods": total,
+        "buckets": [{"range": label, "count": count} for label, count in zip(labels, counts)],
+        "most_common": labels[most_common] if most_common is not None else None
+    }
@@ -35,9 +35,10 @@ async def get_redis_client() -> Optional[Any]:
             os.environ["UPSTASH_REDIS_URL"] = redis_url
 
         # Use the existing client from redis_service
-        if redis_service.client is not None:
+        client = redis_service.client
+        if client is not None:
             logger.debug("Using existing Redis client from redis_service")
-            return redis_service.client
+            return client
         else:
             logger.warning("Redis client not available from redis_service")
             return None
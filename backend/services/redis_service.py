@@ -4,10 +4,30 @@ This provides a higher-level interface to the Redis connection.
 """
 
 import os
+import copy
+import time
+import uuid
+import asyncio
 import logging
 import json
 import traceback
-from typing import Any, Dict, List, Optional, Union
+import contextlib
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from backend.services.memory_cache import MemoryCache, memory_cache
+from backend.services.single_flight import single_flight_group
+from backend.services.circuit_breaker import CircuitBreaker, CLOSED
+from backend.services.codec import codec, is_encoded
+from backend.services.thread_state_log import (
+    SAVE_THREAD_STATE_LUA, THREAD_MESSAGES_MAX, THREAD_ARCHIVE_MAX, THREAD_ARCHIVE_TTL,
+    MESSAGE_COUNT_FIELD, CONFLICT,
+    state_keys, encode_fields, encode_message, message_to_dict, field_digests,
+    checkpoint, plan_save, replace_plan, decode_state
+)
+from backend.services.event_layout import (
+    use_buckets, bucket_location
+)
 
 try:
     import redis.asyncio
@@ -19,8 +39,136 @@ except ImportError:
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# In-memory fallback cache when Redis is unavailable
-_memory_cache = {}
+# In-memory fallback cache when Redis is unavailable (bounded LRU shared
+# with the API module)
+_memory_cache = memory_cache
+
+# Client timeouts; the circuit breaker bounds how often they can be paid
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", "3.0"))
+REDIS_CONNECT_TIMEOUT = float(os.environ.get("REDIS_CONNECT_TIMEOUT", "2.0"))
+REDIS_RETRY_ON_TIMEOUT = os.environ.get("REDIS_RETRY_ON_TIMEOUT", "true").lower() == "true"
+
+# Connection pool. Callers beyond REDIS_MAX_CONNECTIONS wait up to
+# REDIS_POOL_TIMEOUT seconds for a free connection instead of opening more;
+# the L1 invalidation listener holds one connection for its subscription.
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", "20"))
+REDIS_POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", "2.0"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+REDIS_SOCKET_KEEPALIVE = os.environ.get("REDIS_SOCKET_KEEPALIVE", "true").lower() == "true"
+
+# Per-process L1 cache in front of Redis for hot keys such as thread state and
+# summaries. Entries are dropped when another process publishes a write on
+# CACHE_INVALIDATION_CHANNEL; the TTL bounds staleness if a message is missed.
+L1_CACHE_TTL = int(os.environ.get("L1_CACHE_TTL", "30"))
+L1_CACHE_MAX_ENTRIES = int(os.environ.get("L1_CACHE_MAX_ENTRIES", "1000"))
+CACHE_INVALIDATION_CHANNEL = "cache_invalidation"
+
+# Thread state expires after a day without writes
+THREAD_STATE_TTL = 86400
+
+# Maximum number of keys sent in a single MGET when batch-reading
+BATCH_READ_CHUNK_SIZE = int(os.environ.get("REDIS_BATCH_READ_CHUNK_SIZE", "100"))
+
+def _decode_value(value: Any) -> Any:
+    """Parse a stored value back to a dict if it is encoded or looks like a JSON object."""
+    if is_encoded(value):
+        try:
+            return codec.decode(value)
+        except Exception as e:
+            logger.error(f"Could not decode stored value: {e}")
+            return None
+    if isinstance(value, str) and value.startswith('{') and value.endswith('}'):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value
+    return value
+
+# Outage failures recorded by connection() blocks in the current task. An
+# enclosing block that handled a nested block's failure doesn't report success.
+_outages_recorded: contextvars.ContextVar[int] = contextvars.ContextVar("redis_outages_recorded", default=0)
+
+def _is_outage(error: Exception) -> bool:
+    """Whether an error means Redis is unreachable rather than rejecting a command."""
+    if REDIS_AVAILABLE and isinstance(error, PoolExhaustedError):
+        # Local saturation, not a Redis outage
+        return False
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, TimeoutError, OSError)):
+        return True
+    if REDIS_AVAILABLE:
+        return isinstance(error, (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError))
+    return False
+
+if REDIS_AVAILABLE:
+    class PoolExhaustedError(redis.exceptions.ConnectionError):
+        """No pooled connection became free within REDIS_POOL_TIMEOUT."""
+    
+    class MeteredConnectionPool(redis.asyncio.BlockingConnectionPool):
+        """
+        Blocking connection pool that counts connections and waiters.
+        
+        Only callers that find every connection in use count as waiting, and
+        only their time until a connection frees up is timed; connecting
+        the handed-over connection is not part of the wait.
+        """
+        
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.created = 0
+            self.waiting = 0
+            self.max_waiting = 0
+            self.acquired = 0
+            self.waited = 0
+            self.wait_timeouts = 0
+            self.total_wait_seconds = 0.0
+        
+        def make_connection(self):
+            self.created += 1
+            return super().make_connection()
+        
+        async def get_connection(self, *args, **kwargs):
+            # Same steps as BlockingConnectionPool.get_connection, metered
+            async with self._condition:
+                blocked = not self.can_get_connection()
+                if blocked:
+                    started = time.monotonic()
+                    self.waiting += 1
+                    self.max_waiting = max(self.max_waiting, self.waiting)
+                try:
+                    async with asyncio.timeout(self.timeout):
+                        await self._condition.wait_for(self.can_get_connection)
+                        connection = self.get_available_connection()
+                except asyncio.TimeoutError as e:
+                    self.wait_timeouts += 1
+                    raise PoolExhaustedError(f"No connection available within {self.timeout}s") from e
+                finally:
+                    if blocked:
+                        self.waiting -= 1
+                        self.waited += 1
+                        self.total_wait_seconds += time.monotonic() - started
+            self.acquired += 1
+            
+            try:
+                await self.ensure_connection(connection)
+                return connection
+            except BaseException:
+                await self.release(connection)
+                raise
+        
+        def stats(self) -> Dict[str, Any]:
+            """Return pool utilization counters."""
+            return {
+                "max_connections": self.max_connections,
+                "created": self.created,
+                "in_use": len(getattr(self, "_in_use_connections", ())),
+                "idle": len([c for c in getattr(self, "_available_connections", ()) if c is not None]),
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "wait_timeouts": self.wait_timeouts,
+                "avg_wait_ms": round(self.total_wait_seconds / self.waited * 1000, 3) if self.waited else None
+            }
 
 class RedisService:
     """
@@ -30,7 +178,19 @@ class RedisService:
     
     def __init__(self):
         """Initialize the Redis service."""
-        self.client = None
+        self._client = None
+        self.pool = None
+        self.breaker = CircuitBreaker("redis")
+        self.l1 = MemoryCache(max_entries=L1_CACHE_MAX_ENTRIES)
+        self._worker_id = uuid.uuid4().hex
+        self._listener_task = None
+        self._l1_active = False
+        self._l1_generation = 0
+        self._reads = single_flight_group("redis_reads")
+        # Field fingerprints of thread states this process last loaded or saved
+        self._state_digests = MemoryCache(max_entries=L1_CACHE_MAX_ENTRIES)
+        # Message checkpoints of the same states (see thread_state_log)
+        self._state_checkpoints = MemoryCache(max_entries=L1_CACHE_MAX_ENTRIES)
         if REDIS_AVAILABLE:
             try:
                 # Try Upstash URL first, fall back to STORAGE_URL
@@ -44,18 +204,63 @@ class RedisService:
                     
                 logger.info(f"Initializing Redis client with URL: {redis_url.split('@')[0]}@...")
                 
-                self.client = redis.asyncio.from_url(
+                self.pool = MeteredConnectionPool.from_url(
                     redis_url,
+                    max_connections=REDIS_MAX_CONNECTIONS,
+                    timeout=REDIS_POOL_TIMEOUT,
+                    health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+                    socket_keepalive=REDIS_SOCKET_KEEPALIVE,
                     decode_responses=True,
-                    socket_timeout=3.0,
-                    socket_connect_timeout=2.0,
-                    retry_on_timeout=True
+                    socket_timeout=REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                    retry_on_timeout=REDIS_RETRY_ON_TIMEOUT
                 )
-                logger.info("Redis client initialized")
+                self._client = redis.asyncio.Redis(connection_pool=self.pool)
+                logger.info(f"Redis client initialized with a pool of up to {REDIS_MAX_CONNECTIONS} connections")
             except Exception as e:
                 logger.error(f"Error initializing Redis client: {e}")
                 logger.error(traceback.format_exc())
     
+    @property
+    def client(self) -> Optional[Any]:
+        """The Redis client, or None if it is unavailable or the circuit is open."""
+        if self._client is None or not self.breaker.allow_request():
+            return None
+        return self._client
+    
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        """
+        Yield the Redis client (or None while the circuit is open) and report
+        the outcome of the block to the circuit breaker.
+        
+        An outage error leaving the block is a failure, and any other exit a
+        success. If a nested block already recorded a failure, even one that
+        was then handled, the block records nothing more. Code that catches
+        Redis errors must do so outside the block (or around a nested one)
+        for them to count.
+        """
+        client = self.client
+        if client is None:
+            yield None
+            return
+        outages_before = _outages_recorded.get()
+        try:
+            yield client
+        except Exception as e:
+            if _outages_recorded.get() != outages_before:
+                raise
+            if _is_outage(e):
+                self.breaker.record_failure()
+                _outages_recorded.set(outages_before + 1)
+            else:
+                # Redis answered, even if with an error
+                self.breaker.record_success()
+            raise
+        else:
+            if _outages_recorded.get() == outages_before:
+                self.breaker.record_success()
+    
     async def get(self, key: str) -> Optional[Any]:
         """
         Get a value from Redis.
@@ -74,35 +279,75 @@ class RedisService:
         logger.debug(f"Getting value for key: {key}")
         
         try:
-            if self.client:
-                # Try to get from Redis
-                value = await self.client.get(key)
-                
-                if value is not None:
-                    logger.debug(f"Got value from Redis for key: {key}")
+            async with self.connection() as client:
+                if client:
+                    # Try to get from Redis
+                    value = await client.get(key)
                     
-                    # Try to parse JSON if it looks like JSON
-                    if isinstance(value, str) and value.startswith('{') and value.endswith('}'):
-                        try:
-                            return json.loads(value)
-                        except json.JSONDecodeError:
-                            return value
-                    return value
+                    if value is not None:
+                        logger.debug(f"Got value from Redis for key: {key}")
+                        
+                        # Try to parse JSON if it looks like JSON
+                        return _decode_value(value)
+                    else:
+                        logger.debug(f"No value found in Redis for key: {key}")
                 else:
-                    logger.debug(f"No value found in Redis for key: {key}")
-            else:
-                logger.warning("Redis client not available")
+                    logger.warning("Redis client not available")
         except Exception as e:
             logger.error(f"Error getting value from Redis for key {key}: {e}")
         
         # Fall back to memory cache
-        if key in _memory_cache:
+        value = _memory_cache.get(key)
+        if value is not None:
             logger.info(f"Using memory cache fallback for key: {key}")
-            return _memory_cache.get(key)
+            return value
         
         logger.debug(f"No value found for key: {key}")
         return None
     
+    async def get_many(self, keys: List[str], chunk_size: Optional[int] = None) -> List[Optional[Any]]:
+        """
+        Get several values from Redis in one round trip.
+        Keys are split into MGET chunks of at most chunk_size keys, and all
+        chunks are sent through a single non-transactional pipeline.
+        Missing values fall back to the memory cache.
+        
+        Args:
+            keys: The keys to retrieve
+            chunk_size: Maximum keys per MGET (defaults to BATCH_READ_CHUNK_SIZE)
+            
+        Returns:
+            A list of values aligned with keys, with None for missing keys
+        """
+        if not keys:
+            return []
+            
+        chunk_size = max(1, chunk_size or BATCH_READ_CHUNK_SIZE)
+        values: List[Optional[Any]] = [None] * len(keys)
+        
+        try:
+            async with self.connection() as client:
+                if client:
+                    pipe = client.pipeline(transaction=False)
+                    for start in range(0, len(keys), chunk_size):
+                        pipe.mget(keys[start:start + chunk_size])
+                    chunks = await pipe.execute()
+                    
+                    flat = [value for chunk in chunks for value in chunk]
+                    values = [_decode_value(value) for value in flat]
+                    logger.debug(f"Batch read {len(keys)} keys from Redis in {len(chunks)} chunks")
+                else:
+                    logger.warning("Redis client not available for batch read")
+        except Exception as e:
+            logger.error(f"Error batch reading {len(keys)} keys from Redis: {e}")
+        
+        # Fill any gaps from the memory cache
+        for i, key in enumerate(keys):
+            if values[i] is None:
+                values[i] = _memory_cache.get(key)
+        
+        return values
+    
     async def set(self, key: str, value: Any, expiration: Optional[int] = None) -> bool:
         """
         Set a value in Redis.
@@ -122,35 +367,31 @@ class RedisService:
             
         logger.debug(f"Setting value for key: {key}")
         
-        # Convert complex objects to JSON strings for storage
+        # Convert complex objects to JSON strings for storage, compressing
+        # large ones
         if isinstance(value, (dict, list)):
-            value = json.dumps(value, default=str)
+            value = codec.encode(value)
         
         success = False
         try:
-            if self.client:
-                # Try to set in Redis
-                if expiration:
-                    await self.client.set(key, value, ex=expiration)
+            async with self.connection() as client:
+                if client:
+                    # Try to set in Redis
+                    if expiration:
+                        await client.set(key, value, ex=expiration)
+                    else:
+                        await client.set(key, value)
+                    logger.debug(f"Value set in Redis for key: {key}")
+                    success = True
                 else:
-                    await self.client.set(key, value)
-                logger.debug(f"Value set in Redis for key: {key}")
-                success = True
-            else:
-                logger.warning("Redis client not available for setting value")
+                    logger.warning("Redis client not available for setting value")
         except Exception as e:
             logger.error(f"Error setting value in Redis for key {key}: {e}")
         
         # Always update memory cache
         try:
             # For memory cache, store already parsed objects if possible
-            if isinstance(value, str) and value.startswith('{') and value.endswith('}'):
-                try:
-                    _memory_cache[key] = json.loads(value)
-                except json.JSONDecodeError:
-                    _memory_cache[key] = value
-            else:
-                _memory_cache[key] = value
+            _memory_cache.set(key, _decode_value(value), expiration)
                 
             logger.debug(f"Value set in memory cache for key: {key}")
             
@@ -179,20 +420,20 @@ class RedisService:
         
         success = False
         try:
-            if self.client:
-                # Try to delete from Redis
-                await self.client.delete(key)
-                logger.debug(f"Key deleted from Redis: {key}")
-                success = True
-            else:
-                logger.warning("Redis client not available for deleting key")
+            async with self.connection() as client:
+                if client:
+                    # Try to delete from Redis
+                    await client.delete(key)
+                    logger.debug(f"Key deleted from Redis: {key}")
+                    success = True
+                else:
+                    logger.warning("Redis client not available for deleting key")
         except Exception as e:
             logger.error(f"Error deleting key from Redis: {key}, error: {e}")
         
         # Always try to delete from memory cache
         try:
-            if key in _memory_cache:
-                del _memory_cache[key]
+            if _memory_cache.pop(key, None) is not None:
                 logger.debug(f"Key deleted from memory cache: {key}")
                 
             # We consider it a success if at least we got here without errors
@@ -219,13 +460,14 @@ class RedisService:
         logger.debug(f"Checking if key exists: {key}")
         
         try:
-            if self.client:
-                # Try to check in Redis
-                exists = await self.client.exists(key)
-                logger.debug(f"Key {key} exists in Redis: {exists}")
-                return exists == 1
-            else:
-                logger.warning("Redis client not available for checking key existence")
+            async with self.connection() as client:
+                if client:
+                    # Try to check in Redis
+                    exists = await client.exists(key)
+                    logger.debug(f"Key {key} exists in Redis: {exists}")
+                    return exists == 1
+                else:
+                    logger.warning("Redis client not available for checking key existence")
         except Exception as e:
             logger.error(f"Error checking if key exists in Redis: {key}, error: {e}")
         
@@ -242,13 +484,249 @@ class RedisService:
             True if Redis responds to ping, False otherwise
         """
         try:
-            if self.client:
-                response = await self.client.ping()
-                return response
+            async with self.connection() as client:
+                if client:
+                    response = await client.ping()
+                    return response
             return False
         except Exception as e:
             logger.error(f"Error pinging Redis: {e}")
             return False
+    
+    def _ensure_invalidation_listener(self) -> bool:
+        """
+        Start the pub/sub listener that keeps the L1 cache coherent.
+        
+        Returns:
+            True if the listener is subscribed and L1 entries may be served
+        """
+        if self._l1_active:
+            return True
+        if not self._client or self.breaker.state != CLOSED or L1_CACHE_TTL <= 0:
+            return False
+        if self._listener_task is None or self._listener_task.done():
+            self._listener_task = asyncio.get_running_loop().create_task(self._listen_for_invalidations())
+        return False
+    
+    async def _listen_for_invalidations(self) -> None:
+        """Drop L1 entries for keys written by other processes."""
+        pubsub = self._client.pubsub()
+        try:
+            await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            self._l1_active = True
+            logger.info(f"Subscribed to {CACHE_INVALIDATION_CHANNEL} for L1 cache invalidation")
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                origin, _, key = str(message.get("data", "")).partition(" ")
+                if origin != self._worker_id:
+                    self._l1_generation += 1
+                    self.l1.pop(key, None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"L1 cache invalidation listener stopped: {e}")
+        finally:
+            # Without invalidations the L1 entries can't be trusted
+            self._l1_active = False
+            self.l1.clear()
+            with contextlib.suppress(Exception):
+                await pubsub.close()
+    
+    async def _publish_invalidation(self, key: str) -> None:
+        try:
+            async with self.connection() as client:
+                if client:
+                    await client.publish(CACHE_INVALIDATION_CHANNEL, f"{self._worker_id} {key}")
+        except Exception as e:
+            logger.warning(f"Failed to publish cache invalidation for key {key}: {e}")
+    
+    async def get_cached(self, key: str, load: Optional[Callable[[], Awaitable[Any]]] = None) -> Optional[Any]:
+        """
+        Get a value through the per-process L1 cache.
+        L1 hits skip Redis entirely; misses read Redis and populate L1.
+        
+        Args:
+            key: The key to retrieve
+            load: Reads the value on a miss (defaults to get(key))
+            
+        Returns:
+            The value if found, or None
+        """
+        l1_active = self._ensure_invalidation_listener()
+        if l1_active:
+            value = self.l1.get(key)
+            if value is not None:
+                logger.debug(f"L1 cache hit for key: {key}")
+                return copy.deepcopy(value)
+        
+        # Concurrent misses for the same key share one Redis read
+        return await self._reads.do(key, lambda: self._read_through(key, l1_active, load))
+    
+    async def _read_through(self, key: str, l1_active: bool,
+                            load: Optional[Callable[[], Awaitable[Any]]] = None) -> Optional[Any]:
+        generation = self._l1_generation
+        value = await (load() if load else self.get(key))
+        # Skip caching if an invalidation arrived while Redis was being read
+        if value is not None and l1_active and self._l1_active and generation == self._l1_generation:
+            self.l1.set(key, copy.deepcopy(value), L1_CACHE_TTL)
+        return value
+    
+    async def set_cached(self, key: str, value: Any, expiration: Optional[int] = None) -> bool:
+        """
+        Set a value in Redis and the local L1 cache, and tell other processes
+        to drop their L1 copy.
+        """
+        success = await self.set(key, value, expiration)
+        if self._l1_active:
+            self.l1.set(key, copy.deepcopy(value), min(L1_CACHE_TTL, expiration or L1_CACHE_TTL))
+        await self._publish_invalidation(key)
+        return success
+    
+    async def delete_cached(self, key: str) -> bool:
+        """Delete a value from Redis and every process's L1 cache."""
+        self.l1.pop(key, None)
+        success = await self.delete(key)
+        await self._publish_invalidation(key)
+        return success
+    
+    async def get_thread_state(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the conversation state of a thread: its fields plus the live
+        messages. What save_thread_state needs to find the new messages is
+        kept by the service, not in the state (see thread_state_log).
+        """
+        state_key = state_keys(thread_id)[0]
+        return await self.get_cached(state_key, lambda: self._load_thread_state(thread_id))
+    
+    async def _load_thread_state(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        state_key, messages_key, _ = state_keys(thread_id)
+        try:
+            async with self.connection() as client:
+                if client:
+                    pipe = client.pipeline(transaction=True)
+                    pipe.hgetall(state_key)
+                    pipe.lrange(messages_key, 0, -1)
+                    fields, messages = await pipe.execute(raise_on_error=False)
+                    if isinstance(fields, Exception):
+                        # Written before the split layout as one JSON document;
+                        # the next save converts it
+                        legacy = _decode_value(await client.get(state_key))
+                        if isinstance(legacy, dict):
+                            return legacy
+                    else:
+                        decoded = decode_state(fields, messages)
+                        if decoded is not None:
+                            state, loaded = decoded
+                            stored = {key: value for key, value in fields.items() if key != MESSAGE_COUNT_FIELD}
+                            self._state_digests.set(state_key, field_digests(stored), THREAD_STATE_TTL)
+                            self._state_checkpoints.set(state_key, loaded, THREAD_STATE_TTL)
+                            return state
+                else:
+                    logger.warning("Redis client not available for reading thread state")
+        except Exception as e:
+            logger.error(f"Error reading thread state for {thread_id} from Redis: {e}")
+        
+        # Fall back to memory cache
+        state = _memory_cache.get(state_key)
+        if state is not None:
+            logger.info(f"Using memory cache fallback for thread state: {thread_id}")
+        return state
+    
+    async def save_thread_state(self, thread_id: str, state: Dict[str, Any]) -> bool:
+        """
+        Save the conversation state of a thread.
+        
+        A state loaded with get_thread_state only appends its new messages
+        and writes its changed fields; other states, or states that changed
+        in Redis since they were loaded, are rewritten whole. Either way it
+        is one script call that also advances the thread's version. The
+        saved messages become the new checkpoint, so the state can be saved
+        again after more messages are added.
+        """
+        state_key = state_keys(thread_id)[0]
+        fields = encode_fields(state)
+        try:
+            async with self.connection() as client:
+                if client:
+                    script = _get_script(client, SAVE_THREAD_STATE_LUA)
+                    loaded = self._state_checkpoints.get(state_key)
+                    plan = plan_save(state, fields, self._state_digests.get(state_key), loaded)
+                    total = await self._run_state_save(script, thread_id, plan)
+                    if total == CONFLICT:
+                        logger.info(f"Thread state {thread_id} changed since it was loaded, rewriting it")
+                        plan = replace_plan(state, fields, keep_archive=True)
+                        total = await self._run_state_save(script, thread_id, plan)
+                    logger.debug(f"Saved thread state {thread_id}: {plan[0]} of {len(plan[4])} messages, {len(plan[2])} fields")
+                    self._state_digests.set(state_key, field_digests(fields), THREAD_STATE_TTL)
+                    self._state_checkpoints.set(state_key, checkpoint(total, state.get("messages") or []), THREAD_STATE_TTL)
+                else:
+                    logger.warning("Redis client not available for saving thread state")
+        except Exception as e:
+            logger.error(f"Error saving thread state for {thread_id} to Redis: {e}")
+        
+        # Always update memory cache and the local L1 copy; as with set(),
+        # the memory cache alone counts as saved
+        snapshot = dict(state)
+        snapshot["messages"] = [message_to_dict(message) for message in state.get("messages") or []]
+        _memory_cache.set(state_key, snapshot, THREAD_STATE_TTL)
+        if self._l1_active:
+            self.l1.set(state_key, copy.deepcopy(snapshot), L1_CACHE_TTL)
+        await self._publish_invalidation(state_key)
+        return True
+    
+    async def _run_state_save(self, script: Any, thread_id: str, plan: tuple) -> int:
+        mode, mode_arg, fields, removed, messages = plan
+        return int(await script(
+            keys=[*state_keys(thread_id), f"thread_state_version:{thread_id}"],
+            args=[
+                mode, mode_arg, THREAD_STATE_TTL, THREAD_ARCHIVE_TTL, THREAD_MESSAGES_MAX, THREAD_ARCHIVE_MAX,
+                json.dumps(fields), json.dumps(removed), *[encode_message(message) for message in messages]
+            ]
+        ))
+    
+    async def delete_thread_state(self, thread_id: str) -> bool:
+        """Delete the conversation state and messages of a thread and advance its version."""
+        state_key, messages_key, archive_key = state_keys(thread_id)
+        self._state_digests.pop(state_key, None)
+        self._state_checkpoints.pop(state_key, None)
+        success = await self.delete_cached(state_key)
+        try:
+            async with self.connection() as client:
+                if client:
+                    await client.delete(messages_key, archive_key)
+        except Exception as e:
+            logger.error(f"Error deleting messages of thread {thread_id}: {e}")
+        await self._bump_thread_state_version(thread_id)
+        return success
+    
+    async def _bump_thread_state_version(self, thread_id: str) -> None:
+        try:
+            async with self.connection() as client:
+                if client:
+                    await client.incr(f"thread_state_version:{thread_id}")
+        except Exception as e:
+            logger.warning(f"Failed to advance thread state version for {thread_id}: {e}")
+    
+    def pool_stats(self) -> Optional[Dict[str, Any]]:
+        """Return connection pool utilization, or None without a pool."""
+        return self.pool.stats() if self.pool is not None else None
+    
+    async def get_counter(self, key: str) -> Optional[int]:
+        """
+        Read an integer counter such as a per-thread write version.
+        
+        Returns:
+            The counter (0 if it was never set), or None if Redis is unavailable
+        """
+        try:
+            async with self.connection() as client:
+                if client:
+                    value = await client.get(key)
+                    return int(value) if value is not None else 0
+        except Exception as e:
+            logger.warning(f"Error reading counter {key}: {e}")
+        return None
 
 # Create a singleton instance
 redis_service = RedisService()
@@ -258,6 +736,10 @@ async def get_redis(key: str) -> Optional[Any]:
     """Get a value from Redis."""
     return await redis_service.get(key)
 
+async def get_many_redis(keys: List[str], chunk_size: Optional[int] = None) -> List[Optional[Any]]:
+    """Get several values from Redis in one round trip."""
+    return await redis_service.get_many(keys, chunk_size)
+
 async def set_redis(key: str, value: Any, expiration: Optional[int] = None) -> bool:
     """Set a value in Redis."""
     return await redis_service.set(key, value, expiration)
@@ -272,4 +754,1071 @@ async def exists_redis(key: str) -> bool:
 
 async def ping_redis() -> bool:
     """Check if Redis is responsive."""
-    return await redis_service.ping() 
\ No newline at end of file
+    return await redis_service.ping() 
+
+async def get_thread_state(thread_id: str) -> Optional[Dict[str, Any]]:
+    """Get the conversation state of a thread through the L1 cache."""
+    return await redis_service.get_thread_state(thread_id)
+
+async def save_thread_state(thread_id: str, state: Dict[str, Any]) -> bool:
+    """Save the conversation state of a thread."""
+    return await redis_service.save_thread_state(thread_id, state)
+
+async def delete_thread_state(thread_id: str) -> bool:
+    """Delete the conversation state of a thread."""
+    return await redis_service.delete_thread_state(thread_id)
+
+async def get_thread_state_version(thread_id: str) -> Optional[int]:
+    """Get the write version of a thread's conversation state."""
+    return await redis_service.get_counter(f"thread_state_version:{thread_id}")
+
+async def get_event_version(thread_id: str) -> Optional[int]:
+    """Get the write version of a thread's routine events (its change sequence)."""
+    return await redis_service.get_counter(f"{RedisKeyPrefix.EVENT_SEQ}:{thread_id}")
+
+# Key prefixes shared by the routine event store
+class RedisKeyPrefix:
+    """Namespaces for routine-related Redis keys."""
+    EVENT = "event"
+    THREAD_EVENTS = "thread_events"
+    THREAD_EVENTS_BY_TIME = "thread_events_by_time"
+    THREAD_EVENTS_INDEXED = "thread_events_indexed"
+    LATEST_EVENT = "latest_event"
+    EVENT_LOCAL_IDS = "event_local_ids"
+    EVENT_SEQ = "event_seq"
+    EVENT_CHANGES = "event_changes"
+    EVENT_CHANGES_SEEDED = "event_changes_seeded"
+    EVENT_CHANGES_TRIMMED = "event_changes_trimmed"
+    ROUTINE_DAILY = "routine_daily"
+    ROUTINE_DAILY_READY = "routine_daily_ready"
+    ROUTINE_SUMMARY = "routine_summary"
+    ROUTINE_SUMMARY_STALE = "routine_summary_stale"
+    PATTERN_HOURS = "routine_pattern_hours"
+    PATTERN_DURATIONS = "routine_pattern_durations"
+    PATTERNS_READY = "routine_patterns_ready"
+    EVENT_ARCHIVE = "event_archive"
+    EVENT_ARCHIVE_MONTHS = "event_archive_months"
+    EVENT_RETENTION = "event_retention"
+    EVENT_RETENTION_LOCK = "event_retention_lock"
+    ROUTINE_TYPE_SUMMARY = "routine_type_summary"
+    RECENT_EVENTS = "recent_events"
+    ACTIVE_ROUTINE = "active_routine"
+
+
+@contextlib.asynccontextmanager
+async def redis_connection():
+    """
+    Provide the shared redis client (or None) for code that needs raw commands
+    such as list and sorted-set operations. Yields None while the circuit
+    breaker is open so callers fall back without waiting on timeouts.
+    """
+    async with redis_service.connection() as client:
+        if client is None:
+            logger.warning("Redis client not available from redis_service")
+        yield client
+
+
+async def get_with_fallback(key: str) -> Optional[Any]:
+    """Get a value from Redis, falling back to the memory cache."""
+    return await redis_service.get(key)
+
+
+async def get_many_with_fallback(keys: List[str], chunk_size: Optional[int] = None) -> List[Optional[Any]]:
+    """Batch-get values from Redis, falling back to the memory cache per key."""
+    return await redis_service.get_many(keys, chunk_size)
+
+
+async def get_events_with_fallback(event_keys: List[str]) -> List[Optional[Any]]:
+    """
+    Batch-get routine event payloads from the configured storage layout.
+
+    With the bucket layout, payloads are read with HMGETs on their buckets,
+    all in one pipeline. Events missing from their bucket (written before
+    the switch) are read from their own keys, then from the memory cache.
+
+    Args:
+        event_keys: The event keys to retrieve
+
+    Returns:
+        A list of payloads aligned with event_keys, with None for missing events
+    """
+    if not use_buckets() or not event_keys:
+        return await redis_service.get_many(event_keys)
+    
+    values: List[Optional[Any]] = [None] * len(event_keys)
+    fields_by_bucket: Dict[str, List[Tuple[int, str]]] = {}
+    for position, event_key in enumerate(event_keys):
+        location = bucket_location(event_key, RedisKeyPrefix.EVENT)
+        if location:
+            fields_by_bucket.setdefault(location[0], []).append((position, location[1]))
+    
+    try:
+        async with redis_connection() as client:
+            if client and fields_by_bucket:
+                pipe = client.pipeline(transaction=False)
+                requests = []
+                for bucket_key, fields in fields_by_bucket.items():
+                    for start in range(0, len(fields), BATCH_READ_CHUNK_SIZE):
+                        chunk = fields[start:start + BATCH_READ_CHUNK_SIZE]
+                        pipe.hmget(bucket_key, [field for _, field in chunk])
+                        requests.append(chunk)
+                for chunk, found in zip(requests, await pipe.execute()):
+                    for (position, _), value in zip(chunk, found):
+                        values[position] = _decode_value(value)
+                logger.debug(f"Read {len(event_keys)} events from {len(fields_by_bucket)} buckets")
+    except Exception as e:
+        logger.error(f"Error reading {len(event_keys)} events from their buckets: {e}")
+    
+    missing = [position for position, value in enumerate(values) if value is None]
+    if missing:
+        fallback = await redis_service.get_many([event_keys[position] for position in missing])
+        for position, value in zip(missing, fallback):
+            values[position] = value
+    return values
+
+
+def queue_event_payload(pipe: Any, event_key: str, payload: str) -> None:
+    """
+    Queue the commands that store an encoded event payload in the configured
+    layout. With the bucket layout the event's own key is deleted, so
+    rewriting an event written before the switch moves it into its bucket.
+    """
+    location = bucket_location(event_key, RedisKeyPrefix.EVENT) if use_buckets() else None
+    if location:
+        pipe.hset(location[0], location[1], payload)
+        pipe.delete(event_key)
+    else:
+        pipe.set(event_key, payload)
+
+
+async def set_with_fallback(key: str, value: Any, expiration: Optional[int] = None) -> bool:
+    """Set a value in Redis and the memory cache."""
+    return await redis_service.set(key, value, expiration)
+
+
+async def get_cached_with_fallback(key: str) -> Optional[Any]:
+    """Get a value through the L1 cache, then Redis, then the memory cache."""
+    return await redis_service.get_cached(key)
+
+
+async def set_cached_with_fallback(key: str, value: Any, expiration: Optional[int] = None) -> bool:
+    """Set a value in Redis and the L1 cache, invalidating other processes."""
+    return await redis_service.set_cached(key, value, expiration)
+
+
+async def delete_cached_with_fallback(key: str) -> bool:
+    """Delete a value from Redis and every process's L1 cache."""
+    return await redis_service.delete_cached(key)
+
+
+async def delete_with_fallback(key: str) -> bool:
+    """Delete a value from Redis and the memory cache."""
+    return await redis_service.delete(key)
+
+
+# Per-routine-type caches of the SQLite routine tracker, dropped whenever
+# one of the thread's events of that type changes
+ROUTINE_SUMMARY_CACHE_TTL = int(os.environ.get("ROUTINE_SUMMARY_CACHE_TTL", "300"))
+RECENT_EVENTS_CACHE_TTL = int(os.environ.get("RECENT_EVENTS_CACHE_TTL", "300"))
+ACTIVE_ROUTINE_CACHE_TTL = int(os.environ.get("ACTIVE_ROUTINE_CACHE_TTL", "86400"))
+
+
+async def cache_routine_summary(thread_id: str, routine_type: str, summary: Dict[str, Any]) -> bool:
+    """Cache the summary of one routine type for a thread."""
+    return await set_cached_with_fallback(
+        f"{RedisKeyPrefix.ROUTINE_TYPE_SUMMARY}:{thread_id}:{routine_type}", summary, ROUTINE_SUMMARY_CACHE_TTL
+    )
+
+
+async def get_cached_routine_summary(thread_id: str, routine_type: str) -> Optional[Dict[str, Any]]:
+    """Get the cached summary of one routine type for a thread, if any."""
+    return await get_cached_with_fallback(f"{RedisKeyPrefix.ROUTINE_TYPE_SUMMARY}:{thread_id}:{routine_type}")
+
+
+async def cache_recent_events(thread_id: str, routine_type: str, events: List[Dict[str, Any]],
+                              window: Optional[str] = None) -> bool:
+    """
+    Cache the events of one routine type last read for a thread.
+
+    Args:
+        thread_id: The thread the events belong to
+        routine_type: The event type
+        events: The events, JSON-serializable
+        window: The date range the events were read for, if any
+    """
+    return await set_cached_with_fallback(
+        f"{RedisKeyPrefix.RECENT_EVENTS}:{thread_id}:{routine_type}",
+        {"window": window, "events": events},
+        RECENT_EVENTS_CACHE_TTL
+    )
+
+
+async def get_cached_recent_events(thread_id: str, routine_type: str,
+                                   window: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Get the cached events of one routine type for a thread.
+
+    With a window, only events cached for that same date range are returned.
+    """
+    cached = await get_cached_with_fallback(f"{RedisKeyPrefix.RECENT_EVENTS}:{thread_id}:{routine_type}")
+    if not isinstance(cached, dict) or (window is not None and cached.get("window") != window):
+        return None
+    return cached.get("events")
+
+
+async def cache_active_routine(thread_id: str, routine_type: str, routine_data: Dict[str, Any]) -> bool:
+    """Cache a routine in progress (such as a sleep without its end) for a thread."""
+    return await set_cached_with_fallback(
+        f"{RedisKeyPrefix.ACTIVE_ROUTINE}:{thread_id}:{routine_type}", routine_data, ACTIVE_ROUTINE_CACHE_TTL
+    )
+
+
+async def get_active_routine(thread_id: str, routine_type: str) -> Optional[Dict[str, Any]]:
+    """Get the cached routine in progress of a type for a thread, if any."""
+    return await get_cached_with_fallback(f"{RedisKeyPrefix.ACTIVE_ROUTINE}:{thread_id}:{routine_type}")
+
+
+async def invalidate_routine_cache(thread_id: str, routine_type: str) -> bool:
+    """Drop the cached summary, events and active routine of one routine type for a thread."""
+    results = [
+        await delete_cached_with_fallback(f"{prefix}:{thread_id}:{routine_type}")
+        for prefix in (RedisKeyPrefix.ROUTINE_TYPE_SUMMARY, RedisKeyPrefix.RECENT_EVENTS, RedisKeyPrefix.ACTIVE_ROUTINE)
+    ]
+    return all(results)
+
+
+async def list_append(key: str, value: str) -> bool:
+    """
+    Append a value to a Redis list.
+
+    Args:
+        key: The list key
+        value: The value to append
+
+    Returns:
+        True if the value was appended, False otherwise
+    """
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return False
+            await client.rpush(key, value)
+            return True
+    except Exception as e:
+        logger.error(f"Error appending to list {key}: {e}")
+        return False
+
+
+async def add_event_to_thread(thread_id: str, event_key: str, event_ts: Optional[float] = None) -> bool:
+    """
+    Register an event key with its thread.
+
+    The key is appended to the thread's event list and, when the event time is
+    known, added to the thread's time index (a sorted set scored by epoch
+    seconds) so date-range reads can use ZRANGEBYSCORE. A brand-new thread is
+    marked as fully indexed; older threads are marked once their list has
+    been backfilled into the index.
+
+    Args:
+        thread_id: The thread the event belongs to
+        event_key: The Redis key holding the event payload
+        event_ts: Event time as UTC epoch seconds, if known
+
+    Returns:
+        True if the key was registered, False otherwise
+    """
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return False
+            pipe = client.pipeline(transaction=False)
+            pipe.rpush(f"{RedisKeyPrefix.THREAD_EVENTS}:{thread_id}", event_key)
+            if event_ts is not None:
+                pipe.zadd(f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}", {event_key: event_ts})
+            results = await pipe.execute()
+            if event_ts is not None and results[0] == 1:
+                # First event of the thread, so the index is complete
+                await client.set(f"{RedisKeyPrefix.THREAD_EVENTS_INDEXED}:{thread_id}", "1")
+            return True
+    except Exception as e:
+        logger.error(f"Error adding event {event_key} to thread {thread_id}: {e}")
+        return False
+
+
+# Replace the (thread, event_type) latest-event pointer unless it already
+# points at a newer event.
+# KEYS[1] = latest_event hash; ARGV = event_type, event_ts, event_key, payload
+_SET_LATEST_EVENT_LUA = """
+local current = redis.call('HGET', KEYS[1], ARGV[1] .. ':ts')
+if current and tonumber(current) > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[4], ARGV[1] .. ':ts', ARGV[2], ARGV[1] .. ':key', ARGV[3])
+return 1
+"""
+
+# Move the latest-event pointer off a deleted event onto another event of the
+# same type, or clear it, unless it has moved on already.
+# KEYS[1] = latest_event hash
+# ARGV = event_type, deleted event_key, new event_key ('' to clear), event_ts, payload
+_REPOINT_LATEST_EVENT_LUA = """
+if redis.call('HGET', KEYS[1], ARGV[1] .. ':key') ~= ARGV[2] then
+    return 0
+end
+if ARGV[3] == '' then
+    redis.call('HDEL', KEYS[1], ARGV[1], ARGV[1] .. ':ts', ARGV[1] .. ':key')
+else
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[5], ARGV[1] .. ':ts', ARGV[4], ARGV[1] .. ':key', ARGV[3])
+end
+return 1
+"""
+
+# Time index entries read per page when looking for a deleted latest event's
+# replacement
+LATEST_REPOINT_PAGE_SIZE = 50
+
+_scripts: Dict[str, Any] = {}
+
+def _get_script(client: Any, source: str) -> Any:
+    """Register a Lua script with the client once and reuse it."""
+    key = f"{id(client)}:{hash(source)}"
+    if key not in _scripts:
+        _scripts[key] = client.register_script(source)
+    return _scripts[key]
+
+async def run_script(source: str, keys: List[str], args: List[Any]) -> Any:
+    """
+    Run a Lua script in one round trip (EVALSHA, loading it on first use).
+
+    Args:
+        source: The Lua source
+        keys: The KEYS passed to the script
+        args: The ARGV passed to the script
+
+    Returns:
+        The script's reply
+
+    Raises:
+        ConnectionError: If Redis is not available
+    """
+    async with redis_connection() as client:
+        if not client:
+            raise ConnectionError("Redis is not available")
+        script = _get_script(client, source)
+        return await script(keys=keys, args=args)
+
+
+async def set_latest_event(thread_id: str, event_type: str, event_key: str,
+                           event_ts: float, event_json: str) -> bool:
+    """
+    Point the (thread, event_type) latest-event pointer at an event if it is
+    at least as recent as the current one. The check and update run
+    atomically in a Lua script.
+
+    Args:
+        thread_id: The thread the event belongs to
+        event_type: The event type
+        event_key: The Redis key holding the event payload
+        event_ts: Event time as UTC epoch seconds
+        event_json: The serialized event payload
+
+    Returns:
+        True if the pointer was evaluated in Redis, False otherwise
+    """
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return False
+            script = _get_script(client, _SET_LATEST_EVENT_LUA)
+            await script(
+                keys=[f"{RedisKeyPrefix.LATEST_EVENT}:{thread_id}"],
+                args=[event_type, event_ts, event_key, codec.encode_json(event_json)]
+            )
+            return True
+    except Exception as e:
+        logger.error(f"Error updating latest {event_type} event for thread {thread_id}: {e}")
+        return False
+
+
+async def get_latest_event_pointer(thread_id: str, event_type: str) -> Optional[Dict[str, Any]]:
+    """
+    Read the latest event of a type for a thread with a single HGET.
+
+    Returns:
+        The event payload, or None if no pointer is stored
+    """
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return None
+            payload = await client.hget(f"{RedisKeyPrefix.LATEST_EVENT}:{thread_id}", event_type)
+            if not payload:
+                return None
+            return codec.decode(payload)
+    except Exception as e:
+        logger.error(f"Error reading latest {event_type} event for thread {thread_id}: {e}")
+        return None
+
+
+async def remove_event_from_thread(thread_id: str, event_type: str, event_key: str,
+                                   local_id: Optional[str] = None) -> bool:
+    """
+    Delete an event and unregister it from its thread's list, time index,
+    latest-event pointer and local_id index.
+
+    Args:
+        thread_id: The thread the event belongs to
+        event_type: The event type
+        event_key: The Redis key holding the event payload
+        local_id: The client-side ID the event was recorded with, if any
+
+    Returns:
+        True if the event was removed, False otherwise
+    """
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return False
+            index_key = f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}"
+            pipe = client.pipeline(transaction=False)
+            pipe.delete(event_key)
+            location = bucket_location(event_key, RedisKeyPrefix.EVENT)
+            if use_buckets() and location:
+                pipe.hdel(*location)
+            pipe.lrem(f"{RedisKeyPrefix.THREAD_EVENTS}:{thread_id}", 0, event_key)
+            pipe.zrem(index_key, event_key)
+            if local_id:
+                pipe.hdel(f"{RedisKeyPrefix.EVENT_LOCAL_IDS}:{thread_id}", local_id)
+            pipe.hget(f"{RedisKeyPrefix.LATEST_EVENT}:{thread_id}", f"{event_type}:key")
+            await _get_script(client, _RECORD_CHANGES_LUA)(
+                keys=[f"{RedisKeyPrefix.EVENT_SEQ}:{thread_id}", f"{RedisKeyPrefix.EVENT_CHANGES}:{thread_id}"],
+                args=[event_key],
+                client=pipe
+            )
+            results = await pipe.execute()
+        _memory_cache.pop(event_key, None)
+        if local_id:
+            _update_local_id_index(thread_id, removed=[local_id])
+        if results[-2] == event_key:
+            await _repoint_latest_event(thread_id, event_type, event_key)
+        return True
+    except Exception as e:
+        logger.error(f"Error removing event {event_key} from thread {thread_id}: {e}")
+        return False
+
+
+async def _repoint_latest_event(thread_id: str, event_type: str, event_key: str) -> None:
+    """
+    Point the latest-event pointer of a deleted event at the newest remaining
+    event of its type, reading the time index newest first a page at a time.
+    """
+    index_key = f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}"
+    type_prefix = f"{RedisKeyPrefix.EVENT}:{thread_id}:{event_type}:"
+    replacement = ["", "", ""]
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return
+            start = 0
+            while not replacement[0]:
+                members = await client.zrevrange(index_key, start, start + LATEST_REPOINT_PAGE_SIZE - 1, withscores=True)
+                candidates = [(member, score) for member, score in members if member.startswith(type_prefix) and member != event_key]
+                payloads = await get_events_with_fallback([member for member, _ in candidates]) if candidates else []
+                for (member, score), payload in zip(candidates, payloads):
+                    if isinstance(payload, dict):
+                        replacement = [member, int(score), codec.encode(payload)]
+                        break
+                if len(members) < LATEST_REPOINT_PAGE_SIZE:
+                    break
+                start += LATEST_REPOINT_PAGE_SIZE
+            await _get_script(client, _REPOINT_LATEST_EVENT_LUA)(
+                keys=[f"{RedisKeyPrefix.LATEST_EVENT}:{thread_id}"],
+                args=[event_type, event_key, *replacement]
+            )
+    except Exception as e:
+        logger.error(f"Error repointing the latest {event_type} event of thread {thread_id}: {e}")
+
+
+async def write_daily_rollups(thread_id: str, rollups: Dict[str, Dict[str, Any]]) -> bool:
+    """
+    Replace the per-day aggregate buckets of a thread in one pipeline.
+
+    Args:
+        thread_id: The thread the buckets belong to
+        rollups: Bucket fields keyed by ISO date; an empty mapping deletes the bucket
+
+    Returns:
+        True if the buckets were written, False otherwise
+    """
+    if not rollups:
+        return True
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return False
+            pipe = client.pipeline(transaction=True)
+            for day, fields in rollups.items():
+                bucket_key = f"{RedisKeyPrefix.ROUTINE_DAILY}:{thread_id}:{day}"
+                pipe.delete(bucket_key)
+                if fields:
+                    pipe.hset(bucket_key, mapping=fields)
+            await pipe.execute()
+            return True
+    except Exception as e:
+        logger.error(f"Error writing daily rollups for thread {thread_id}: {e}")
+        return False
+
+
+async def get_daily_rollups(thread_id: str, days: List[str]) -> Optional[List[Dict[str, str]]]:
+    """
+    Read the per-day aggregate buckets of a thread in one round trip.
+
+    Args:
+        thread_id: The thread the buckets belong to
+        days: ISO dates to read
+
+    Returns:
+        Bucket fields aligned with days (empty dicts for days without events),
+        or None if Redis is unavailable
+    """
+    if not days:
+        return []
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return None
+            pipe = client.pipeline(transaction=False)
+            for day in days:
+                pipe.hgetall(f"{RedisKeyPrefix.ROUTINE_DAILY}:{thread_id}:{day}")
+            return await pipe.execute()
+    except Exception as e:
+        logger.error(f"Error reading daily rollups for thread {thread_id}: {e}")
+        return None
+
+
+# Counter arrays are BITFIELD strings of unsigned 32-bit counters, so a
+# 168-slot array takes 672 bytes and a read of all of it is one command
+COUNTER_ARRAY_TYPE = "u32"
+
+async def adjust_counter_arrays(updates: Dict[str, Dict[int, int]]) -> bool:
+    """
+    Add deltas to slots of counter arrays in one pipeline.
+
+    Counters saturate at 0 and 2**32 - 1 instead of wrapping, so a decrement
+    for an event that was never counted can't underflow.
+
+    Args:
+        updates: Slot deltas keyed by array key
+
+    Returns:
+        True if the counters were updated, False otherwise
+    """
+    updates = {key: deltas for key, deltas in updates.items() if any(deltas.values())}
+    if not updates:
+        return True
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return False
+            pipe = client.pipeline(transaction=False)
+            for key, deltas in updates.items():
+                args = ["OVERFLOW", "SAT"]
+                for slot, delta in deltas.items():
+                    if delta:
+                        args.extend(["INCRBY", COUNTER_ARRAY_TYPE, f"#{slot}", delta])
+                pipe.execute_command("BITFIELD", key, *args)
+            await pipe.execute()
+            return True
+    except Exception as e:
+        logger.error(f"Error updating counter arrays {list(updates)}: {e}")
+        return False
+
+
+async def replace_counter_arrays(arrays: Dict[str, List[int]]) -> bool:
+    """
+    Overwrite counter arrays with the given counts in one transaction.
+
+    Args:
+        arrays: Full counter lists keyed by array key
+
+    Returns:
+        True if the arrays were written, False otherwise
+    """
+    if not arrays:
+        return True
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return False
+            pipe = client.pipeline(transaction=True)
+            for key, counts in arrays.items():
+                pipe.delete(key)
+                args = []
+                for slot, count in enumerate(counts):
+                    if count:
+                        args.extend(["SET", COUNTER_ARRAY_TYPE, f"#{slot}", count])
+                if args:
+                    pipe.execute_command("BITFIELD", key, *args)
+            await pipe.execute()
+            return True
+    except Exception as e:
+        logger.error(f"Error replacing counter arrays {list(arrays)}: {e}")
+        return False
+
+
+async def get_counter_arrays(arrays: Dict[str, int]) -> Optional[Dict[str, List[int]]]:
+    """
+    Read whole counter arrays in one round trip.
+
+    Args:
+        arrays: Array sizes keyed by array key
+
+    Returns:
+        The counters keyed by array key (zeros for missing arrays), or None
+        if Redis is unavailable
+    """
+    if not arrays:
+        return {}
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return None
+            pipe = client.pipeline(transaction=False)
+            for key, size in arrays.items():
+                args = []
+                for slot in range(size):
+                    args.extend(["GET", COUNTER_ARRAY_TYPE, f"#{slot}"])
+                pipe.execute_command("BITFIELD", key, *args)
+            results = await pipe.execute()
+            return {key: [int(count or 0) for count in counts] for key, counts in zip(arrays, results)}
+    except Exception as e:
+        logger.error(f"Error reading counter arrays {list(arrays)}: {e}")
+        return None
+
+
+# Write one routine event and register it in its thread's indexes. When the
+# event carries a local_id that is already recorded for the thread, nothing is
+# written and the existing event key is returned, so client replays are no-ops.
+# KEYS[1] = local_id index hash, KEYS[2] = event key, KEYS[3] = thread list,
+# KEYS[4] = time index, KEYS[5] = latest_event hash, KEYS[6] = indexed marker,
+# KEYS[7] = change sequence, KEYS[8] = change log, KEYS[9] = event bucket
+# ARGV = local_id ('' if none), event_json, event_ts ('' if unknown), event_type,
+# bucket field ('' to store the payload at the event key)
+# Returns {1 if written else 0, event key}
+_WRITE_EVENT_LUA = """
+if ARGV[1] ~= '' then
+    local existing = redis.call('HGET', KEYS[1], ARGV[1])
+    if existing then
+        return {0, existing}
+    end
+    redis.call('HSET', KEYS[1], ARGV[1], KEYS[2])
+end
+if ARGV[5] ~= '' then
+    redis.call('HSET', KEYS[9], ARGV[5], ARGV[2])
+else
+    redis.call('SET', KEYS[2], ARGV[2])
+end
+if redis.call('RPUSH', KEYS[3], KEYS[2]) == 1 then
+    redis.call('SET', KEYS[6], '1')
+end
+if ARGV[3] ~= '' then
+    redis.call('ZADD', KEYS[4], ARGV[3], KEYS[2])
+    local current = redis.call('HGET', KEYS[5], ARGV[4] .. ':ts')
+    if not current or tonumber(current) <= tonumber(ARGV[3]) then
+        redis.call('HSET', KEYS[5], ARGV[4], ARGV[2], ARGV[4] .. ':ts', ARGV[3], ARGV[4] .. ':key', KEYS[2])
+    end
+end
+redis.call('ZADD', KEYS[8], redis.call('INCR', KEYS[7]), KEYS[2])
+return {1, KEYS[2]}
+"""
+
+# Give each changed event key the next value of the thread's change sequence.
+# The change log holds one member per event key, scored by its last change.
+# KEYS[1] = change sequence, KEYS[2] = change log; ARGV = changed event keys
+_RECORD_CHANGES_LUA = """
+local seq = 0
+for i = 1, #ARGV do
+    seq = redis.call('INCR', KEYS[1])
+    redis.call('ZADD', KEYS[2], seq, ARGV[i])
+end
+return seq
+"""
+
+# Enter every event already in the time index into the change log, once per
+# thread. Events that already have a change entry keep it.
+# KEYS[1] = seeded marker, KEYS[2] = change sequence, KEYS[3] = change log,
+# KEYS[4] = time index
+_SEED_CHANGES_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local members = redis.call('ZRANGE', KEYS[4], 0, -1)
+for i = 1, #members do
+    if not redis.call('ZSCORE', KEYS[3], members[i]) then
+        redis.call('ZADD', KEYS[3], redis.call('INCR', KEYS[2]), members[i])
+    end
+end
+redis.call('SET', KEYS[1], '1')
+return #members
+"""
+
+
+def _update_local_id_index(thread_id: str, added: Optional[Dict[str, str]] = None,
+                           removed: Optional[List[str]] = None) -> None:
+    """
+    Add and remove local_id -> event key mappings in the memory cache copy of
+    a thread's local_id index. The index is copied and set again, so the
+    cache counts its new size against the byte budget.
+    """
+    key = f"{RedisKeyPrefix.EVENT_LOCAL_IDS}:{thread_id}"
+    index = dict(_memory_cache.get(key) or {})
+    index.update(added or {})
+    for local_id in removed or []:
+        index.pop(local_id, None)
+    if index:
+        _memory_cache.set(key, index)
+    else:
+        _memory_cache.pop(key, None)
+
+
+async def write_events(entries: List[Dict[str, Any]]) -> Optional[List[str]]:
+    """
+    Store routine events and maintain their thread indexes in one pipeline.
+
+    Each entry is a dict with thread_id, event_type, event_key, event_ts
+    (UTC epoch seconds or None), event_json and an optional local_id. Every
+    event is written atomically with its list entry, time index score and
+    latest-event pointer. An event whose local_id is already recorded for the
+    thread is skipped, and the key of the recorded event is returned instead.
+
+    Args:
+        entries: The events to write
+
+    Returns:
+        The stored event key for each entry, or None if nothing could be stored
+    """
+    if not entries:
+        return []
+    
+    stored_keys = None
+    try:
+        async with redis_connection() as client:
+            if client:
+                script = _get_script(client, _WRITE_EVENT_LUA)
+                buckets = use_buckets()
+                pipe = client.pipeline(transaction=False)
+                for entry in entries:
+                    thread_id = entry["thread_id"]
+                    location = bucket_location(entry["event_key"], RedisKeyPrefix.EVENT) if buckets else None
+                    bucket_key, field = location or (entry["event_key"], "")
+                    await script(
+                        keys=[
+                            f"{RedisKeyPrefix.EVENT_LOCAL_IDS}:{thread_id}",
+                            entry["event_key"],
+                            f"{RedisKeyPrefix.THREAD_EVENTS}:{thread_id}",
+                            f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}",
+                            f"{RedisKeyPrefix.LATEST_EVENT}:{thread_id}",
+                            f"{RedisKeyPrefix.THREAD_EVENTS_INDEXED}:{thread_id}",
+                            f"{RedisKeyPrefix.EVENT_SEQ}:{thread_id}",
+                            f"{RedisKeyPrefix.EVENT_CHANGES}:{thread_id}",
+                            bucket_key
+                        ],
+                        args=[
+                            entry.get("local_id") or "",
+                            codec.encode_json(entry["event_json"]),
+                            "" if entry["event_ts"] is None else entry["event_ts"],
+                            entry["event_type"],
+                            field
+                        ],
+                        client=pipe
+                    )
+                results = await pipe.execute()
+                stored_keys = [key for _, key in results]
+                replays = sum(1 for written, _ in results if not written)
+                if replays:
+                    logger.info(f"Skipped {replays} already recorded events by local_id")
+                logger.debug(f"Wrote {len(entries) - replays} events in one pipeline")
+            else:
+                logger.warning("Redis client not available for writing events")
+    except Exception as e:
+        logger.error(f"Error writing {len(entries)} events to Redis: {e}")
+    
+    # Always update memory cache
+    try:
+        memory_keys = []
+        added: Dict[str, Dict[str, str]] = {}
+        for position, entry in enumerate(entries):
+            thread_id = entry["thread_id"]
+            local_id = entry.get("local_id")
+            if stored_keys is not None:
+                key = stored_keys[position]
+            elif local_id:
+                key = added.get(thread_id, {}).get(local_id) or _memory_cache.get(
+                    f"{RedisKeyPrefix.EVENT_LOCAL_IDS}:{thread_id}", {}
+                ).get(local_id, entry["event_key"])
+            else:
+                key = entry["event_key"]
+            if key == entry["event_key"]:
+                if local_id:
+                    added.setdefault(thread_id, {})[local_id] = key
+                _memory_cache[key] = json.loads(entry["event_json"])
+            memory_keys.append(key)
+        for thread_id, local_ids in added.items():
+            _update_local_id_index(thread_id, local_ids)
+        return memory_keys
+    except Exception as e:
+        logger.error(f"Error writing events to memory cache: {e}")
+        return stored_keys
+
+
+async def register_local_ids(thread_id: str, local_ids: Dict[str, str]) -> None:
+    """
+    Record local_id -> event key mappings for events written before the
+    local_id index existed. Existing mappings are kept.
+    """
+    if not local_ids:
+        return
+    try:
+        async with redis_connection() as client:
+            if client:
+                pipe = client.pipeline(transaction=False)
+                for local_id, event_key in local_ids.items():
+                    pipe.hsetnx(f"{RedisKeyPrefix.EVENT_LOCAL_IDS}:{thread_id}", local_id, event_key)
+                await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to register local ids for thread {thread_id}: {e}")
+    known = _memory_cache.get(f"{RedisKeyPrefix.EVENT_LOCAL_IDS}:{thread_id}") or {}
+    added = {local_id: event_key for local_id, event_key in local_ids.items() if local_id not in known}
+    if added:
+        _update_local_id_index(thread_id, added)
+
+
+async def record_event_changes(thread_id: str, event_keys: List[str]) -> None:
+    """Advance the thread's change sequence for events updated in place."""
+    if not event_keys:
+        return
+    try:
+        async with redis_connection() as client:
+            if client:
+                await _get_script(client, _RECORD_CHANGES_LUA)(
+                    keys=[f"{RedisKeyPrefix.EVENT_SEQ}:{thread_id}", f"{RedisKeyPrefix.EVENT_CHANGES}:{thread_id}"],
+                    args=event_keys
+                )
+    except Exception as e:
+        logger.warning(f"Failed to record changes for thread {thread_id}: {e}")
+
+
+async def get_event_changes(thread_id: str, since: int, limit: int) -> Optional[Dict[str, Any]]:
+    """
+    Read a thread's change log after a sequence number.
+
+    Args:
+        thread_id: The thread to read
+        since: Only changes with a higher sequence number are returned
+        limit: Maximum number of changes to return
+
+    Returns:
+        {"changes": [(event_key, seq), ...], "has_more": bool, "seeded": bool,
+        "trimmed_seq": int}, where trimmed_seq is the highest sequence
+        removed from the log by archiving (0 if none), or None if Redis is
+        unavailable
+    """
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return None
+            pipe = client.pipeline(transaction=False)
+            pipe.zrangebyscore(
+                f"{RedisKeyPrefix.EVENT_CHANGES}:{thread_id}", f"({since}", "+inf",
+                start=0, num=limit + 1, withscores=True
+            )
+            pipe.exists(f"{RedisKeyPrefix.EVENT_CHANGES_SEEDED}:{thread_id}")
+            pipe.get(f"{RedisKeyPrefix.EVENT_CHANGES_TRIMMED}:{thread_id}")
+            changes, seeded, trimmed_seq = await pipe.execute()
+            return {
+                "changes": [(key, int(seq)) for key, seq in changes[:limit]],
+                "has_more": len(changes) > limit,
+                "seeded": bool(seeded),
+                "trimmed_seq": int(trimmed_seq or 0)
+            }
+    except Exception as e:
+        logger.error(f"Error reading change log for thread {thread_id}: {e}")
+        return None
+
+
+async def seed_event_changes(thread_id: str) -> None:
+    """Enter a thread's existing time-indexed events into its change log."""
+    try:
+        async with redis_connection() as client:
+            if client:
+                seeded = await _get_script(client, _SEED_CHANGES_LUA)(keys=[
+                    f"{RedisKeyPrefix.EVENT_CHANGES_SEEDED}:{thread_id}",
+                    f"{RedisKeyPrefix.EVENT_SEQ}:{thread_id}",
+                    f"{RedisKeyPrefix.EVENT_CHANGES}:{thread_id}",
+                    f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}"
+                ])
+                logger.info(f"Seeded change log for thread {thread_id} with {seeded} events")
+    except Exception as e:
+        logger.warning(f"Failed to seed change log for thread {thread_id}: {e}")
+
+
+# Remove archived events from a thread's hot indexes. The thread list is
+# rebuilt in one pass instead of an LREM per event. A local_id is only
+# unregistered while it still points at the archived event. The highest
+# change-log sequence removed is kept, so get_changes can tell a cursor
+# that predates it.
+# KEYS[1] = thread list, KEYS[2] = time index, KEYS[3] = change log,
+# KEYS[4] = local_id index hash, KEYS[5] = highest trimmed sequence
+# ARGV = event key, local_id ('' if none), event key, local_id, ...
+# Returns the number of list entries removed
+_TRIM_ARCHIVED_EVENTS_LUA = """
+local archived = {}
+local trimmed_seq = tonumber(redis.call('GET', KEYS[5]) or '0')
+local trimmed_before = trimmed_seq
+for i = 1, #ARGV, 2 do
+    local event_key = ARGV[i]
+    archived[event_key] = true
+    redis.call('ZREM', KEYS[2], event_key)
+    local seq = tonumber(redis.call('ZSCORE', KEYS[3], event_key))
+    if seq and seq > trimmed_seq then
+        trimmed_seq = seq
+    end
+    redis.call('ZREM', KEYS[3], event_key)
+    if ARGV[i + 1] ~= '' and redis.call('HGET', KEYS[4], ARGV[i + 1]) == event_key then
+        redis.call('HDEL', KEYS[4], ARGV[i + 1])
+    end
+end
+if trimmed_seq > trimmed_before then
+    redis.call('SET', KEYS[5], trimmed_seq)
+end
+local entries = redis.call('LRANGE', KEYS[1], 0, -1)
+local kept = {}
+for _, entry in ipairs(entries) do
+    if not archived[entry] then
+        kept[#kept + 1] = entry
+    end
+end
+local removed = #entries - #kept
+if removed > 0 then
+    redis.call('DEL', KEYS[1])
+    for i = 1, #kept, 1000 do
+        redis.call('RPUSH', KEYS[1], unpack(kept, i, math.min(i + 999, #kept)))
+    end
+end
+return removed
+"""
+
+# Events per trim script call
+ARCHIVE_TRIM_CHUNK_SIZE = 1000
+
+
+async def archive_thread_events(
+    thread_id: str,
+    months: Dict[str, Dict[str, Dict[str, Any]]],
+    month_starts: Dict[str, int],
+    trimmed: Dict[str, Optional[str]]
+) -> bool:
+    """
+    Merge events into a thread's monthly archive blobs, then remove them from
+    the hot store (payloads, thread list, time index, change log and local_id
+    index).
+
+    The blobs are written before anything is trimmed, and merging is keyed by
+    event key, so a run that stops halfway is finished by the next one.
+
+    Args:
+        thread_id: The thread to archive
+        months: {YYYY-MM: {event_key: event}} to add to each month's blob
+        month_starts: UTC epoch seconds of the start of each month
+        trimmed: {event_key: local_id or None} for every event to remove from
+            the hot store, including keys whose payload was already gone
+
+    Returns:
+        True if the events were archived and trimmed, False otherwise
+    """
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return False
+            
+            archive_keys = {month: f"{RedisKeyPrefix.EVENT_ARCHIVE}:{thread_id}:{month}" for month in months}
+            if archive_keys:
+                stored = await client.mget(list(archive_keys.values()))
+                pipe = client.pipeline(transaction=False)
+                for (month, archive_key), blob in zip(archive_keys.items(), stored):
+                    existing = _decode_value(blob) if blob else {}
+                    if blob and not isinstance(existing, dict):
+                        logger.error(f"Unreadable event archive {archive_key}, not overwriting it")
+                        return False
+                    existing.update(months[month])
+                    pipe.set(archive_key, codec.encode(existing))
+                pipe.zadd(
+                    f"{RedisKeyPrefix.EVENT_ARCHIVE_MONTHS}:{thread_id}",
+                    {month: month_starts[month] for month in months}
+                )
+                await pipe.execute()
+            
+            script = _get_script(client, _TRIM_ARCHIVED_EVENTS_LUA)
+            event_keys = list(trimmed)
+            for start in range(0, len(event_keys), ARCHIVE_TRIM_CHUNK_SIZE):
+                chunk = event_keys[start:start + ARCHIVE_TRIM_CHUNK_SIZE]
+                pipe = client.pipeline(transaction=False)
+                args = []
+                for event_key in chunk:
+                    pipe.delete(event_key)
+                    location = bucket_location(event_key, RedisKeyPrefix.EVENT)
+                    if use_buckets() and location:
+                        pipe.hdel(*location)
+                    args.extend([event_key, trimmed[event_key] or ""])
+                await script(
+                    keys=[
+                        f"{RedisKeyPrefix.THREAD_EVENTS}:{thread_id}",
+                        f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}",
+                        f"{RedisKeyPrefix.EVENT_CHANGES}:{thread_id}",
+                        f"{RedisKeyPrefix.EVENT_LOCAL_IDS}:{thread_id}",
+                        f"{RedisKeyPrefix.EVENT_CHANGES_TRIMMED}:{thread_id}"
+                    ],
+                    args=args,
+                    client=pipe
+                )
+                await pipe.execute()
+        
+        for event_key in trimmed:
+            _memory_cache.pop(event_key, None)
+        trimmed_local_ids = [local_id for local_id in trimmed.values() if local_id]
+        if trimmed_local_ids:
+            _update_local_id_index(thread_id, removed=trimmed_local_ids)
+        return True
+    except Exception as e:
+        logger.error(f"Error archiving {len(trimmed)} events of thread {thread_id}: {e}")
+        return False
+
+
+async def get_archived_events(thread_id: str, months: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Read events from a thread's monthly archive blobs.
+
+    Args:
+        thread_id: The thread to read
+        months: The YYYY-MM archives to read
+
+    Returns:
+        {event_key: event} across the months that have an archive
+    """
+    events: Dict[str, Dict[str, Any]] = {}
+    if not months:
+        return events
+    try:
+        async with redis_connection() as client:
+            if not client:
+                return events
+            blobs = await client.mget([f"{RedisKeyPrefix.EVENT_ARCHIVE}:{thread_id}:{month}" for month in months])
+            for month, blob in zip(months, blobs):
+                archive = _decode_value(blob) if blob else None
+                if isinstance(archive, dict):
+                    events.update(archive)
+                elif blob:
+                    logger.error(f"Unreadable event archive for thread {thread_id}, month {month}")
+    except Exception as e:
+        logger.error(f"Error reading event archives of thread {thread_id}: {e}")
+    return events
@@ -0,0 +1,75 @@
+"""
+Babywise Chatbot - Single-Flight Request Coalescing
+
+Concurrent callers asking for the same key share one in-flight load instead
+of each running it. The load runs as its own task, so a caller that times
+out or is cancelled doesn't cancel it for the others.
+"""
+
+import copy
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Keyed single-flight group.
+
+    The first caller for a key starts the load; callers arriving while it is
+    running wait for the same result and are counted as coalesced. Coalesced
+    callers get a deep copy, so no caller can mutate another's result.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        """Run load() for key, or join the run already in flight."""
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            logger.debug(f"[{self.name}] Coalesced request for {key}")
+            return copy.deepcopy(await asyncio.shield(task))
+
+        task = asyncio.ensure_future(load())
+        self._inflight[key] = task
+        self.executions += 1
+
+        def _done(finished: "asyncio.Future[Any]") -> None:
+            if self._inflight.get(key) is finished:
+                del self._inflight[key]
+            # Mark the exception as retrieved if every caller has gone away
+            if not finished.cancelled():
+                finished.exception()
+
+        task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the call, execution and coalesced counters."""
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight)
+        }
+
+# Groups by name, for reporting
+_groups: Dict[str, SingleFlight] = {}
+
+def single_flight_group(name: str) -> SingleFlight:
+    """Get or create the process-wide single-flight group with this name."""
+    if name not in _groups:
+        _groups[name] = SingleFlight(name)
+    return _groups[name]
+
+def single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    """Return the counters of every single-flight group."""
+    return {name: group.stats() for name, group in _groups.items()}
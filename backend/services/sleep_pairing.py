@@ -0,0 +1,109 @@
+"""
+Babywise Chatbot - Sleep Pairing Engine
+
+This module pairs sleep start events with sleep end events. Both streams are
+sorted once and merged with a two-pointer sweep, so pairing is O(n log n)
+in the number of events instead of comparing every start with every end.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# An end event must follow its start within this window to be paired
+MAX_SLEEP_DURATION = timedelta(hours=24)
+
+# Unpaired starts more recent than this are reported as ongoing sleep
+ONGOING_SLEEP_WINDOW = timedelta(hours=12)
+
+# Duration assumed for an end event that has no start
+VIRTUAL_SLEEP_DURATION = timedelta(hours=2)
+
+TimedEvent = Tuple[datetime, Dict[str, Any]]
+
+def pair_sleep_events(
+    sleep_starts: List[TimedEvent],
+    sleep_ends: List[TimedEvent],
+    window_start: datetime,
+    now: datetime,
+    include_ongoing: bool = True
+) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Pair sleep starts with sleep ends.
+
+    Each start, in time order, takes the closest unused end that follows it
+    within 24 hours. Because starts are visited in order, that end is always
+    the first unused end after the start, so a single forward pointer over
+    the sorted ends finds it. Ends the pointer skips can no longer be paired.
+
+    Args:
+        sleep_starts: (naive UTC time, event) pairs for sleep start events
+        sleep_ends: (naive UTC time, event) pairs for sleep end events
+        window_start: Earliest start time for virtual periods
+        now: Reference time for ongoing sleep
+        include_ongoing: Whether recent unpaired starts become ongoing periods
+
+    Returns:
+        The sleep periods and their total duration in hours
+    """
+    starts = sorted(sleep_starts, key=lambda item: item[0])
+    ends = sorted(sleep_ends, key=lambda item: item[0])
+
+    sleep_periods = []
+    unpaired_ends = []
+    total_sleep_duration = 0.0
+    end_index = 0
+
+    for start_time, start_event in starts:
+        # Ends at or before this start can't close it or any later start
+        while end_index < len(ends) and ends[end_index][0] <= start_time:
+            unpaired_ends.append(ends[end_index])
+            end_index += 1
+
+        if end_index < len(ends) and ends[end_index][0] - start_time < MAX_SLEEP_DURATION:
+            end_time, end_event = ends[end_index]
+            end_index += 1
+            duration_hours = (end_time - start_time).total_seconds() / 3600
+            total_sleep_duration += duration_hours
+            sleep_periods.append({
+                "start": start_event.get("event_time"),
+                "end": end_event.get("event_time"),
+                "duration": round(duration_hours, 2),
+                "start_id": start_event.get("local_id"),
+                "end_id": end_event.get("local_id")
+            })
+        elif include_ongoing and now - start_time < ONGOING_SLEEP_WINDOW:
+            # Assume baby is still sleeping if the sleep event is recent
+            duration_hours = (now - start_time).total_seconds() / 3600
+            total_sleep_duration += duration_hours
+            sleep_periods.append({
+                "start": start_event.get("event_time"),
+                "end": None,  # Ongoing sleep
+                "duration": round(duration_hours, 2),
+                "start_id": start_event.get("local_id"),
+                "end_id": None,
+                "is_ongoing": True
+            })
+
+    unpaired_ends.extend(ends[end_index:])
+
+    # Ends without a start - parents only logged the wake-up time
+    for end_time, end_event in unpaired_ends:
+        start_time = max(end_time - VIRTUAL_SLEEP_DURATION, window_start)
+        duration_hours = (end_time - start_time).total_seconds() / 3600
+        if duration_hours <= 0:
+            continue
+        total_sleep_duration += duration_hours
+        sleep_periods.append({
+            "start": start_time.isoformat(),
+            "end": end_event.get("event_time"),
+            "duration": round(duration_hours, 2),
+            "start_id": None,  # Virtual sleep start
+            "end_id": end_event.get("local_id"),
+            "is_virtual": True
+        })
+
+    logger.debug(f"Paired {len(starts)} sleep starts with {len(ends)} sleep ends into {len(sleep_periods)} periods")
+    return sleep_periods, total_sleep_duration
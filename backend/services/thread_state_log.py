@@ -0,0 +1,234 @@
+"""
+Babywise Chatbot - Thread State Layout
+
+A thread's conversation state is stored as two parts instead of one JSON
+document rewritten on every turn:
+
+- thread_state:{id}          hash of the small top-level fields (context,
+                             user_context, domain, metadata, ...), one JSON
+                             value per field
+- thread_messages:{id}       append-only list of the most recent messages
+- thread_messages_archive:{id}  older messages moved out of the live list
+                             once it exceeds THREAD_MESSAGES_MAX
+
+A turn appends only its new messages and writes only the fields that
+changed. To know which messages are new, the process keeps a checkpoint
+of each state it loads or saves, outside the state itself: the stored
+message count, how many messages the state held, and a digest of the last
+of them. A state whose messages still start with those is appended to;
+the save script checks the count against the stored one, and on a
+mismatch (a concurrent writer, or a state that didn't come from the
+store) the whole state is rewritten instead, as before.
+
+This module holds the key layout, serialization helpers and the save
+script; RedisService runs them.
+"""
+
+import os
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.services.codec import codec
+
+logger = logging.getLogger(__name__)
+
+THREAD_STATE_PREFIX = "thread_state"
+THREAD_MESSAGES_PREFIX = "thread_messages"
+THREAD_MESSAGES_ARCHIVE_PREFIX = "thread_messages_archive"
+
+# Messages kept in the live list, and in the archive behind it
+THREAD_MESSAGES_MAX = int(os.environ.get("THREAD_MESSAGES_MAX", "200"))
+THREAD_ARCHIVE_MAX = int(os.environ.get("THREAD_ARCHIVE_MAX", "2000"))
+# Archived messages outlive the live state
+THREAD_ARCHIVE_TTL = int(os.environ.get("THREAD_ARCHIVE_TTL", str(30 * 86400)))
+
+# Hash field holding the thread's message count (live plus archived)
+MESSAGE_COUNT_FIELD = "__message_count"
+
+# State keys that are not stored as hash fields
+NON_FIELD_KEYS = ("messages",)
+
+# (stored message count, messages in the state, digest of its last message)
+Checkpoint = Tuple[int, int, Optional[str]]
+
+APPEND = "append"
+REPLACE = "replace"
+
+# Returned by the save script when the stored count doesn't match
+CONFLICT = -1
+
+# KEYS[1] = state hash, KEYS[2] = live message list, KEYS[3] = archive list,
+# KEYS[4] = state version counter
+# ARGV[1] = mode ('append' or 'replace'); ARGV[2] = expected message count
+# (append) or '1' to keep the archive (replace); ARGV[3] = state TTL,
+# ARGV[4] = archive TTL, ARGV[5] = live cap, ARGV[6] = archive cap,
+# ARGV[7] = JSON object of fields to set, ARGV[8] = JSON array of fields to
+# delete, ARGV[9..] = messages to append
+# Returns the message count after the write, or -1 on an append conflict.
+SAVE_THREAD_STATE_LUA = """
+local key_type = redis.call('TYPE', KEYS[1]).ok
+if ARGV[1] == 'append' then
+    if key_type ~= 'hash' then
+        return -1
+    end
+    local count = tonumber(redis.call('HGET', KEYS[1], '__message_count'))
+    if count ~= tonumber(ARGV[2]) then
+        return -1
+    end
+else
+    redis.call('DEL', KEYS[1], KEYS[2])
+    if ARGV[2] ~= '1' then
+        redis.call('DEL', KEYS[3])
+    end
+end
+
+for field, value in pairs(cjson.decode(ARGV[7])) do
+    redis.call('HSET', KEYS[1], field, value)
+end
+for _, field in ipairs(cjson.decode(ARGV[8])) do
+    redis.call('HDEL', KEYS[1], field)
+end
+for i = 9, #ARGV do
+    redis.call('RPUSH', KEYS[2], ARGV[i])
+end
+
+local total
+if ARGV[1] == 'append' then
+    total = redis.call('HINCRBY', KEYS[1], '__message_count', #ARGV - 8)
+else
+    total = redis.call('LLEN', KEYS[3]) + #ARGV - 8
+    redis.call('HSET', KEYS[1], '__message_count', total)
+end
+
+local overflow = redis.call('LLEN', KEYS[2]) - tonumber(ARGV[5])
+if overflow > 0 then
+    for _, message in ipairs(redis.call('LRANGE', KEYS[2], 0, overflow - 1)) do
+        redis.call('RPUSH', KEYS[3], message)
+    end
+    redis.call('LTRIM', KEYS[2], overflow, -1)
+    redis.call('LTRIM', KEYS[3], -tonumber(ARGV[6]), -1)
+end
+
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    redis.call('EXPIRE', KEYS[3], ARGV[4])
+end
+redis.call('INCR', KEYS[4])
+return total
+"""
+
+def state_keys(thread_id: str) -> Tuple[str, str, str]:
+    """Return the state hash, live message list and archive keys of a thread."""
+    return (
+        f"{THREAD_STATE_PREFIX}:{thread_id}",
+        f"{THREAD_MESSAGES_PREFIX}:{thread_id}",
+        f"{THREAD_MESSAGES_ARCHIVE_PREFIX}:{thread_id}"
+    )
+
+def _plain(value: Any) -> Any:
+    """Turn sets and models nested in a state value into JSON-compatible values."""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((_plain(item) for item in value), key=str)
+    if hasattr(value, "model_dump"):
+        return _plain(value.model_dump())
+    return value
+
+def message_to_dict(message: Any) -> Dict[str, Any]:
+    """Convert a stored or in-memory message object to a plain dict."""
+    if isinstance(message, dict):
+        return message
+    if hasattr(message, "to_dict"):
+        return message.to_dict()
+    if hasattr(message, "content") and hasattr(message, "type"):
+        return {
+            "type": message.type,
+            "content": message.content,
+            "additional_kwargs": getattr(message, "additional_kwargs", {})
+        }
+    logger.warning(f"Storing unknown message type {type(message).__name__} as text")
+    return {"type": "unknown", "content": str(message)}
+
+def encode_message(message: Any) -> str:
+    return codec.encode(_plain(message_to_dict(message)))
+
+def encode_fields(state: Dict[str, Any]) -> Dict[str, str]:
+    """Serialize the top-level state fields, one encoded value per field."""
+    return {
+        key: codec.encode(_plain(value))
+        for key, value in state.items()
+        if key not in NON_FIELD_KEYS
+    }
+
+def field_digests(fields: Dict[str, str]) -> Dict[str, str]:
+    """Fingerprint serialized fields so unchanged ones can be skipped on save."""
+    return {key: hashlib.blake2b(value.encode("utf-8"), digest_size=8).hexdigest() for key, value in fields.items()}
+
+def message_digest(message: Any) -> str:
+    """Fingerprint a message the way it is stored."""
+    return hashlib.blake2b(encode_message(message).encode("utf-8"), digest_size=8).hexdigest()
+
+def checkpoint(total: int, messages: List[Any]) -> Checkpoint:
+    """Remember the messages of a state just loaded or saved, with the stored count."""
+    return total, len(messages), message_digest(messages[-1]) if messages else None
+
+def plan_save(
+    state: Dict[str, Any],
+    fields: Dict[str, str],
+    known_digests: Optional[Dict[str, str]],
+    loaded: Optional[Checkpoint]
+) -> Tuple[str, str, Dict[str, str], List[str], List[Any]]:
+    """
+    Decide how to write a state.
+
+    Returns:
+        (mode, mode argument, fields to set, fields to delete, messages to
+        append). Append mode applies when the state's messages still start
+        with the ones in the loaded checkpoint, and sends only the messages
+        after them and, when the stored field digests are known, only the
+        changed fields.
+    """
+    messages = state.get("messages") or []
+    if loaded is not None:
+        saved, count, last = loaded
+        if count <= len(messages) and (count == 0 or message_digest(messages[count - 1]) == last):
+            if known_digests is None:
+                changed, removed = fields, []
+            else:
+                digests = field_digests(fields)
+                changed = {key: value for key, value in fields.items() if known_digests.get(key) != digests[key]}
+                removed = [key for key in known_digests if key not in fields]
+            return APPEND, str(saved), changed, removed, messages[count:]
+    return replace_plan(state, fields, loaded is not None)
+
+def replace_plan(state: Dict[str, Any], fields: Dict[str, str], keep_archive: bool) -> Tuple[str, str, Dict[str, str], List[str], List[Any]]:
+    """Rewrite the whole state; threads this process loaded keep their archive."""
+    return REPLACE, "1" if keep_archive else "0", fields, [], state.get("messages") or []
+
+def decode_state(fields: Dict[str, str], messages: List[str]) -> Optional[Tuple[Dict[str, Any], Checkpoint]]:
+    """Rebuild a state from its hash fields and live message list, with its checkpoint."""
+    if not fields:
+        return None
+    state: Dict[str, Any] = {}
+    for key, value in fields.items():
+        if key == MESSAGE_COUNT_FIELD:
+            continue
+        try:
+            state[key] = codec.decode(value)
+        except ValueError:
+            state[key] = value
+    state["messages"] = []
+    for message in messages:
+        try:
+            state["messages"].append(codec.decode(message))
+        except ValueError:
+            # Kept as text so positions still line up with the stored count
+            logger.warning("Unreadable stored message, returning it as text")
+            state["messages"].append({"type": "unknown", "content": message})
+    total = int(fields.get(MESSAGE_COUNT_FIELD, len(messages)))
+    return state, checkpoint(total, state["messages"])
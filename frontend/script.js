@@ -34,7 +34,9 @@ const STORAGE_KEYS = {
     SLEEP_EVENTS: 'sleepEvents_',
     SLEEP_END_EVENTS: 'sleepEndEvents_',
     FEED_EVENTS: 'feedEvents_',
-    LAST_SYNC: 'lastSync_'
+    LAST_SYNC: 'lastSync_',
+    CHANGE_CURSOR: 'changeCursor_',
+    SERVER_EVENTS: 'serverEvents_'
 };
 
 // API base URL and mode
@@ -56,7 +58,9 @@ const API_ENDPOINTS = {
         EVENTS: `${API_BASE_URL}/api/routines/events`,
         SLEEP: `${API_BASE_URL}/api/routines/sleep`,
         FEED: `${API_BASE_URL}/api/routines/feed`,
-        SUMMARY: `${API_BASE_URL}/api/routines/summary`
+        SUMMARY: `${API_BASE_URL}/api/routines/summary`,
+        EVENTS_BATCH: `${API_BASE_URL}/api/routines/events/batch`,
+        CHANGES: `${API_BASE_URL}/api/routines/changes`
     }
 };
 
@@ -398,6 +402,33 @@ function getLocalEvents(eventType) {
     }
 }
 
+// Merge the server copy kept by fetchLatestEvents into a list of local events,
+// adding the events of this type that aren't stored locally, such as ones
+// logged from another device. Server events are given the local event shape.
+function mergeServerEvents(eventType, localEvents) {
+    try {
+        const serverEvents = JSON.parse(localStorage.getItem(STORAGE_KEYS.SERVER_EVENTS + threadId) || '{}');
+        const localIds = new Set(localEvents.map(event => event.local_id));
+        const merged = [...localEvents];
+        for (const event of Object.values(serverEvents)) {
+            if (event.event_type !== eventType || (event.local_id && localIds.has(event.local_id))) {
+                continue;
+            }
+            merged.push({
+                thread_id: event.thread_id,
+                start_time: event.event_ts ? new Date(event.event_ts * 1000).toISOString() : event.event_time,
+                local_id: event.local_id,
+                server_id: event.event_id,
+                synced: true
+            });
+        }
+        return merged.sort((a, b) => new Date(a.start_time) - new Date(b.start_time));
+    } catch (error) {
+        console.error('Error merging server events:', error);
+        return localEvents;
+    }
+}
+
 // Modify markEventAsSynced to update sync status
 function markEventAsSynced(eventType, localId, serverId) {
     try {
@@ -797,21 +828,27 @@ function formatServerSummary(data, period) {
         `**סיכום שגרת תינוק ${periodName}**\n\n` :
         `**Baby Routine Summary for ${periodName}**\n\n`;
     
+    // Totals come from summary.routines. Week and month summaries are built
+    // from per-day rollups (summary.source is "daily_rollups"): they list each
+    // day under summary.daily, and their routines.*.events lists are not every
+    // event of the period (sleep holds only ongoing sleep and sleep crossing
+    // the period start, feeding is empty), so only the totals are read here
+    const routines = (data.summary && data.summary.routines) || {};
+    
     // Add sleep section
     summary += isHebrew ? '**שינה:**\n' : '**Sleep:**\n';
     
-    if (data.summary && data.summary.sleep) {
-        console.log('Processing sleep summary:', data.summary.sleep);
-        const sleepSummary = data.summary.sleep;
-        const sleepCount = sleepSummary.count || 0;
-        const sleepDuration = sleepSummary.total_duration || 0;
+    if (routines.sleep) {
+        console.log('Processing sleep summary:', routines.sleep);
+        const sleepCount = routines.sleep.total_events || 0;
+        const sleepMinutes = Math.round((routines.sleep.total_duration || 0) * 60);
         
         if (isHebrew) {
             summary += `- סך הכל: ${sleepCount} אירועי שינה\n`;
-            summary += `- זמן שינה כולל: ${formatDuration(sleepDuration, language)}\n`;
+            summary += `- זמן שינה כולל: ${formatDuration(sleepMinutes, language)}\n`;
         } else {
             summary += `- Total: ${sleepCount} sleep events\n`;
-            summary += `- Total sleep time: ${formatDuration(sleepDuration, language)}\n`;
+            summary += `- Total sleep time: ${formatDuration(sleepMinutes, language)}\n`;
         }
     } else {
         console.log('No sleep summary data available');
@@ -823,10 +860,9 @@ function formatServerSummary(data, period) {
     // Add feeding section
     summary += isHebrew ? '**האכלה:**\n' : '**Feeding:**\n';
     
-    if (data.summary && data.summary.feeding) {
-        console.log('Processing feeding summary:', data.summary.feeding);
-        const feedingSummary = data.summary.feeding;
-        const feedingCount = feedingSummary.count || 0;
+    if (routines.feeding) {
+        console.log('Processing feeding summary:', routines.feeding);
+        const feedingCount = routines.feeding.total_events || 0;
         
         if (isHebrew) {
             summary += `- סך הכל: ${feedingCount} אירועי האכלה\n`;
@@ -838,6 +874,20 @@ function formatServerSummary(data, period) {
         summary += isHebrew ? '- אין נתוני האכלה זמינים\n' : '- No feeding data available\n';
     }
     
+    // Add the per-day breakdown of week and month summaries
+    const daily = (data.summary && data.summary.daily) || [];
+    if (daily.length > 0) {
+        summary += '\n';
+        summary += isHebrew ? '**לפי יום:**\n' : '**By Day:**\n';
+        daily.forEach(day => {
+            const date = new Date(`${day.date}T00:00:00Z`).toLocaleDateString([], {weekday: 'short', day: 'numeric', month: 'short', timeZone: 'UTC'});
+            const sleepTime = formatDuration(Math.round(day.sleep_minutes || 0), language);
+            summary += isHebrew ?
+                `- ${date}: ${day.sleep_periods} שינות (${sleepTime}), ${day.feed_count} האכלות\n` :
+                `- ${date}: ${day.sleep_periods} sleeps (${sleepTime}), ${day.feed_count} feedings\n`;
+        });
+    }
+    
     // Add recent events if available
     if (data.recent_events) {
         console.log('Processing recent events:', data.recent_events);
@@ -952,9 +1002,9 @@ function generateLocalSummary(period = 'day') {
     try {
         const threadId = getThreadId();
         
-        // Get all events from localStorage
-        const sleepEvents = getLocalEvents('sleep');
-        const feedEvents = getLocalEvents('feeding');
+        // Get all events from localStorage, with the server's copy merged in
+        const sleepEvents = mergeServerEvents('sleep', getLocalEvents('sleep'));
+        const feedEvents = mergeServerEvents('feeding', getLocalEvents('feeding'));
         
         // Calculate date range based on period
         if (period === 'day') {
@@ -1139,30 +1189,66 @@ function formatLocalSummary(summary) {
     return text;
 }
 
-// Fetch latest routine events
+// Days of server events kept in localStorage (the longest summary period, a month)
+const SERVER_EVENTS_WINDOW_DAYS = 31;
+
+// Fetch routine events that changed on the server since the last call.
+// The server copy is kept in localStorage and only the delta is downloaded;
+// the local summary merges it with the events stored on this device.
+// A fresh client, or one whose cursor the server can no longer replay from,
+// gets a snapshot of the last SERVER_EVENTS_WINDOW_DAYS days instead and
+// replaces its copy with it.
 async function fetchLatestEvents() {
     try {
-        // Get current date
-        const now = new Date();
-        const startOfDay = new Date(now.getFullYear(), now.getMonth(), now.getDate());
-        
-        // Format dates for API
-        const startDate = startOfDay.toISOString();
-        const endDate = now.toISOString();
-        
-        const response = await fetch(
-            `${API_ENDPOINTS.ROUTINES.EVENTS}?thread_id=${threadId}&start_date=${startDate}&end_date=${endDate}`
-        );
-        
-        if (!response.ok) {
-            console.error('Error fetching routine events');
-            return;
+        const cursorKey = STORAGE_KEYS.CHANGE_CURSOR + threadId;
+        const eventsKey = STORAGE_KEYS.SERVER_EVENTS + threadId;
+        let cursor = parseInt(localStorage.getItem(cursorKey) || '0', 10);
+        let serverEvents = cursor ? JSON.parse(localStorage.getItem(eventsKey) || '{}') : {};
+        const windowStart = new Date(Date.now() - SERVER_EVENTS_WINDOW_DAYS * 24 * 60 * 60 * 1000);
+        let hasMore = true;
+        
+        while (hasMore) {
+            const url = `${API_ENDPOINTS.ROUTINES.CHANGES}?thread_id=${threadId}&since=${cursor}` +
+                `&start_date=${encodeURIComponent(windowStart.toISOString())}`;
+            const response = await fetch(url);
+            
+            if (!response.ok) {
+                console.error('Error fetching routine changes');
+                return;
+            }
+            
+            const data = await response.json();
+            if (data.status !== 'success') {
+                console.error('Error fetching routine changes:', data.error);
+                return;
+            }
+            
+            if (data.snapshot) {
+                serverEvents = {};
+            }
+            for (const change of data.changes) {
+                if (change.op === 'delete') {
+                    delete serverEvents[`${change.event_type}:${change.event_id}`];
+                } else {
+                    serverEvents[`${change.event.event_type}:${change.event.event_id}`] = change.event;
+                }
+            }
+            cursor = data.cursor;
+            hasMore = data.has_more;
         }
         
-        const data = await response.json();
+        // Drop events that have moved out of the window
+        for (const [key, event] of Object.entries(serverEvents)) {
+            const eventTime = event.event_ts ? event.event_ts * 1000 : Date.parse(event.event_time);
+            if (eventTime < windowStart.getTime()) {
+                delete serverEvents[key];
+            }
+        }
         
-        // Process events data if needed
-        console.log('Today\'s routine events:', data);
+        localStorage.setItem(eventsKey, JSON.stringify(serverEvents));
+        localStorage.setItem(cursorKey, String(cursor));
+        console.log(`Routine events up to date at change ${cursor}`);
+        return Object.values(serverEvents);
         
     } catch (error) {
         console.error('Error fetching routine events:', error);
@@ -1233,6 +1319,9 @@ async function syncLocalEvents() {
         
         console.log(`Found ${sleepEvents.length} unsynced sleep events, ${sleepEndEvents.length} unsynced sleep end events, and ${feedEvents.length} unsynced feed events`);
         
+        // Events are collected here and sent to the server in one batch request
+        const pending = [];
+        
         // Process sleep events
         for (const event of sleepEvents) {
             try {
@@ -1291,31 +1380,12 @@ async function syncLocalEvents() {
                     thread_id: event.thread_id,
                     event_type: 'sleep',
                     start_time: eventTime,
-                    notes: `Auto-synced from local storage: ${event.message}`
+                    notes: `Auto-synced from local storage: ${event.message}`,
+                    local_id: event.local_id
                 };
                 
-                console.log(`Sending sleep event to server: ${JSON.stringify(payload)}`);
-                
-                // Send to server
-                const response = await fetch(API_ENDPOINTS.ROUTINES.EVENTS, {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify(payload)
-                });
-                
-                if (response.ok) {
-                    const data = await response.json();
-                    console.log(`Server response for sleep event: ${JSON.stringify(data)}`);
-                    
-                    // Mark as synced in localStorage
-                    markEventAsSynced('sleep', event.local_id, data.event_id);
-                    console.log(`Successfully synced sleep event: ${event.local_id}`);
-                } else {
-                    const errorText = await response.text();
-                    console.error(`Error syncing sleep event, server returned ${response.status}: ${errorText}`);
-                }
+                // Queue for the batch request below
+                pending.push({ eventType: 'sleep', localId: event.local_id, payload });
             } catch (error) {
                 console.error(`Error syncing sleep event ${event.local_id}:`, error);
             }
@@ -1375,36 +1445,16 @@ async function syncLocalEvents() {
                 }
                 
                 // Create a new sleep_end event instead of updating a sleep event
-                try {
-                    const eventData = {
-                        thread_id: event.thread_id,
-                        event_type: "sleep_end",
-                        start_time: endTime,
-                        notes: `Auto-synced from local storage: ${event.message}`
-                    };
-                    
-                    console.log(`Sending sleep_end event to server: ${JSON.stringify(eventData)}`);
-                    
-                    const response = await fetch(API_ENDPOINTS.ROUTINES.EVENTS, {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json'
-                        },
-                        body: JSON.stringify(eventData)
-                    });
-                    
-                    if (response.ok) {
-                        const data = await response.json();
-                        console.log(`Server response for sleep_end event: ${JSON.stringify(data)}`);
-                        markEventAsSynced('sleep_end', event.local_id, data.event_id);
-                        console.log(`Successfully synced sleep_end event: ${event.local_id}`);
-                    } else {
-                        const errorText = await response.text();
-                        console.error(`Error syncing sleep_end event, server returned ${response.status}: ${errorText}`);
-                    }
-                } catch (error) {
-                    console.error(`Error syncing sleep_end event ${event.local_id}:`, error);
-                }
+                const eventData = {
+                    thread_id: event.thread_id,
+                    event_type: "sleep_end",
+                    start_time: endTime,
+                    notes: `Auto-synced from local storage: ${event.message}`,
+                    local_id: event.local_id
+                };
+                
+                // Queue for the batch request below
+                pending.push({ eventType: 'sleep_end', localId: event.local_id, payload: eventData });
             } catch (error) {
                 console.error(`Error processing sleep_end event ${event.local_id}:`, error);
             }
@@ -1468,36 +1518,24 @@ async function syncLocalEvents() {
                     thread_id: event.thread_id,
                     event_type: 'feeding',
                     start_time: eventTime,
-                    notes: `Auto-synced from local storage: ${event.message}`
+                    notes: `Auto-synced from local storage: ${event.message}`,
+                    local_id: event.local_id
                 };
                 
-                console.log(`Sending feed event to server: ${JSON.stringify(payload)}`);
-                
-                // Send to server
-                const response = await fetch(API_ENDPOINTS.ROUTINES.EVENTS, {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify(payload)
-                });
-                
-                if (response.ok) {
-                    const data = await response.json();
-                    console.log(`Server response for feed event: ${JSON.stringify(data)}`);
-                    
-                    // Mark as synced in localStorage
-                    markEventAsSynced('feeding', event.local_id, data.event_id);
-                    console.log(`Successfully synced feed event: ${event.local_id}`);
-                } else {
-                    const errorText = await response.text();
-                    console.error(`Error syncing feed event, server returned ${response.status}: ${errorText}`);
-                }
+                // Queue for the batch request below
+                pending.push({ eventType: 'feeding', localId: event.local_id, payload });
             } catch (error) {
                 console.error(`Error syncing feed event ${event.local_id}:`, error);
             }
         }
         
+        if (pending.length > 0) {
+            await sendPendingEvents(pending);
+        }
+        
+        // Pull whatever changed on the server since the last sync
+        await fetchLatestEvents();
+        
         console.log('Sync completed');
         
         // Update sync status
@@ -1513,6 +1551,98 @@ async function syncLocalEvents() {
     }
 }
 
+// Largest batch the batch endpoint accepts (MAX_EVENT_BATCH_SIZE on the server)
+const MAX_EVENT_BATCH_SIZE = 500;
+
+// Send queued events in batch requests of at most MAX_EVENT_BATCH_SIZE events.
+// Events in a batch that fails stay unsynced and are sent again on the next sync.
+async function sendPendingEvents(pending) {
+    let batchSize = MAX_EVENT_BATCH_SIZE;
+    let start = 0;
+    while (start < pending.length) {
+        const batch = pending.slice(start, start + batchSize);
+        const status = await sendEventBatch(batch);
+        if (status === 413 && batchSize > 1) {
+            // The server is configured for smaller batches; retry in halves
+            batchSize = Math.ceil(batchSize / 2);
+            console.warn(`Batch of ${batch.length} events too large, retrying with batches of ${batchSize}`);
+            continue;
+        }
+        if (status === 404 || status === 405) {
+            // Older server without the batch endpoint
+            console.warn('Batch endpoint not available, sending events one by one');
+            await sendEventsOneByOne(pending.slice(start));
+            return;
+        }
+        start += batch.length;
+    }
+}
+
+// Send one batch request and mark the events the server stored as synced.
+// Returns the HTTP status, or 0 if the request itself failed.
+async function sendEventBatch(batch) {
+    try {
+        console.log(`Sending batch of ${batch.length} events to server`);
+        const response = await fetch(API_ENDPOINTS.ROUTINES.EVENTS_BATCH, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ events: batch.map(item => item.payload) })
+        });
+        
+        if (!response.ok) {
+            console.warn(`Batch sync failed with status ${response.status}`);
+            return response.status;
+        }
+        
+        const data = await response.json();
+        if (!Array.isArray(data.results)) {
+            console.warn(`Unexpected batch response: ${JSON.stringify(data)}`);
+            return response.status;
+        }
+        data.results.forEach((result, index) => {
+            const item = batch[index];
+            if (result.status === 'success') {
+                markEventAsSynced(item.eventType, item.localId, result.event && result.event.event_id);
+                console.log(`Successfully synced ${item.eventType} event: ${item.localId}`);
+            } else {
+                console.error(`Error syncing ${item.eventType} event ${item.localId}: ${result.error}`);
+            }
+        });
+        return response.status;
+    } catch (error) {
+        console.warn('Batch sync failed:', error);
+        return 0;
+    }
+}
+
+// Send events with one request each, for servers without the batch endpoint
+async function sendEventsOneByOne(pending) {
+    for (const item of pending) {
+        try {
+            const response = await fetch(API_ENDPOINTS.ROUTINES.EVENTS, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(item.payload)
+            });
+            
+            if (response.ok) {
+                const data = await response.json();
+                markEventAsSynced(item.eventType, item.localId, data.event && data.event.event_id);
+                console.log(`Successfully synced ${item.eventType} event: ${item.localId}`);
+            } else {
+                const errorText = await response.text();
+                console.error(`Error syncing ${item.eventType} event, server returned ${response.status}: ${errorText}`);
+            }
+        } catch (error) {
+            console.error(`Error syncing ${item.eventType} event ${item.localId}:`, error);
+        }
+    }
+}
+
 // Helper function to parse time from a string
 function parseTimeFromString(timeStr) {
     try {
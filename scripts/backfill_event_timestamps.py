@@ -0,0 +1,46 @@
+"""
+One-off backfill of canonical event timestamps.
+Walks every thread_events:* list and adds the event_ts epoch field to events
+stored before add_event started writing it.
+
+Usage:
+    python scripts/backfill_event_timestamps.py
+"""
+
+import os
+import sys
+import logging
+import asyncio
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.redis_service import redis_connection, RedisKeyPrefix
+from backend.db.routine_db import backfill_event_timestamps
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, force=True)
+logger = logging.getLogger(__name__)
+
+async def backfill_all_threads() -> bool:
+    """Backfill event_ts for every thread with routine events."""
+    async with redis_connection() as client:
+        if not client:
+            logger.error("Redis client not available")
+            return False
+        
+        prefix = f"{RedisKeyPrefix.THREAD_EVENTS}:"
+        threads = 0
+        events = 0
+        async for list_key in client.scan_iter(match=f"{prefix}*", count=500):
+            thread_id = list_key[len(prefix):]
+            events += await backfill_event_timestamps(thread_id)
+            threads += 1
+        
+        logger.info(f"Backfilled {events} events across {threads} threads")
+        return True
+
+if __name__ == "__main__":
+    success = asyncio.run(backfill_all_threads())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,115 @@
+"""
+Memory comparison of the routine event storage layouts.
+Writes the same generated events to a Redis server once as one key per
+event and once packed into per-thread, per-month buckets, and reports the
+memory each layout takes per event (MEMORY USAGE, which includes each
+key's name and keyspace entry) and the encoding the buckets ended up in.
+
+Only the payload storage differs between the layouts; the thread lists,
+time index and change log hold the same event keys in both, so they are
+left out. All keys are written under a throwaway thread prefix and deleted
+afterwards.
+
+Usage:
+    python scripts/benchmark_event_layout.py [events per thread] [threads]
+"""
+
+import os
+import sys
+import uuid
+import random
+import logging
+import asyncio
+from datetime import datetime, timedelta
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.redis_service import redis_connection, RedisKeyPrefix
+from backend.services.event_layout import bucket_location
+from backend.services.codec import codec
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, force=True)
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ["sleep", "sleep_end", "feeding"]
+
+def generate_events(thread_id: str, count: int, now: datetime):
+    """Generate stored events (as routine_db writes them) going back from now."""
+    events = {}
+    current = now - timedelta(minutes=150 * count)
+    for i in range(count):
+        current += timedelta(minutes=random.randint(30, 240))
+        event_type = EVENT_TYPES[i % len(EVENT_TYPES)]
+        event_time = current.isoformat() + "Z"
+        local_id = f"{event_type}-{uuid.uuid4().hex[:12]}"
+        event_id = f"{event_time.replace(':', '-').replace('.', '-')}-{local_id}"
+        events[f"{RedisKeyPrefix.EVENT}:{thread_id}:{event_type}:{event_id}"] = {
+            "thread_id": thread_id,
+            "event_type": event_type,
+            "event_time": event_time,
+            "event_ts": int(current.timestamp()),
+            "event_data": {"notes": "Fell asleep in the stroller"} if random.random() < 0.3 else {},
+            "local_id": local_id,
+            "event_id": event_id,
+            "created_at": now.isoformat()
+        }
+    return events
+
+async def memory_usage(client, keys):
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.memory_usage(key, samples=0)
+    return sum(usage or 0 for usage in await pipe.execute())
+
+async def run_benchmark(per_thread: int, threads: int) -> bool:
+    """Store the same events in both layouts and compare bytes per event."""
+    random.seed(42)
+    now = datetime.utcnow()
+    run_id = uuid.uuid4().hex[:8]
+    events = {}
+    for index in range(threads):
+        events.update(generate_events(f"layout-benchmark-{run_id}-{index}", per_thread, now))
+    payloads = {key: codec.encode(event) for key, event in events.items()}
+
+    async with redis_connection() as client:
+        if not client:
+            logger.error("Redis client not available")
+            return False
+
+        buckets = set()
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, payload in payloads.items():
+                pipe.set(key, payload)
+                bucket_key, field = bucket_location(key, RedisKeyPrefix.EVENT)
+                pipe.hset(bucket_key, field, payload)
+                buckets.add(bucket_key)
+            await pipe.execute()
+
+            key_bytes = await memory_usage(client, list(payloads))
+            bucket_bytes = await memory_usage(client, list(buckets))
+            encodings = {}
+            for bucket_key in buckets:
+                encoding = await client.object("ENCODING", bucket_key)
+                encodings[encoding] = encodings.get(encoding, 0) + 1
+
+            count = len(payloads)
+            payload_bytes = sum(len(payload.encode("utf-8")) for payload in payloads.values()) / count
+            logger.info(f"{count} events across {threads} threads, average payload {payload_bytes:.0f} bytes")
+            logger.info(f"One key per event: {count} keys, {key_bytes / count:.0f} bytes per event")
+            logger.info(f"Monthly buckets:   {len(buckets)} keys, {bucket_bytes / count:.0f} bytes per event "
+                        f"({(1 - bucket_bytes / key_bytes) * 100:.0f}% less), bucket encodings {encodings}")
+        finally:
+            keys = list(payloads) + list(buckets)
+            for start in range(0, len(keys), 500):
+                await client.delete(*keys[start:start + 500])
+        return True
+
+if __name__ == "__main__":
+    per_thread = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    success = asyncio.run(run_benchmark(per_thread, threads))
+    sys.exit(0 if success else 1)
@@ -0,0 +1,139 @@
+"""
+Benchmark for the routine tracker date-range queries.
+Loads the same generated events into two in-memory SQLite databases, one
+with the previous schema (separate thread_id and start_time indexes) and
+queries (correlated self-join for sleep, OR of ranges otherwise), one with
+the current schema and queries, and times both over the same ranges.
+
+Usage:
+    python scripts/benchmark_routine_queries.py [rows] [threads]
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import logging
+from datetime import datetime, timedelta
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.db.routine_queries import SLEEP_EVENTS_SQL, RANGE_EVENTS_BY_TYPE_SQL, create_schema
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, force=True)
+logger = logging.getLogger(__name__)
+
+LEGACY_SCHEMA = (
+    '''
+    CREATE TABLE routine_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        thread_id TEXT NOT NULL,
+        event_type TEXT NOT NULL,
+        start_time TIMESTAMP NOT NULL,
+        end_time TIMESTAMP,
+        notes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    "CREATE INDEX idx_thread_id ON routine_events(thread_id)",
+    "CREATE INDEX idx_start_time ON routine_events(start_time)"
+)
+
+LEGACY_SLEEP_SQL = '''
+WITH sleep_events AS (
+    SELECT e1.id, e1.thread_id, e1.event_type, e1.start_time, MIN(e2.start_time) as end_time, e1.notes
+    FROM routine_events e1
+    LEFT JOIN routine_events e2 ON
+        e2.thread_id = e1.thread_id AND e2.event_type = 'sleep_end' AND e2.start_time > e1.start_time
+    WHERE e1.thread_id = ? AND e1.event_type = 'sleep' AND e1.start_time >= ? AND e1.start_time <= ?
+    GROUP BY e1.id
+)
+SELECT * FROM sleep_events
+ORDER BY start_time ASC
+'''
+
+LEGACY_RANGE_SQL = '''
+SELECT * FROM routine_events
+WHERE thread_id = ? AND
+(
+    (start_time >= ? AND start_time <= ?) OR
+    (end_time >= ? AND end_time <= ?) OR
+    (start_time <= ? AND (end_time >= ? OR end_time IS NULL))
+)
+ AND event_type = ? ORDER BY start_time ASC
+'''
+
+def generate_rows(count: int, threads: int, start: datetime):
+    """Alternating sleep/sleep_end with feeds in between, spread over threads."""
+    rows = []
+    per_thread = count // threads
+    for thread in range(threads):
+        current = start
+        for i in range(per_thread):
+            current += timedelta(minutes=random.randint(20, 180))
+            event_type = ("sleep", "feeding", "sleep_end")[i % 3]
+            end_time = (current + timedelta(minutes=20)).isoformat() if event_type == "feeding" else None
+            rows.append((f"thread-{thread}", event_type, current.isoformat(), end_time, None))
+    return rows
+
+def load(schema, rows) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    if callable(schema):
+        schema(conn)
+    else:
+        for statement in schema:
+            conn.execute(statement)
+    conn.executemany(
+        "INSERT INTO routine_events (thread_id, event_type, start_time, end_time, notes) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    conn.commit()
+    return conn
+
+def timed(conn: sqlite3.Connection, sql: str, param_sets) -> tuple:
+    started = time.perf_counter()
+    total = sum(len(conn.execute(sql, params).fetchall()) for params in param_sets)
+    return time.perf_counter() - started, total
+
+def run_benchmark(count: int, threads: int):
+    """Time the previous and current queries on the same data and ranges."""
+    random.seed(42)
+    start = datetime(2024, 1, 1)
+    rows = generate_rows(count, threads, start)
+    last = max(row[2] for row in rows if row[0] == "thread-0")
+    span_days = (datetime.fromisoformat(last) - start).days
+    legacy = load(LEGACY_SCHEMA, rows)
+    current = load(create_schema, rows)
+    logger.info(f"{len(rows)} rows across {threads} threads, {span_days} days of events per thread")
+
+    # A day, a week and a month at several points in thread-0's history
+    ranges = []
+    for days in (1, 7, 30):
+        for offset in range(0, max(1, span_days - days), max(1, span_days // 5)):
+            range_start = start + timedelta(days=offset)
+            ranges.append((range_start.isoformat(), (range_start + timedelta(days=days)).isoformat()))
+
+    legacy_seconds, legacy_rows = timed(legacy, LEGACY_SLEEP_SQL, [("thread-0", s, e) for s, e in ranges])
+    current_seconds, current_rows = timed(current, SLEEP_EVENTS_SQL, [("thread-0", s, e, "thread-0", e) for s, e in ranges])
+    assert legacy_rows == current_rows, "Sleep queries returned different row counts"
+    logger.info(f"Sleep pairing, {len(ranges)} ranges: self-join {legacy_seconds * 1000:.1f} ms, "
+                f"window {current_seconds * 1000:.1f} ms ({legacy_seconds / current_seconds:.0f}x faster)")
+
+    legacy_seconds, legacy_rows = timed(
+        legacy, LEGACY_RANGE_SQL, [("thread-0", s, e, s, e, s, s, "feeding") for s, e in ranges]
+    )
+    current_seconds, current_rows = timed(
+        current, RANGE_EVENTS_BY_TYPE_SQL, [("thread-0", "feeding", e, s, s) for s, e in ranges]
+    )
+    assert legacy_rows == current_rows, "Range queries returned different row counts"
+    logger.info(f"Feeding range, {len(ranges)} ranges: OR of ranges {legacy_seconds * 1000:.1f} ms, "
+                f"single range {current_seconds * 1000:.1f} ms ({legacy_seconds / current_seconds:.0f}x faster)")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    run_benchmark(count, threads)
@@ -0,0 +1,103 @@
+"""
+Benchmark for the sleep pairing engine.
+Compares the sort-and-sweep engine with the previous nested-loop matcher,
+which compared every sleep start with every sleep end and re-parsed the
+ISO timestamps inside the inner loop.
+
+Usage:
+    python scripts/benchmark_sleep_pairing.py [events]
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+from datetime import datetime, timedelta
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.sleep_pairing import pair_sleep_events
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, force=True)
+logger = logging.getLogger(__name__)
+
+# The nested-loop matcher is quadratic, so it only runs up to this size
+LEGACY_MAX_EVENTS = 2000
+
+def generate_events(count: int, now: datetime):
+    """Generate alternating sleep/sleep_end events going back from now."""
+    events = []
+    current = now - timedelta(minutes=150 * count)
+    for i in range(count):
+        current += timedelta(minutes=random.randint(30, 240))
+        event_type = "sleep" if i % 2 == 0 else "sleep_end"
+        if random.random() < 0.05:
+            # Occasionally drop the matching half of a pair
+            event_type = "sleep_end" if event_type == "sleep" else "sleep"
+        events.append({
+            "event_type": event_type,
+            "event_time": current.isoformat() + "Z",
+            "local_id": f"{event_type}-{i}"
+        })
+    return events
+
+def legacy_match(sleep_events, sleep_end_events):
+    """The previous O(n*m) matcher, kept here for comparison."""
+    processed = set()
+    periods = []
+    for sleep_event in sleep_events:
+        sleep_start = datetime.fromisoformat(sleep_event["event_time"].replace("Z", "+00:00")).replace(tzinfo=None)
+        matching_end = None
+        closest = timedelta(days=1)
+        for end_event in sleep_end_events:
+            if end_event["local_id"] in processed:
+                continue
+            end_time = datetime.fromisoformat(end_event["event_time"].replace("Z", "+00:00")).replace(tzinfo=None)
+            if end_time > sleep_start and end_time - sleep_start < closest:
+                closest = end_time - sleep_start
+                matching_end = end_event
+        if matching_end:
+            processed.add(matching_end["local_id"])
+            periods.append((sleep_event["local_id"], matching_end["local_id"]))
+    return periods
+
+def engine_match(sleep_events, sleep_end_events, now):
+    """Parse each time once and run the sweep engine."""
+    def timed(events):
+        return [
+            (datetime.fromisoformat(e["event_time"].replace("Z", "+00:00")).replace(tzinfo=None), e)
+            for e in events
+        ]
+    periods, _ = pair_sleep_events(timed(sleep_events), timed(sleep_end_events), datetime.min, now, include_ongoing=False)
+    return periods
+
+def run_benchmark(count: int):
+    """Time both matchers on the same generated events."""
+    random.seed(42)
+    now = datetime.utcnow()
+    events = generate_events(count, now)
+    sleep_events = sorted((e for e in events if e["event_type"] == "sleep"), key=lambda e: e["event_time"])
+    sleep_end_events = sorted((e for e in events if e["event_type"] == "sleep_end"), key=lambda e: e["event_time"])
+
+    start = time.perf_counter()
+    periods = engine_match(sleep_events, sleep_end_events, now)
+    engine_seconds = time.perf_counter() - start
+    paired = sum(1 for p in periods if not p.get("is_virtual"))
+    logger.info(f"{count} events: sweep engine paired {paired} periods in {engine_seconds * 1000:.1f} ms")
+
+    if count <= LEGACY_MAX_EVENTS:
+        start = time.perf_counter()
+        legacy_periods = legacy_match(sleep_events, sleep_end_events)
+        legacy_seconds = time.perf_counter() - start
+        logger.info(f"{count} events: nested loop paired {len(legacy_periods)} periods in {legacy_seconds * 1000:.1f} ms "
+                    f"({legacy_seconds / engine_seconds:.0f}x slower)")
+        assert len(legacy_periods) == paired, "Engine and nested loop disagree on paired periods"
+
+if __name__ == "__main__":
+    sizes = [int(sys.argv[1])] if len(sys.argv) > 1 else [500, 2000, 10000]
+    for size in sizes:
+        run_benchmark(size)
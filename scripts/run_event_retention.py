@@ -0,0 +1,40 @@
+"""
+Run the routine event retention job until its current pass is finished,
+archiving events older than EVENT_RETENTION_DAYS into monthly blobs.
+
+Usage:
+    python scripts/run_event_retention.py
+"""
+
+import os
+import sys
+import logging
+import asyncio
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.event_retention import run_retention
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, force=True)
+logger = logging.getLogger(__name__)
+
+async def run_pass() -> bool:
+    """Run retention batches until the pass completes or a run is refused."""
+    while True:
+        progress = await run_retention()
+        if not progress.get("ran"):
+            logger.info(f"Retention did not run: {progress.get('reason')}")
+            return progress.get("reason") != "Redis unavailable"
+        logger.info(
+            f"Scanned {progress.get('threads_scanned', 0)} threads, archived "
+            f"{progress.get('events_archived', 0)} events into {progress.get('months_written', 0)} months"
+        )
+        if not progress.get("in_pass"):
+            return progress.get("errors", 0) == 0
+
+if __name__ == "__main__":
+    success = asyncio.run(run_pass())
+    sys.exit(0 if success else 1)
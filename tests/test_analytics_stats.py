@@ -0,0 +1,60 @@
+"""
+Test the analytics stats merge script (_MERGE_STATS_LUA) against fakeredis
+with Lua support, including keys still stored as legacy JSON strings.
+"""
+
+import os
+import sys
+import json
+import logging
+import asyncio
+from datetime import datetime
+
+import fakeredis
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.redis_service import redis_service
+from backend.services.analytics_service import (
+    DAILY_STATS_PREFIX, update_daily_stats, get_daily_stats
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def test_legacy_json_stats_are_converted():
+    """Counts, lists (empty ones too) and nested groups of a legacy JSON key carry over."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    redis_service._client = client
+    cache_key = f"{DAILY_STATS_PREFIX}thread-a:sleep:{datetime.utcnow().date().isoformat()}"
+    await client.set(cache_key, json.dumps({
+        "total_events": 2,
+        "total_duration_hours": 3.0,
+        "average_duration": 1.5,
+        "events": [],
+        "times": ["08:00"],
+        "durations": {"short": 1, "recent": []},
+        "last_updated": "2025-01-01T08:00:00"
+    }))
+
+    assert await update_daily_stats("thread-a", "sleep", {"total_events": 1, "total_duration_hours": 1.5})
+    assert await client.type(cache_key) == "hash"
+    stats = await get_daily_stats("thread-a", "sleep")
+    assert stats["total_events"] == 3
+    assert stats["total_duration_hours"] == 4.5
+    assert stats["average_duration"] == 1.5
+    assert stats["events"] == []
+    assert stats["times"] == ["08:00"]
+    assert stats["durations"] == {"short": 1, "recent": []}
+    assert stats["last_updated"] == "2025-01-01T08:00:00"
+
+    # The converted empty list is still a list to push onto
+    assert await update_daily_stats("thread-a", "sleep", {"events": ["09:00"]})
+    assert (await get_daily_stats("thread-a", "sleep"))["events"] == ["09:00"]
+    logger.info("✓ Legacy stats conversion test passed")
+
+if __name__ == "__main__":
+    asyncio.run(test_legacy_json_stats_are_converted())
@@ -0,0 +1,98 @@
+"""
+Test the circuit breaker that short-circuits Redis calls during outages.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from backend.services.redis_service import RedisService
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_opens_after_consecutive_failures():
+    """The circuit opens at the threshold and refuses calls until the timeout."""
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED, "A success resets the failure count"
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    assert breaker.stats()["rejected_calls"] == 1
+    logger.info("✓ Open state test passed")
+
+def test_half_open_probe():
+    """After the timeout one probe goes through; its outcome decides the state."""
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request(), "Only one probe at a time"
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow_request()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow_request()
+    logger.info("✓ Half-open probe test passed")
+
+class _UnreachableClient:
+    """Client whose commands fail the way an unreachable server does."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def get(self, key):
+        self.calls += 1
+        raise ConnectionError("connection refused")
+
+async def _check_service_fails_fast():
+    service = RedisService()
+    service._client = _UnreachableClient()
+    service.breaker = CircuitBreaker("redis", failure_threshold=2, reset_timeout=60)
+    for _ in range(5):
+        assert await service.get("missing") is None
+    assert service._client.calls == 2, "Calls after the circuit opens must skip Redis"
+    assert service.breaker.state == OPEN
+
+def test_service_fails_fast_when_open():
+    asyncio.run(_check_service_fails_fast())
+    logger.info("✓ Fast-fail test passed")
+
+async def _check_handled_failures_count():
+    service = RedisService()
+    service._client = _UnreachableClient()
+    service.breaker = CircuitBreaker("redis", failure_threshold=2, reset_timeout=60)
+    for _ in range(5):
+        async with service.connection() as client:
+            if client is None:
+                continue
+            # The nested read handles its own failure; the enclosing block
+            # exits normally but must not record a success over it
+            assert await service.get("missing") is None
+    assert service._client.calls == 2
+    assert service.breaker.state == OPEN
+
+def test_handled_nested_failures_open_the_circuit():
+    asyncio.run(_check_handled_failures_count())
+    logger.info("✓ Handled failure test passed")
+
+if __name__ == "__main__":
+    test_opens_after_consecutive_failures()
+    test_half_open_probe()
+    test_service_fails_fast_when_open()
+    test_handled_nested_failures_open_the_circuit()
@@ -0,0 +1,69 @@
+"""
+Test the stored value codec: compression of large values, plain JSON for
+small ones, and reading values written before the codec.
+"""
+
+import os
+import sys
+import json
+import logging
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.codec import ValueCodec, MARKER, is_encoded
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _conversation(turns):
+    return {
+        "context": {"baby_age": {"months": 4}},
+        "messages": [
+            {"type": "human" if i % 2 == 0 else "ai", "content": "התינוקת ישנה רק שעה בצהריים, זה תקין?"}
+            for i in range(turns)
+        ]
+    }
+
+def test_large_values_are_compressed():
+    """A long Hebrew conversation is stored compressed and decodes to the same value."""
+    codec = ValueCodec(min_compress_bytes=1024)
+    value = _conversation(100)
+    stored = codec.encode(value)
+    assert is_encoded(stored)
+    assert codec.decode(stored) == value
+    legacy_size = len(json.dumps(value, default=str).encode("utf-8"))
+    assert len(stored.encode("utf-8")) * 5 < legacy_size
+    stats = codec.stats()
+    assert stats["values_compressed"] == 1 and stats["compression_ratio"] > 3
+    logger.info(f"✓ Compression test passed ({legacy_size} -> {len(stored)} bytes)")
+
+def test_small_values_stay_json():
+    """Values under the threshold are plain compact JSON with UTF-8 text."""
+    codec = ValueCodec(min_compress_bytes=1024)
+    stored = codec.encode({"content": "שלום"})
+    assert stored == '{"content":"שלום"}'
+    assert codec.decode(stored) == {"content": "שלום"}
+    assert codec.decode(codec.encode_json(json.dumps(_conversation(50)))) == _conversation(50)
+    logger.info("✓ Small value test passed")
+
+def test_legacy_and_unknown_formats():
+    """Values written as escaped JSON still read; unknown envelopes are rejected."""
+    codec = ValueCodec()
+    legacy = json.dumps({"content": "שלום", "when": "2025-03-10"})
+    assert codec.decode(legacy)["content"] == "שלום"
+    assert codec.stats()["plain_json_reads"] == 1
+    for bad in (MARKER + "9jz00", MARKER + "1jzNotBase85~~~"):
+        try:
+            codec.decode(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"{bad!r} should not decode")
+    logger.info("✓ Legacy format test passed")
+
+if __name__ == "__main__":
+    test_large_values_are_compressed()
+    test_small_values_stay_json()
+    test_legacy_and_unknown_formats()
@@ -0,0 +1,149 @@
+"""
+Test that week summaries built from the per-day rollup buckets match
+summaries built from raw events, and that backfilling the buckets counts
+a thread's sleep in the global stats once. Runs against fakeredis (with
+Lua support).
+"""
+
+import os
+import sys
+import uuid
+import logging
+import asyncio
+from datetime import datetime, timedelta
+
+import fakeredis
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import backend.db.routine_db as routine_db
+from backend.services.redis_service import redis_service, RedisKeyPrefix
+from backend.services.analytics_service import GLOBAL_SLEEP_PREFIX, GLOBAL_SLEEPERS_PREFIX, get_global_stats
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat() + "Z"
+
+async def _add_week(thread_id: str, week_start: datetime) -> None:
+    """A week of events, including sleep across the window start and sleep ends without starts."""
+    day = timedelta(days=1)
+    events = [
+        ("feeding", week_start - timedelta(hours=3)),
+        # Starts before the window, ends an hour into it
+        ("sleep", week_start - timedelta(hours=1)),
+        ("sleep_end", week_start + timedelta(hours=1)),
+        ("feeding", week_start + timedelta(hours=8)),
+        ("feeding", week_start + timedelta(hours=12)),
+        ("sleep", week_start + timedelta(hours=13)),
+        ("sleep_end", week_start + timedelta(hours=14, minutes=30)),
+        # Overnight across a day boundary inside the window
+        ("sleep", week_start + timedelta(hours=20)),
+        ("sleep_end", week_start + day + timedelta(hours=6)),
+        ("feeding", week_start + day + timedelta(hours=9)),
+        # Wake-ups logged without a start
+        ("sleep_end", week_start + day + timedelta(hours=15)),
+        ("sleep_end", week_start + 2 * day + timedelta(hours=1)),
+        ("sleep", week_start + 3 * day + timedelta(hours=10)),
+        ("feeding", week_start + 3 * day + timedelta(hours=10, minutes=30)),
+        ("sleep_end", week_start + 3 * day + timedelta(hours=11))
+    ]
+    for event_type, event_dt in events:
+        result = await routine_db.add_event(thread_id, event_type, _iso(event_dt), local_id=uuid.uuid4().hex[:8])
+        assert "error" not in result, result
+
+async def _summaries(thread_id: str, now: datetime):
+    rollup = await routine_db._generate_summary(thread_id, "week", now=now)
+    rollup_periods = routine_db.ROLLUP_PERIODS
+    routine_db.ROLLUP_PERIODS = ()
+    try:
+        raw = await routine_db._generate_summary(thread_id, "week", now=now)
+    finally:
+        routine_db.ROLLUP_PERIODS = rollup_periods
+    return rollup, raw
+
+async def test_rollup_totals_match_raw_events():
+    """Sleep and feeding totals agree between the rollup and raw-event summaries."""
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start = today - timedelta(days=today.weekday() + 7)
+    now = week_start + timedelta(days=3, hours=18)
+    thread_id = f"test_rollups_{uuid.uuid4().hex[:8]}"
+    await _add_week(thread_id, week_start)
+
+    rollup, raw = await _summaries(thread_id, now)
+    assert rollup.get("source") == "daily_rollups", rollup
+    assert "source" not in raw
+    for routine in ("sleep", "feeding"):
+        assert rollup["routines"][routine]["total_events"] == raw["routines"][routine]["total_events"], routine
+    assert rollup["routines"]["sleep"]["total_events"] == 6
+    assert rollup["routines"]["feeding"]["total_events"] == 4
+    assert rollup["routines"]["sleep"]["total_duration"] == raw["routines"]["sleep"]["total_duration"] == 17.5
+
+    # The sleep across the window start is counted from the window start
+    boundary = rollup["routines"]["sleep"]["events"]
+    assert [period["start"] for period in boundary] == [week_start.isoformat()]
+    assert boundary[0]["duration"] == 1.0
+
+    # The per-day breakdown adds up to the totals
+    daily = rollup["daily"]
+    assert daily[0]["date"] == week_start.date().isoformat()
+    assert sum(day["sleep_periods"] for day in daily) == 6
+    assert sum(day["feed_count"] for day in daily) == 4
+    assert round(sum(day["sleep_minutes"] for day in daily)) == 17.5 * 60
+
+    # The latest feeding is the window's, not the thread's latest overall
+    latest_feed = rollup["routines"]["feeding"]["latest_event"]
+    assert latest_feed["event_time"] == raw["routines"]["feeding"]["latest_event"]["event_time"]
+    await routine_db.add_event(thread_id, "feeding", _iso(now + timedelta(hours=2)), local_id="after")
+    rollup, _ = await _summaries(thread_id, now)
+    assert rollup["routines"]["feeding"]["latest_event"]["event_time"] == latest_feed["event_time"]
+    next_week, _ = await _summaries(thread_id, week_start + timedelta(days=7, hours=1))
+    assert next_week["routines"]["feeding"]["latest_event"] is None
+    logger.info("✓ Rollup summary test passed")
+
+async def _delete_keys(client, *patterns: str) -> None:
+    for pattern in patterns:
+        keys = [key async for key in client.scan_iter(match=pattern)]
+        if keys:
+            await client.delete(*keys)
+
+async def test_backfill_records_global_sleep_once():
+    """A thread that predates the buckets is added to the global sleep totals once."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    redis_service._client = client
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start = today - timedelta(days=today.weekday() + 7)
+    thread_id = f"test_backfill_{uuid.uuid4().hex[:8]}"
+    await _add_week(thread_id, week_start)
+    days = [(week_start + timedelta(days=offset)).date().isoformat() for offset in range(-1, 5)]
+    recorded = await get_global_stats(days)
+
+    # Drop the buckets and global counters, as for a thread written before them
+    await _delete_keys(
+        client, f"{RedisKeyPrefix.ROUTINE_DAILY}*:{thread_id}*", f"{RedisKeyPrefix.PATTERNS_READY}:{thread_id}",
+        f"{GLOBAL_SLEEP_PREFIX}*", f"{GLOBAL_SLEEPERS_PREFIX}*"
+    )
+    assert (await get_global_stats(days))["totals"]["sleep_periods"] == 0
+
+    assert await routine_db._ensure_daily_rollups(thread_id)
+    backfilled = await get_global_stats(days)
+    assert backfilled["totals"]["sleep_periods"] == recorded["totals"]["sleep_periods"] > 0
+    assert backfilled["totals"]["sleep_minutes"] == recorded["totals"]["sleep_minutes"]
+    assert [day["sleep"] for day in backfilled["days"]] == [day["sleep"] for day in recorded["days"]]
+
+    # The pattern backfill rewrites the same buckets without counting them again
+    assert await routine_db._ensure_routine_patterns(thread_id)
+    assert (await get_global_stats(days))["totals"] == backfilled["totals"]
+    logger.info("✓ Backfill global sleep test passed")
+
+async def main():
+    await test_rollup_totals_match_raw_events()
+    await test_backfill_records_global_sleep_once()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+"""
+Test where the bucket layout stores routine event payloads.
+"""
+
+import os
+import sys
+import logging
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.event_layout import UNDATED_BUCKET, bucket_month, bucket_location
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_bucket_month():
+    """Events are bucketed by the month their ID starts with."""
+    assert bucket_month("2025-03-10T12-00-00-000Z-sleep-abc") == "2025-03"
+    assert bucket_month("3f2a9c1e-uuid") == UNDATED_BUCKET
+    assert bucket_month("") == UNDATED_BUCKET
+    logger.info("✓ Bucket month test passed")
+
+def test_bucket_location():
+    """The field keeps the event type and ID, including colons in local ids."""
+    assert bucket_location("event:t1:sleep:2025-03-10T12-00-00Z-local:7") == (
+        "event_bucket:t1:2025-03", "sleep:2025-03-10T12-00-00Z-local:7"
+    )
+    assert bucket_location("event:t1:feeding:abc") == ("event_bucket:t1:undated", "feeding:abc")
+    assert bucket_location("thread_events:t1") is None
+    assert bucket_location("event:t1:sleep") is None
+    logger.info("✓ Bucket location test passed")
+
+if __name__ == "__main__":
+    test_bucket_month()
+    test_bucket_location()
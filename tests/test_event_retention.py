@@ -0,0 +1,138 @@
+"""
+Test the month arithmetic of the event retention job, and its runs against
+fakeredis (with Lua support): resuming within a SCAN batch, stopping when
+the lock is lost, refusing to delete archived events, and serving archived
+events through change-feed snapshots.
+"""
+
+import os
+import sys
+import uuid
+import logging
+import asyncio
+from datetime import datetime, timedelta
+
+import fakeredis
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import backend.services.event_retention as event_retention
+import backend.db.routine_db as routine_db
+from backend.services.event_retention import archive_month, month_start, archive_cutoff, run_retention, get_retention_progress
+from backend.services.redis_service import redis_service, RedisKeyPrefix
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_archive_months():
+    """Events fall in the UTC month of their timestamp."""
+    march = month_start("2025-03")
+    assert datetime.utcfromtimestamp(march) == datetime(2025, 3, 1)
+    assert archive_month(march) == "2025-03"
+    assert archive_month(march - 1) == "2025-02"
+    assert month_start(archive_month(march + 86400 * 20)) == march
+    logger.info("✓ Archive month test passed")
+
+def test_cutoff_is_month_aligned():
+    """The cutoff is the start of the month the horizon falls in."""
+    assert archive_cutoff(datetime(2025, 9, 15, 8, 0), 180) == month_start("2025-03")
+    assert archive_cutoff(datetime(2025, 9, 1), 31) == month_start("2025-08")
+    logger.info("✓ Cutoff test passed")
+
+async def _old_events(thread_count: int):
+    """Threads with one event from a year ago and one from today."""
+    now = datetime.utcnow().replace(microsecond=0)
+    threads = [f"test_retention_{uuid.uuid4().hex[:8]}" for _ in range(thread_count)]
+    old = {}
+    for thread_id in threads:
+        old[thread_id] = await routine_db.add_event(thread_id, "feeding", (now - timedelta(days=365)).isoformat() + "Z", local_id="old")
+        await routine_db.add_event(thread_id, "feeding", now.isoformat() + "Z", local_id="new")
+    return threads, old
+
+async def test_runs_resume_within_a_scan_batch():
+    """Out of time mid-batch, a run saves the threads it didn't reach and the next run starts with them."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    redis_service._client = client
+    threads, _ = await _old_events(3)
+
+    first = await run_retention(run_seconds=0)
+    assert first["ran"] and first["threads_scanned"] == 1
+    assert first["pending_threads"] == 2 and first["in_pass"]
+    second = await run_retention(run_seconds=0)
+    assert second["threads_scanned"] == 2 and second["pending_threads"] == 1
+    third = await run_retention(run_seconds=0)
+    assert third["threads_scanned"] == 3 and third["pending_threads"] == 0
+    assert not third["in_pass"] and "pass_finished_at" in third
+    assert third["events_archived"] == 3
+
+    for thread_id in threads:
+        assert await client.zcard(f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}") == 1
+        assert len(await routine_db.get_events(thread_id)) == 2
+    assert (await run_retention())["reason"] == "The last pass finished recently"
+    logger.info("✓ Retention resume test passed")
+
+async def test_run_stops_when_lock_is_lost():
+    """A run whose lock was taken over stops before the next thread and saves no progress."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    redis_service._client = client
+    await _old_events(3)
+    archive_thread = event_retention.archive_thread
+    async def archive_then_lose_lock(thread_id, cutoff_ts):
+        result = await archive_thread(thread_id, cutoff_ts)
+        await client.set(RedisKeyPrefix.EVENT_RETENTION_LOCK, "another-run")
+        return result
+    event_retention.archive_thread = archive_then_lose_lock
+    try:
+        assert (await run_retention())["ran"]
+    finally:
+        event_retention.archive_thread = archive_thread
+    progress = await get_retention_progress()
+    assert progress.get("threads_scanned") == 0 and progress["pending_threads"] == 0
+    assert "pass_finished_at" not in progress
+    assert await client.get(RedisKeyPrefix.EVENT_RETENTION_LOCK) == "another-run"
+    logger.info("✓ Lost lock test passed")
+
+async def test_archived_events_are_not_deleted():
+    """Deleting an archived event reports failure and leaves it readable."""
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    threads, old = await _old_events(1)
+    thread_id, event = threads[0], old[threads[0]]
+    await run_retention()
+    assert not await routine_db.delete_event(thread_id, "feeding", event["event_id"])
+    assert event["event_id"] in [stored["event_id"] for stored in await routine_db.get_events(thread_id)]
+    assert not await routine_db.delete_event(thread_id, "feeding", "missing-event")
+    logger.info("✓ Archived delete test passed")
+
+async def test_change_feed_covers_archived_events():
+    """Snapshots include archived events; a cursor older than an archived event's last change gets one."""
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    threads, _ = await _old_events(1)
+    thread_id = threads[0]
+    await routine_db.add_event(thread_id, "feeding", (datetime.utcnow() - timedelta(days=300)).isoformat() + "Z", local_id="older")
+    before = await routine_db.get_changes(thread_id, 0)
+    assert before["snapshot"] and before["cursor"] == 3 and len(before["changes"]) == 3
+
+    await run_retention()
+    event_ids = lambda result: sorted(change["event"]["event_id"] for change in result["changes"])
+    full = await routine_db.get_changes(thread_id, 0)
+    assert full["snapshot"] and event_ids(full) == event_ids(before)
+    # The newest archived event changed at sequence 3, so cursor 2 can't be replayed
+    stale = await routine_db.get_changes(thread_id, 2)
+    assert stale["snapshot"] and event_ids(stale) == event_ids(before) and stale["cursor"] == 3
+    current = await routine_db.get_changes(thread_id, 3)
+    assert not current["snapshot"] and current["changes"] == [] and current["cursor"] == 3
+    logger.info("✓ Archived change feed test passed")
+
+async def main():
+    await test_runs_resume_within_a_scan_batch()
+    await test_run_stops_when_lock_is_lost()
+    await test_archived_events_are_not_deleted()
+    await test_change_feed_covers_archived_events()
+
+if __name__ == "__main__":
+    test_archive_months()
+    test_cutoff_is_month_aligned()
+    asyncio.run(main())
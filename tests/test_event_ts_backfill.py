@@ -0,0 +1,78 @@
+"""
+Test backfill_event_timestamps against fakeredis (with Lua support): events
+written before the canonical event_ts field get it from their event_time,
+are scored in the time index and show up in the change feed; events that
+already have it, or whose time can't be parsed, are left alone.
+"""
+
+import os
+import sys
+import uuid
+import logging
+import asyncio
+from datetime import datetime, timedelta
+
+import fakeredis
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import backend.db.routine_db as routine_db
+from backend.services.codec import codec
+from backend.services.redis_service import (
+    redis_service, RedisKeyPrefix, get_events_with_fallback, queue_event_payload, get_event_version
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def _rewrite(client, event_key: str, **changes) -> None:
+    """Rewrite a stored payload without going through add_event."""
+    event = (await get_events_with_fallback([event_key]))[0]
+    event.update(changes)
+    event = {key: value for key, value in event.items() if value is not None}
+    pipe = client.pipeline(transaction=False)
+    queue_event_payload(pipe, event_key, codec.encode(event))
+    await pipe.execute()
+
+async def test_backfill_event_timestamps():
+    """Old events get event_ts and an index score once; others are skipped."""
+    client = redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    thread_id = f"test_event_ts_{uuid.uuid4().hex[:8]}"
+    now = datetime.utcnow().replace(microsecond=0)
+    events = [
+        await routine_db.add_event(thread_id, "sleep", (now - timedelta(hours=hours)).isoformat() + "Z", local_id=f"s{hours}")
+        for hours in (3, 2, 1)
+    ]
+    old, current, unparseable = [f"{RedisKeyPrefix.EVENT}:{thread_id}:sleep:{event['event_id']}" for event in events]
+    index_key = f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}"
+
+    # One event from before event_ts, one that can't be parsed
+    await _rewrite(client, old, event_ts=None)
+    await _rewrite(client, unparseable, event_ts=None, event_time="not a time")
+    await client.zrem(index_key, old, unparseable)
+    version = await get_event_version(thread_id)
+
+    assert await routine_db.backfill_event_timestamps(thread_id) == 1
+    payloads = await get_events_with_fallback([old, current, unparseable])
+    assert payloads[0]["event_ts"] == events[0]["event_ts"]
+    assert payloads[1]["event_ts"] == events[1]["event_ts"]
+    assert "event_ts" not in payloads[2]
+    assert await client.zscore(index_key, old) == events[0]["event_ts"]
+    assert await client.zscore(index_key, unparseable) is None
+
+    # Clients following the change feed get the rewritten event
+    assert await get_event_version(thread_id) == version + 1
+    changes = await routine_db.get_changes(thread_id, version)
+    assert [change["event"]["event_id"] for change in changes["changes"]] == [events[0]["event_id"]]
+
+    assert await routine_db.backfill_event_timestamps(thread_id) == 0
+    logger.info("✓ event_ts backfill test passed")
+
+async def main():
+    await test_backfill_event_timestamps()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+"""
+Test idempotent routine event writes (_WRITE_EVENT_LUA) against fakeredis
+with Lua support, the memory-cache fallback used without Redis, and the
+change feed read by the frontend.
+"""
+
+import os
+import sys
+import json
+import logging
+import asyncio
+from datetime import datetime, timedelta
+
+import fakeredis
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import backend.services.redis_service as redis_module
+from backend.services.redis_service import redis_service, write_events, RedisKeyPrefix
+from backend.services.memory_cache import MemoryCache, _estimate_size
+import backend.db.routine_db as routine_db
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _entry(thread_id: str, event_id: str, local_id: str, event_ts: int = 1735689600):
+    event_key = f"{RedisKeyPrefix.EVENT}:{thread_id}:sleep:{event_id}"
+    return {
+        "thread_id": thread_id,
+        "event_type": "sleep",
+        "event_key": event_key,
+        "event_ts": event_ts,
+        "event_json": json.dumps({"thread_id": thread_id, "event_type": "sleep", "event_id": event_id, "local_id": local_id}),
+        "local_id": local_id
+    }
+
+async def test_replayed_local_id_is_written_once():
+    """A second write with the same local_id stores nothing and returns the first event's key."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    redis_service._client = client
+    first = _entry("thread-a", "2025-01-01T00-00-00Z-abc", "abc")
+    replay = _entry("thread-a", "2025-01-01T00-05-00Z-abc", "abc", 1735689900)
+
+    assert await write_events([first]) == [first["event_key"]]
+    assert await write_events([replay]) == [first["event_key"]]
+    # Replays inside one batch resolve the same way
+    assert await write_events([replay, first]) == [first["event_key"], first["event_key"]]
+
+    assert await client.lrange(f"{RedisKeyPrefix.THREAD_EVENTS}:thread-a", 0, -1) == [first["event_key"]]
+    assert await client.zrange(f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:thread-a", 0, -1) == [first["event_key"]]
+    assert await client.exists(replay["event_key"]) == 0
+    assert await client.hgetall(f"{RedisKeyPrefix.EVENT_LOCAL_IDS}:thread-a") == {"abc": first["event_key"]}
+    assert await client.get(f"{RedisKeyPrefix.EVENT_SEQ}:thread-a") == "1"
+    logger.info("✓ Replayed local_id test passed")
+
+async def test_add_event_replay_returns_recorded_event():
+    """Retrying add_event with a local_id returns the recorded event and writes nothing."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    redis_service._client = client
+    first = await routine_db.add_event("thread-b", "feeding", "2025-01-01T08:00:00Z", {"amount": 120}, "feed-1")
+    retry = await routine_db.add_event("thread-b", "feeding", "2025-01-01T08:00:00Z", {"amount": 120}, "feed-1")
+    assert retry["event_id"] == first["event_id"]
+    assert len(await routine_db.get_events("thread-b")) == 1
+    logger.info("✓ add_event replay test passed")
+
+async def test_memory_fallback_counts_local_id_index():
+    """Without Redis, the local_id index is kept in the memory cache at its current size."""
+    redis_service._client = None
+    cache = MemoryCache()
+    original, redis_module._memory_cache = redis_module._memory_cache, cache
+    try:
+        for index in range(50):
+            entry = _entry("thread-c", f"2025-01-01T00-{index:02d}-00Z-id{index}", f"id{index}")
+            assert await write_events([entry]) == [entry["event_key"]]
+        replay = _entry("thread-c", "2025-01-02T00-00-00Z-id0", "id0")
+        assert await write_events([replay]) == [_entry("thread-c", "2025-01-01T00-00-00Z-id0", "id0")["event_key"]]
+
+        index_key = f"{RedisKeyPrefix.EVENT_LOCAL_IDS}:thread-c"
+        assert len(cache.get(index_key)) == 50
+        counted = sum(_estimate_size(key, cache.get(key)) for key in list(cache._entries))
+        assert cache.stats()["bytes"] == counted
+    finally:
+        redis_module._memory_cache = original
+    logger.info("✓ Memory fallback index size test passed")
+
+async def test_register_local_ids_counts_index():
+    """register_local_ids keeps existing mappings and re-sizes the memory cache entry."""
+    redis_service._client = None
+    cache = MemoryCache()
+    original, redis_module._memory_cache = redis_module._memory_cache, cache
+    try:
+        await redis_module.register_local_ids("thread-e", {"a": "event:thread-e:sleep:1"})
+        await redis_module.register_local_ids("thread-e", {f"id{index}": f"event:thread-e:sleep:x{index}" for index in range(50)})
+        await redis_module.register_local_ids("thread-e", {"a": "event:thread-e:sleep:2"})
+
+        index = cache.get(f"{RedisKeyPrefix.EVENT_LOCAL_IDS}:thread-e")
+        assert len(index) == 51 and index["a"] == "event:thread-e:sleep:1"
+        counted = sum(_estimate_size(key, cache.get(key)) for key in list(cache._entries))
+        assert cache.stats()["bytes"] == counted
+    finally:
+        redis_module._memory_cache = original
+    logger.info("✓ register_local_ids index size test passed")
+
+async def test_change_feed_snapshot_from_start_date():
+    """A client without a cursor gets the events since start_date, then only new changes."""
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    now = datetime.utcnow().replace(microsecond=0)
+    await routine_db.add_event("thread-d", "feeding", (now - timedelta(days=60)).isoformat() + "Z", local_id="old")
+    recent = await routine_db.add_event("thread-d", "feeding", (now - timedelta(days=2)).isoformat() + "Z", local_id="recent")
+
+    snapshot = await routine_db.get_changes("thread-d", 0, start_date=now - timedelta(days=31))
+    assert [change["event"]["event_id"] for change in snapshot["changes"]] == [recent["event_id"]]
+    assert snapshot["cursor"] == await redis_module.get_event_version("thread-d") == 2
+    assert snapshot["has_more"] is False
+
+    latest = await routine_db.add_event("thread-d", "sleep", now.isoformat() + "Z", local_id="latest")
+    delta = await routine_db.get_changes("thread-d", snapshot["cursor"])
+    assert [change["event"]["event_id"] for change in delta["changes"]] == [latest["event_id"]]
+    assert delta["cursor"] == 3
+    logger.info("✓ Change feed snapshot test passed")
+
+async def main():
+    await test_replayed_local_id_is_written_once()
+    await test_add_event_replay_returns_recorded_event()
+    await test_memory_fallback_counts_local_id_index()
+    await test_register_local_ids_counts_index()
+    await test_change_feed_snapshot_from_start_date()
+
+if __name__ == "__main__":
+    asyncio.run(main())
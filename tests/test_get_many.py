@@ -0,0 +1,84 @@
+"""
+Test RedisService.get_many against fakeredis: keys are read in MGET chunks
+sent through one pipeline, and the values come back in key order with
+None for missing keys, after the memory-cache fallback.
+"""
+
+import os
+import sys
+import logging
+import asyncio
+
+import fakeredis
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import backend.services.redis_service as redis_module
+from backend.services.redis_service import RedisService
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class _CountingRedis(fakeredis.FakeAsyncRedis):
+    """Records the size of every MGET and the number of pipelines executed."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.mgets = []
+        self.round_trips = 0
+
+    def pipeline(self, *args, **kwargs):
+        pipe = super().pipeline(*args, **kwargs)
+        mget, execute = pipe.mget, pipe.execute
+
+        def counted_mget(keys, *more):
+            self.mgets.append(len(keys) + len(more))
+            return mget(keys, *more)
+
+        async def counted_execute(*args, **kwargs):
+            self.round_trips += 1
+            return await execute(*args, **kwargs)
+
+        pipe.mget, pipe.execute = counted_mget, counted_execute
+        return pipe
+
+async def test_keys_are_read_in_chunks():
+    """Keys are split into MGETs of at most chunk_size, all sent in one round trip."""
+    service = RedisService()
+    client = service._client = _CountingRedis(decode_responses=True)
+    keys = [f"test_get_many:{i}" for i in range(7)]
+    for i, key in enumerate(keys):
+        await service.set(key, {"value": i})
+
+    values = await service.get_many(keys, chunk_size=3)
+    assert values == [{"value": i} for i in range(7)]
+    assert client.mgets == [3, 3, 1] and client.round_trips == 1
+
+    # The default chunk size is BATCH_READ_CHUNK_SIZE
+    client.mgets = []
+    assert await service.get_many(keys) == values
+    assert client.mgets == [min(len(keys), redis_module.BATCH_READ_CHUNK_SIZE)]
+    assert await service.get_many([]) == []
+    logger.info("✓ Chunked read test passed")
+
+async def test_missing_keys_keep_their_position():
+    """Missing keys come back as None in place; memory-cache copies fill Redis misses."""
+    service = RedisService()
+    service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    await service.set("test_get_many:a", "a")
+    await service.set("test_get_many:c", "c")
+    redis_module._memory_cache.set("test_get_many:memory", "m")
+
+    keys = ["test_get_many:missing", "test_get_many:a", "test_get_many:memory", "test_get_many:gone", "test_get_many:c"]
+    assert await service.get_many(keys, chunk_size=2) == [None, "a", "m", None, "c"]
+    logger.info("✓ Missing key test passed")
+
+async def main():
+    await test_keys_are_read_in_chunks()
+    await test_missing_keys_keep_their_position()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Test the per-process L1 cache over fakeredis pub/sub: two RedisService
+instances share one server, as two workers share Redis, and a write through
+one drops the other's L1 copy of the key.
+"""
+
+import os
+import sys
+import logging
+import asyncio
+
+import fakeredis
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.redis_service import RedisService
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+KEY = "test_l1:settings"
+
+async def _wait_for(condition, timeout: float = 1.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out waiting for pub/sub"
+        await asyncio.sleep(0.01)
+
+async def _workers():
+    server = fakeredis.FakeServer()
+    workers = []
+    for _ in range(2):
+        worker = RedisService()
+        worker._client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        workers.append(worker)
+    for worker in workers:
+        # The first read starts the listener; L1 is used once it is subscribed
+        await worker.get_cached(KEY)
+        await _wait_for(lambda: worker._l1_active)
+    return workers
+
+async def test_write_drops_other_workers_copy():
+    """set_cached and delete_cached in one worker drop the key from the other's L1."""
+    writer, reader = await _workers()
+    await writer.set_cached(KEY, {"version": 1})
+    assert await reader.get_cached(KEY) == {"version": 1}
+    assert reader.l1.get(KEY) == {"version": 1}
+
+    # A plain set doesn't publish, so the reader keeps serving its L1 copy
+    await writer.set(KEY, {"version": 2})
+    assert await reader.get_cached(KEY) == {"version": 1}
+
+    await writer.set_cached(KEY, {"version": 3})
+    await _wait_for(lambda: reader.l1.get(KEY) is None)
+    assert await reader.get_cached(KEY) == {"version": 3}
+
+    await writer.delete_cached(KEY)
+    await _wait_for(lambda: reader.l1.get(KEY) is None)
+    assert await reader.get_cached(KEY) is None
+    for worker in (writer, reader):
+        worker._listener_task.cancel()
+    logger.info("✓ Cross-worker invalidation test passed")
+
+async def test_own_writes_and_listener_loss():
+    """A worker keeps its own writes in L1; losing the subscription empties L1."""
+    writer, reader = await _workers()
+    await writer.set_cached(KEY, {"version": 1})
+    # Let the writer's listener see its own message before checking
+    await writer.get_cached(KEY)
+    await asyncio.sleep(0.05)
+    assert writer.l1.get(KEY) == {"version": 1}
+
+    assert await reader.get_cached(KEY) == {"version": 1}
+    reader._listener_task.cancel()
+    await _wait_for(lambda: not reader._l1_active)
+    assert reader.l1.get(KEY) is None
+    writer._listener_task.cancel()
+    logger.info("✓ Own write and listener loss test passed")
+
+async def main():
+    await test_write_drops_other_workers_copy()
+    await test_own_writes_and_listener_loss()
+
+if __name__ == "__main__":
+    asyncio.run(main())
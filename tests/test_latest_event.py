@@ -0,0 +1,101 @@
+"""
+Test the per-thread latest-event pointers against fakeredis (with Lua
+support): they follow writes, skip older events, and move to the newest
+remaining event of the type when the latest one is deleted, paging through
+the time index to find it.
+"""
+
+import os
+import sys
+import uuid
+import logging
+import asyncio
+from datetime import datetime, timedelta
+
+import fakeredis
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import backend.db.routine_db as routine_db
+import backend.services.redis_service as redis_module
+from backend.services.redis_service import redis_service, get_latest_event_pointer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat() + "Z"
+
+async def _latest_id(thread_id: str, event_type: str):
+    latest = await get_latest_event_pointer(thread_id, event_type)
+    return latest["event_id"] if latest else None
+
+async def test_pointer_follows_writes():
+    """The pointer holds the newest event of each type, whatever order they are written in."""
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    thread_id = f"test_latest_{uuid.uuid4().hex[:8]}"
+    now = datetime.utcnow().replace(microsecond=0)
+    newest = await routine_db.add_event(thread_id, "sleep", _iso(now - timedelta(hours=1)), local_id="s2")
+    await routine_db.add_event(thread_id, "sleep", _iso(now - timedelta(hours=3)), local_id="s1")
+    feeding = await routine_db.add_event(thread_id, "feeding", _iso(now), local_id="f1")
+
+    assert await _latest_id(thread_id, "sleep") == newest["event_id"]
+    assert await _latest_id(thread_id, "feeding") == feeding["event_id"]
+    assert (await routine_db.get_latest_event(thread_id, "sleep"))["local_id"] == "s2"
+    logger.info("✓ Latest pointer write test passed")
+
+async def test_delete_repoints_to_newest_remaining():
+    """Deleting the latest event moves the pointer to the next newest event of its type, then clears it."""
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    thread_id = f"test_repoint_{uuid.uuid4().hex[:8]}"
+    now = datetime.utcnow().replace(microsecond=0)
+    sleeps = []
+    for hours in (5, 3, 1):
+        sleeps.append(await routine_db.add_event(thread_id, "sleep", _iso(now - timedelta(hours=hours)), local_id=f"s{hours}"))
+        # Newer events of another type sit between them in the time index
+        await routine_db.add_event(thread_id, "feeding", _iso(now - timedelta(hours=hours - 0.5)), local_id=f"f{hours}")
+    oldest, middle, newest = sleeps
+
+    # Deleting an event that isn't the latest leaves the pointer alone
+    assert await routine_db.delete_event(thread_id, "sleep", middle["event_id"])
+    assert await _latest_id(thread_id, "sleep") == newest["event_id"]
+
+    assert await routine_db.delete_event(thread_id, "sleep", newest["event_id"])
+    latest = await get_latest_event_pointer(thread_id, "sleep")
+    assert latest["event_id"] == oldest["event_id"] and latest["local_id"] == "s5"
+    assert await _latest_id(thread_id, "feeding") is not None
+
+    assert await routine_db.delete_event(thread_id, "sleep", oldest["event_id"])
+    assert await get_latest_event_pointer(thread_id, "sleep") is None
+    assert await routine_db.get_latest_event(thread_id, "sleep") is None
+    logger.info("✓ Latest pointer repoint test passed")
+
+async def test_repoint_pages_through_the_time_index():
+    """The replacement is found past the first page of newer events of other types."""
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    thread_id = f"test_repoint_pages_{uuid.uuid4().hex[:8]}"
+    now = datetime.utcnow().replace(microsecond=0)
+    older = await routine_db.add_event(thread_id, "sleep", _iso(now - timedelta(hours=10)), local_id="s-old")
+    for minutes in range(7):
+        await routine_db.add_event(thread_id, "feeding", _iso(now - timedelta(hours=5, minutes=minutes)), local_id=f"f{minutes}")
+    newest = await routine_db.add_event(thread_id, "sleep", _iso(now), local_id="s-new")
+
+    page_size = redis_module.LATEST_REPOINT_PAGE_SIZE
+    redis_module.LATEST_REPOINT_PAGE_SIZE = 3
+    try:
+        assert await routine_db.delete_event(thread_id, "sleep", newest["event_id"])
+    finally:
+        redis_module.LATEST_REPOINT_PAGE_SIZE = page_size
+    assert await _latest_id(thread_id, "sleep") == older["event_id"]
+    logger.info("✓ Paged repoint test passed")
+
+async def main():
+    await test_pointer_follows_writes()
+    await test_delete_repoints_to_newest_remaining()
+    await test_repoint_pages_through_the_time_index()
+
+if __name__ == "__main__":
+    asyncio.run(main())
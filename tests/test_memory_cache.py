@@ -0,0 +1,73 @@
+"""
+Test the bounded LRU memory cache used as the Redis fallback.
+"""
+
+import os
+import sys
+import time
+import logging
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.memory_cache import MemoryCache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_evicts_least_recently_used():
+    """Reading a key protects it from eviction once the entry budget is hit."""
+    cache = MemoryCache(max_entries=2)
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache.get("a") == 1
+    cache["c"] = 3
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert cache.stats()["evictions"] == 1
+    logger.info("✓ LRU eviction test passed")
+
+def test_byte_budget():
+    """Large values push older entries out of the byte budget."""
+    cache = MemoryCache(max_entries=100, max_bytes=250)
+    cache.set("small", "x" * 10)
+    cache.set("big", {"payload": "y" * 200})
+    cache.set("bigger", {"payload": "z" * 200})
+    assert "small" not in cache and "big" not in cache
+    assert cache.stats()["bytes"] <= 250
+    logger.info("✓ Byte budget test passed")
+
+def test_ttl_expiry():
+    """Entries written with a TTL disappear once it has passed."""
+    cache = MemoryCache()
+    cache.set("short", "value", ttl=0.05)
+    cache.set("forever", "value")
+    assert cache.get("short") == "value"
+    time.sleep(0.06)
+    assert cache.get("short") is None
+    assert cache.get("forever") == "value"
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    logger.info("✓ TTL expiry test passed")
+
+def test_dict_operations():
+    """The cache supports the dict operations the fallback paths use."""
+    cache = MemoryCache()
+    index = cache.setdefault("index", {})
+    index["local-1"] = "event:1"
+    assert cache.setdefault("index", {}) == {"local-1": "event:1"}
+    assert cache.pop("index") == {"local-1": "event:1"}
+    assert cache.pop("index", None) is None
+    cache["k"] = "v"
+    del cache["k"]
+    assert len(cache) == 0
+    logger.info("✓ Dict operations test passed")
+
+if __name__ == "__main__":
+    test_evicts_least_recently_used()
+    test_byte_budget()
+    test_ttl_expiry()
+    test_dict_operations()
@@ -0,0 +1,74 @@
+"""
+Test the routine pattern engine computations.
+"""
+
+import os
+import sys
+import logging
+from datetime import datetime
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.pattern_engine import (
+    HOURS_PER_WEEK, SLEEP_DURATION_BUCKETS, hour_of_week, duration_bucket, duration_histogram,
+    encode_histogram, decode_histogram, histogram_delta, rotate_hours, summarize_hours, summarize_durations
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_hour_of_week_slots():
+    """Monday 00:00 is slot 0 and Sunday 23:00 is the last slot."""
+    assert hour_of_week(datetime(2025, 3, 10, 0, 30)) == 0  # Monday
+    assert hour_of_week(datetime(2025, 3, 11, 14, 0)) == 24 + 14
+    assert hour_of_week(datetime(2025, 3, 16, 23, 59)) == HOURS_PER_WEEK - 1
+    logger.info("✓ Hour of week test passed")
+
+def test_duration_buckets():
+    """Bucket bounds are exclusive and the last bucket is open-ended."""
+    assert duration_bucket(0) == 0
+    assert duration_bucket(29.9) == 0
+    assert duration_bucket(30) == 1
+    assert duration_bucket(10 * 60 * 24) == SLEEP_DURATION_BUCKETS - 1
+    counts = duration_histogram([10, 45, 50, 800])
+    assert sum(counts) == 4 and counts[1] == 2
+    assert decode_histogram(encode_histogram(counts)) == counts
+    assert decode_histogram(None) == [0] * SLEEP_DURATION_BUCKETS
+    assert decode_histogram("1,2") == [0] * SLEEP_DURATION_BUCKETS
+    assert histogram_delta([1, 2, 0], [1, 0, 3]) == {1: -2, 2: 3}
+    logger.info("✓ Duration bucket test passed")
+
+def test_local_time_rotation():
+    """A 05:00 UTC Monday event is at 07:00 in UTC+2 and wraps to Sunday 23:00 in UTC-6."""
+    counts = [0] * HOURS_PER_WEEK
+    counts[5] = 4
+    assert rotate_hours(counts, 120)[7] == 4
+    assert rotate_hours(counts, -180)[2] == 4
+    assert rotate_hours(counts, -360)[HOURS_PER_WEEK - 1] == 4
+    assert sum(rotate_hours(counts, 330)) == 4
+    logger.info("✓ Local time rotation test passed")
+
+def test_summaries():
+    """Peak hours fold the week to hours of the day; empty arrays summarize cleanly."""
+    counts = [0] * HOURS_PER_WEEK
+    for day in range(7):
+        counts[day * 24 + 13] += 2
+        counts[day * 24 + 19] += 1
+    summary = summarize_hours(counts)
+    assert summary["total_events"] == 21
+    assert [peak["hour"] for peak in summary["peak_hours"]] == [13, 19]
+    assert summary["day_of_week"]["sunday"] == 3
+    assert summarize_hours([0] * HOURS_PER_WEEK)["peak_hours"] == []
+    durations = summarize_durations(duration_histogram([70, 80, 200]))
+    assert durations["most_common"] == "60-90m" and durations["total_periods"] == 3
+    assert summarize_durations([0] * SLEEP_DURATION_BUCKETS)["most_common"] is None
+    logger.info("✓ Summary test passed")
+
+if __name__ == "__main__":
+    test_hour_of_week_slots()
+    test_duration_buckets()
+    test_local_time_rotation()
+    test_summaries()
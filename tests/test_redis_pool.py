@@ -0,0 +1,98 @@
+"""
+Test the metered Redis connection pool on fakeredis connections: waits are
+counted only when every connection is in use, connect time is not part of
+the wait, and an exhausted pool raises PoolExhaustedError without counting
+as a Redis outage.
+"""
+
+import os
+import sys
+import logging
+import asyncio
+
+import fakeredis
+import redis
+from fakeredis.aioredis import FakeAsyncRedisConnection
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.redis_service import MeteredConnectionPool, PoolExhaustedError, _is_outage
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class SlowConnection(FakeAsyncRedisConnection):
+    """A fake connection that takes 100ms to connect."""
+
+    async def connect(self):
+        if not self.is_connected:
+            await asyncio.sleep(0.1)
+        await super().connect()
+
+def _pool(max_connections: int, connection_class=FakeAsyncRedisConnection) -> MeteredConnectionPool:
+    return MeteredConnectionPool(
+        connection_class=connection_class,
+        server=fakeredis.FakeServer(),
+        max_connections=max_connections,
+        timeout=0.2,
+        decode_responses=True
+    )
+
+async def test_connect_time_is_not_a_wait():
+    """Taking a free or new connection is not a wait, however long connecting takes."""
+    pool = _pool(2, SlowConnection)
+    client = redis.asyncio.Redis(connection_pool=pool)
+    await asyncio.gather(client.set("a", 1), client.set("b", 2))
+    assert await client.get("a") == "1"
+
+    stats = pool.stats()
+    assert stats["created"] == 2 and stats["acquired"] == 3
+    assert stats["waited"] == 0 and stats["max_waiting"] == 0
+    assert stats["avg_wait_ms"] is None
+    await client.aclose()
+    logger.info("✓ Connect time test passed")
+
+async def test_exhausted_pool_waits_and_times_out():
+    """Callers wait while every connection is in use and give up after the pool timeout."""
+    pool = _pool(1)
+    client = redis.asyncio.Redis(connection_pool=pool)
+    await client.set("a", 1)
+    held = await pool.get_connection("GET")
+
+    try:
+        await client.get("a")
+        assert False, "expected PoolExhaustedError"
+    except PoolExhaustedError as e:
+        # Local saturation doesn't open the circuit breaker
+        assert not _is_outage(e)
+    stats = pool.stats()
+    assert stats["wait_timeouts"] == 1 and stats["waited"] == 1
+    assert stats["in_use"] == 1 and stats["waiting"] == 0
+
+    async def release_later():
+        await asyncio.sleep(0.05)
+        await pool.release(held)
+    release = asyncio.create_task(release_later())
+    waiters = [asyncio.create_task(client.get("a")) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    assert pool.stats()["waiting"] == 3
+    assert await asyncio.gather(*waiters) == ["1", "1", "1"]
+    await release
+
+    stats = pool.stats()
+    assert stats["max_waiting"] == 3 and stats["waiting"] == 0
+    assert stats["waited"] == 4 and stats["wait_timeouts"] == 1
+    assert stats["created"] == 1 and stats["in_use"] == 0 and stats["idle"] == 1
+    assert stats["avg_wait_ms"] >= 50
+    await client.aclose()
+    logger.info("✓ Pool exhaustion test passed")
+
+async def main():
+    await test_connect_time_is_not_a_wait()
+    await test_exhausted_pool_waits_and_times_out()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+"""
+Test the SQLite routine tracker on its pooled engine, with the routine
+caches on fakeredis, and check get_events_by_date_range against the
+self-join and OR-of-ranges queries it used before.
+"""
+
+import os
+import sys
+import logging
+import random
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+
+import fakeredis
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import backend.db.routine_tracker as routine_tracker
+from backend.db.sqlite_engine import AsyncSQLiteEngine
+from backend.db.routine_queries import create_schema
+from backend.services.redis_service import redis_service, get_cached_recent_events
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LEGACY_SLEEP_SQL = '''
+SELECT e1.id, e1.thread_id, e1.event_type, e1.start_time, MIN(e2.start_time) as end_time, e1.notes
+FROM routine_events e1
+LEFT JOIN routine_events e2 ON
+    e2.thread_id = e1.thread_id AND e2.event_type = 'sleep_end' AND e2.start_time > e1.start_time
+WHERE e1.thread_id = ? AND e1.event_type = 'sleep' AND e1.start_time >= ? AND e1.start_time <= ?
+GROUP BY e1.id
+ORDER BY e1.start_time ASC
+'''
+
+LEGACY_RANGE_SQL = '''
+SELECT * FROM routine_events
+WHERE thread_id = ? AND
+(
+    (start_time >= ? AND start_time <= ?) OR
+    (end_time >= ? AND end_time <= ?) OR
+    (start_time <= ? AND (end_time >= ? OR end_time IS NULL))
+)
+'''
+
+def _use_temp_engine() -> AsyncSQLiteEngine:
+    engine = AsyncSQLiteEngine(os.path.join(tempfile.mkdtemp(), "routine_tracker.db"))
+    engine.submit(create_schema).result()
+    routine_tracker._engine = engine
+    return engine
+
+async def test_add_and_get_event():
+    """An event added on the pool is read back, cached per range, and the cache dropped on the next write."""
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    engine = _use_temp_engine()
+    try:
+        start = datetime(2025, 1, 6, 8, 0)
+        event_id = await routine_tracker.add_event("thread-a", "feeding", start, start + timedelta(minutes=20), "bottle")
+        assert event_id
+
+        day_start, day_end = datetime(2025, 1, 6), datetime(2025, 1, 7)
+        events = await routine_tracker.get_events_by_date_range("thread-a", day_start, day_end, "feeding")
+        assert [(event["id"], event["start_time"], event["notes"]) for event in events] == [(event_id, start, "bottle")]
+
+        window = f"{day_start.isoformat()}/{day_end.isoformat()}"
+        assert len(await get_cached_recent_events("thread-a", "feeding", window)) == 1
+        # Another range is not answered from the cached one
+        assert await get_cached_recent_events("thread-a", "feeding", "2025-01-01T00:00:00/2025-01-02T00:00:00") is None
+        assert await routine_tracker.get_events_by_date_range("thread-a", datetime(2025, 1, 1), datetime(2025, 1, 2), "feeding") == []
+
+        await routine_tracker.add_event("thread-a", "feeding", start + timedelta(hours=3))
+        assert await get_cached_recent_events("thread-a", "feeding", window) is None
+        assert len(await routine_tracker.get_events_by_date_range("thread-a", day_start, day_end, "feeding")) == 2
+    finally:
+        engine.close()
+    logger.info("✓ Routine tracker add/get test passed")
+
+def _insert_random_events(engine: AsyncSQLiteEngine, thread_id: str, count: int = 400) -> None:
+    """Back-to-back sleeps, shared timestamps and open-ended events."""
+    random.seed(11)
+    current = datetime(2025, 3, 1)
+    rows = []
+    for index in range(count):
+        current += timedelta(minutes=random.choice([0, 15, 45, 90, 180]))
+        event_type = random.choice(["sleep", "sleep", "sleep_end", "feeding", "diaper"])
+        end_time = (current + timedelta(minutes=20)).isoformat() if event_type == "feeding" and random.random() < 0.5 else None
+        rows.append((thread_id, event_type, current.isoformat(), end_time, f"note {index}"))
+    def insert(conn):
+        conn.executemany(
+            "INSERT INTO routine_events (thread_id, event_type, start_time, end_time, notes) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+    engine.submit(insert).result()
+
+def _legacy_events(engine: AsyncSQLiteEngine, thread_id: str, start: datetime, end: datetime, event_type):
+    """Rows the previous queries returned for the range, as get_events_by_date_range returns them."""
+    start_iso, end_iso = start.isoformat(), end.isoformat()
+    if event_type == "sleep":
+        sql, params = LEGACY_SLEEP_SQL, [thread_id, start_iso, end_iso]
+    else:
+        sql, params = LEGACY_RANGE_SQL, [thread_id, start_iso, end_iso, start_iso, end_iso, start_iso, start_iso]
+        if event_type:
+            sql += " AND event_type = ?"
+            params.append(event_type)
+        sql += " ORDER BY start_time ASC"
+    def query(conn):
+        cursor = conn.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    events = engine.submit(query).result()
+    for event in events:
+        event["start_time"] = datetime.fromisoformat(event["start_time"])
+        if event.get("end_time"):
+            event["end_time"] = datetime.fromisoformat(event["end_time"])
+    return events
+
+async def test_date_range_matches_previous_queries():
+    """get_events_by_date_range returns the same events as the previous queries."""
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    engine = _use_temp_engine()
+    try:
+        _insert_random_events(engine, "thread-b")
+        _insert_random_events(engine, "thread-c")
+        ranges = [
+            (datetime(2025, 3, 1), datetime(2025, 3, 5)),
+            (datetime(2025, 3, 10, 6), datetime(2025, 3, 12, 18, 30)),
+            (datetime(2025, 3, 20), datetime(2025, 6, 1))
+        ]
+        for start, end in ranges:
+            for event_type in ("sleep", "feeding", "diaper", None):
+                expected = _legacy_events(engine, "thread-b", start, end, event_type)
+                actual = await routine_tracker.get_events_by_date_range("thread-b", start, end, event_type)
+                key = lambda event: (event["start_time"], event["id"])
+                assert sorted(actual, key=key) == sorted(expected, key=key), f"{event_type} events differ for {start}..{end}"
+                assert [event["start_time"] for event in actual] == sorted(event["start_time"] for event in actual)
+                assert all(event["thread_id"] == "thread-b" for event in actual)
+    finally:
+        engine.close()
+    logger.info("✓ Date range comparison test passed")
+
+async def main():
+    await test_add_and_get_event()
+    await test_date_range_matches_previous_queries()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+Test single-flight coalescing of concurrent identical loads.
+"""
+
+import os
+import sys
+import asyncio
+import logging
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.single_flight import SingleFlight
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def _check_concurrent_callers_share_one_load():
+    group = SingleFlight("test")
+    runs = 0
+
+    async def load():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return {"value": runs}
+
+    results = await asyncio.gather(*(group.do("thread-1", load) for _ in range(5)))
+    assert runs == 1
+    assert all(result == {"value": 1} for result in results)
+    results[0]["value"] = 99
+    assert results[1]["value"] == 1, "Coalesced callers must not share a mutable result"
+    assert group.stats()["coalesced"] == 4 and group.stats()["in_flight"] == 0
+
+    # Different keys and later calls run their own loads
+    await asyncio.gather(group.do("thread-1", load), group.do("thread-2", load))
+    assert runs == 3
+
+async def _check_cancelled_caller_does_not_cancel_load():
+    group = SingleFlight("test")
+
+    async def load():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    first = asyncio.ensure_future(group.do("key", load))
+    second = asyncio.ensure_future(group.do("key", load))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == "done"
+
+async def _check_errors_reach_every_caller():
+    group = SingleFlight("test")
+
+    async def load():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(group.do("key", load), group.do("key", load), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_concurrent_callers_share_one_load():
+    asyncio.run(_check_concurrent_callers_share_one_load())
+    logger.info("✓ Coalescing test passed")
+
+def test_cancelled_caller_does_not_cancel_load():
+    asyncio.run(_check_cancelled_caller_does_not_cancel_load())
+    logger.info("✓ Cancellation test passed")
+
+def test_errors_reach_every_caller():
+    asyncio.run(_check_errors_reach_every_caller())
+    logger.info("✓ Error propagation test passed")
+
+if __name__ == "__main__":
+    test_concurrent_callers_share_one_load()
+    test_cancelled_caller_does_not_cancel_load()
+    test_errors_reach_every_caller()
@@ -0,0 +1,94 @@
+"""
+Test the sleep pairing engine used by routine summaries.
+"""
+
+import os
+import sys
+import random
+import logging
+from datetime import datetime, timedelta
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.sleep_pairing import pair_sleep_events
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NOW = datetime(2025, 3, 10, 12, 0)
+
+def _event(event_type, when, local_id):
+    return (when, {"event_type": event_type, "event_time": when.isoformat(), "local_id": local_id})
+
+def _reference_pairs(starts, ends):
+    """Closest-unused-end-within-24h matching, checked start by start."""
+    used = set()
+    pairs = []
+    for start_time, start_event in sorted(starts, key=lambda item: item[0]):
+        best = None
+        for index, (end_time, _) in enumerate(ends):
+            if index in used or end_time <= start_time:
+                continue
+            if end_time - start_time < timedelta(days=1) and (best is None or end_time < ends[best][0]):
+                best = index
+        if best is not None:
+            used.add(best)
+            pairs.append((start_event["local_id"], ends[best][1]["local_id"]))
+    return pairs
+
+def test_pairs_closest_end():
+    """A start takes the closest following end; the other end becomes virtual."""
+    starts = [_event("sleep", NOW - timedelta(hours=10), "s1")]
+    ends = [_event("sleep_end", NOW - timedelta(hours=8), "e1"), _event("sleep_end", NOW - timedelta(hours=1), "e2")]
+    periods, total = pair_sleep_events(starts, ends, NOW - timedelta(days=1), NOW)
+    assert periods[0]["start_id"] == "s1" and periods[0]["end_id"] == "e1"
+    assert periods[0]["duration"] == 2.0
+    assert periods[1]["is_virtual"] and periods[1]["end_id"] == "e2"
+    assert abs(total - 4.0) < 1e-9
+    logger.info("✓ Closest end pairing test passed")
+
+def test_ongoing_and_stale_starts():
+    """Recent unpaired starts are ongoing; starts older than 12 hours are dropped."""
+    starts = [_event("sleep", NOW - timedelta(hours=30), "old"), _event("sleep", NOW - timedelta(hours=1), "recent")]
+    periods, _ = pair_sleep_events(starts, [], NOW - timedelta(days=2), NOW)
+    assert [p["start_id"] for p in periods] == ["recent"]
+    assert periods[0]["is_ongoing"] and periods[0]["end"] is None
+    logger.info("✓ Ongoing sleep test passed")
+
+def test_end_beyond_24_hours_is_not_paired():
+    """An end more than 24 hours after the start stays unpaired."""
+    starts = [_event("sleep", NOW - timedelta(hours=40), "s1")]
+    ends = [_event("sleep_end", NOW - timedelta(hours=10), "e1")]
+    periods, _ = pair_sleep_events(starts, ends, NOW - timedelta(hours=11), NOW)
+    assert len(periods) == 1 and periods[0]["is_virtual"]
+    assert periods[0]["duration"] == 1.0, "Virtual start should be clamped to the window start"
+    logger.info("✓ 24 hour limit test passed")
+
+def test_matches_reference_on_random_events():
+    """The sweep gives the same pairs as the nested-loop matcher."""
+    rng = random.Random(7)
+    for _ in range(50):
+        starts, ends = [], []
+        for i in range(rng.randint(0, 60)):
+            when = NOW - timedelta(minutes=rng.randint(0, 7 * 24 * 60))
+            if rng.random() < 0.5:
+                starts.append(_event("sleep", when, f"s{i}"))
+            else:
+                ends.append(_event("sleep_end", when, f"e{i}"))
+        ends.sort(key=lambda item: item[0])
+        periods, _ = pair_sleep_events(starts, ends, datetime.min, NOW, include_ongoing=False)
+        pairs = [(p["start_id"], p["end_id"]) for p in periods if not p.get("is_virtual")]
+        assert pairs == _reference_pairs(starts, ends)
+        virtual_ids = sorted(p["end_id"] for p in periods if p.get("is_virtual"))
+        paired_ids = {end_id for _, end_id in pairs}
+        assert virtual_ids == sorted(e["local_id"] for _, e in ends if e["local_id"] not in paired_ids)
+    logger.info("✓ Reference equivalence test passed")
+
+if __name__ == "__main__":
+    test_pairs_closest_end()
+    test_ongoing_and_stale_starts()
+    test_end_beyond_24_hours_is_not_paired()
+    test_matches_reference_on_random_events()
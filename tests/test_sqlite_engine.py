@@ -0,0 +1,91 @@
+"""
+Test the async SQLite engine: pragmas, transactions and running queries
+off the event loop.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.db.sqlite_engine import AsyncSQLiteEngine
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _engine(pool_size: int = 2) -> AsyncSQLiteEngine:
+    engine = AsyncSQLiteEngine(os.path.join(tempfile.mkdtemp(), "test.db"), pool_size)
+    engine.submit(lambda conn: conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")).result()
+    return engine
+
+def test_pragmas():
+    """Connections use WAL and the configured synchronous level."""
+    engine = _engine()
+    try:
+        assert engine.submit(lambda conn: conn.execute("PRAGMA journal_mode").fetchone()[0]).result() == "wal"
+        # NORMAL is 1
+        assert engine.submit(lambda conn: conn.execute("PRAGMA synchronous").fetchone()[0]).result() == 1
+    finally:
+        engine.close()
+    logger.info("✓ Pragma test passed")
+
+def test_queries_and_rollback():
+    """Statements commit; a failing unit of work leaves nothing behind."""
+    engine = _engine()
+
+    def insert_then_fail(conn):
+        conn.execute("INSERT INTO items (name) VALUES (?)", ("lost",))
+        raise ValueError("boom")
+
+    async def run():
+        row_id, count = await engine.execute("INSERT INTO items (name) VALUES (?)", ("bottle",))
+        assert row_id == 1 and count == 1
+        try:
+            await engine.run(insert_then_fail)
+            assert False, "Expected the error to propagate"
+        except ValueError:
+            pass
+        assert await engine.fetchall("SELECT name FROM items") == [{"name": "bottle"}]
+        assert await engine.fetchone("SELECT name FROM items WHERE id = ?", (5,)) is None
+
+    try:
+        asyncio.run(run())
+    finally:
+        engine.close()
+    logger.info("✓ Query and rollback test passed")
+
+def test_does_not_block_event_loop():
+    """A slow query leaves the event loop free to run other tasks."""
+    engine = _engine()
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await engine.run(lambda conn: time.sleep(0.2))
+        task.cancel()
+        return ticks
+
+    try:
+        assert asyncio.run(run()) >= 5
+    finally:
+        engine.close()
+    logger.info("✓ Event loop test passed")
+
+if __name__ == "__main__":
+    test_pragmas()
+    test_queries_and_rollback()
+    test_does_not_block_event_loop()
@@ -0,0 +1,159 @@
+"""
+Test the stale-while-revalidate summary cache in routine_db.get_summary
+and the summary endpoint's ETags against fakeredis (with Lua support).
+"""
+
+import os
+import sys
+import json
+import uuid
+import logging
+import asyncio
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+
+import fakeredis
+from starlette.requests import Request
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import backend.api.index as index
+import backend.db.routine_db as routine_db
+from backend.api.index import direct_get_summary
+from backend.services.redis_service import redis_service
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def test_cached_summary_revalidates_once():
+    """Calls inside the TTL return the cached summary; a stale one is rebuilt once in the background."""
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    thread_id = f"test_summary_{uuid.uuid4().hex[:8]}"
+    await routine_db.add_event(thread_id, "feeding", datetime.utcnow().isoformat() + "Z", local_id="f1")
+
+    builds = []
+    generate = routine_db._generate_summary
+    async def counting_generate(*args, **kwargs):
+        builds.append(args)
+        return await generate(*args, **kwargs)
+    routine_db._generate_summary = counting_generate
+    try:
+        first = await routine_db.get_summary(thread_id, "day")
+        second = await routine_db.get_summary(thread_id, "day")
+        assert len(builds) == 1
+        assert second["cache"]["status"] == "fresh"
+        assert second["routines"]["feeding"]["total_events"] == first["routines"]["feeding"]["total_events"] == 1
+        assert not routine_db._revalidations
+
+        # A write marks the summary stale: it is still served, and rebuilt once
+        await routine_db.add_event(thread_id, "feeding", datetime.utcnow().isoformat() + "Z", local_id="f2")
+        stale = await routine_db.get_summary(thread_id, "day")
+        again = await routine_db.get_summary(thread_id, "day")
+        assert stale["cache"]["status"] == again["cache"]["status"] == "stale"
+        assert stale["routines"]["feeding"]["total_events"] == 1
+        assert list(routine_db._revalidations) == [f"{thread_id}:day"]
+        await asyncio.gather(*routine_db._revalidations.values())
+        assert len(builds) == 2
+
+        fresh = await routine_db.get_summary(thread_id, "day")
+        assert fresh["cache"]["status"] == "fresh"
+        assert fresh["routines"]["feeding"]["total_events"] == 2
+        assert len(builds) == 2
+
+        # With Redis down the in-process fallback entry is served; each caller
+        # still gets its own copy to mark
+        redis_service._client = None
+        redis_service._listener_task.cancel()
+        await asyncio.sleep(0)
+        first_fallback = await routine_db.get_summary(thread_id, "day")
+        second_fallback = await routine_db.get_summary(thread_id, "day")
+        assert first_fallback is not second_fallback
+        assert first_fallback["routines"]["feeding"]["total_events"] == 2
+    finally:
+        routine_db._generate_summary = generate
+    logger.info("✓ Summary cache revalidation test passed")
+
+def _request(etag: str = None) -> Request:
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/api/routines/summary", "headers": headers})
+
+async def test_summary_etag_follows_event_version():
+    """A matching If-None-Match gets a 304 until the thread's events change."""
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    thread_id = f"test_etag_{uuid.uuid4().hex[:8]}"
+    await routine_db.add_event(thread_id, "feeding", datetime.utcnow().isoformat() + "Z", local_id="f1")
+
+    first = await direct_get_summary(thread_id, _request(), "day")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and etag
+    assert (await direct_get_summary(thread_id, _request(etag), "day")).status_code == 304
+    # Another period has its own ETag
+    assert (await direct_get_summary(thread_id, _request(etag), "week")).status_code == 200
+
+    await routine_db.add_event(thread_id, "feeding", datetime.utcnow().isoformat() + "Z", local_id="f2")
+    assert (await direct_get_summary(thread_id, _request(etag), "day")).status_code == 200
+    await asyncio.gather(*routine_db._revalidations.values())
+    changed = await direct_get_summary(thread_id, _request(etag), "day")
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    logger.info("✓ Summary ETag test passed")
+
+async def test_stale_summary_keeps_its_etag():
+    """A stale summary served after a write carries the ETag of the version it was built from."""
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    thread_id = f"test_stale_etag_{uuid.uuid4().hex[:8]}"
+    await routine_db.add_event(thread_id, "feeding", datetime.utcnow().isoformat() + "Z", local_id="f1")
+    old_etag = (await direct_get_summary(thread_id, _request(), "day")).headers["etag"]
+
+    await routine_db.add_event(thread_id, "feeding", datetime.utcnow().isoformat() + "Z", local_id="f2")
+    stale = await direct_get_summary(thread_id, _request(), "day")
+    assert json.loads(stale.body)["summary"]["routines"]["feeding"]["total_events"] == 1
+    assert stale.headers["etag"] == old_etag
+    # Revalidating with the stale copy's ETag is not answered with a 304
+    assert (await direct_get_summary(thread_id, _request(old_etag), "day")).status_code == 200
+
+    await asyncio.gather(*routine_db._revalidations.values())
+    updated = await direct_get_summary(thread_id, _request(old_etag), "day")
+    assert updated.status_code == 200
+    assert json.loads(updated.body)["summary"]["routines"]["feeding"]["total_events"] == 2
+    assert updated.headers["etag"] != old_etag
+    assert (await direct_get_summary(thread_id, _request(updated.headers["etag"]), "day")).status_code == 304
+    logger.info("✓ Stale summary ETag test passed")
+
+async def test_open_sleep_etag_rolls_over():
+    """While a sleep is open the summary ETag changes with the clock window; once it ends it doesn't."""
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    thread_id = f"test_sleep_etag_{uuid.uuid4().hex[:8]}"
+    now = datetime.utcnow()
+    await routine_db.add_event(thread_id, "sleep", (now - timedelta(minutes=30)).isoformat() + "Z", local_id="s1")
+
+    clock = [1_000_000.0]
+    real_time = index.time
+    index.time = SimpleNamespace(time=lambda: clock[0])
+    try:
+        etag = (await direct_get_summary(thread_id, _request(), "day")).headers["etag"]
+        assert (await direct_get_summary(thread_id, _request(etag), "day")).status_code == 304
+        clock[0] += index.SUMMARY_ETAG_WINDOW_SECONDS
+        assert (await direct_get_summary(thread_id, _request(etag), "day")).status_code == 200
+
+        await routine_db.add_event(thread_id, "sleep_end", now.isoformat() + "Z", local_id="e1")
+        await direct_get_summary(thread_id, _request(), "day")
+        await asyncio.gather(*routine_db._revalidations.values())
+        etag = (await direct_get_summary(thread_id, _request(), "day")).headers["etag"]
+        clock[0] += index.SUMMARY_ETAG_WINDOW_SECONDS
+        assert (await direct_get_summary(thread_id, _request(etag), "day")).status_code == 304
+    finally:
+        index.time = real_time
+    logger.info("✓ Open sleep ETag test passed")
+
+async def main():
+    await test_cached_summary_revalidates_once()
+    await test_summary_etag_follows_event_version()
+    await test_stale_summary_keeps_its_etag()
+    await test_open_sleep_etag_rolls_over()
+
+if __name__ == "__main__":
+    asyncio.run(main())
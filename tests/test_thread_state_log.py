@@ -0,0 +1,124 @@
+"""
+Test the thread state layout helpers: which messages and fields a save
+sends, and how a stored state is rebuilt; and, on fakeredis, that loaded
+states keep their old shape while saves still append.
+"""
+
+import os
+import sys
+import json
+import uuid
+import asyncio
+import logging
+
+import fakeredis
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.services.thread_state_log import (
+    APPEND, REPLACE, MESSAGE_COUNT_FIELD,
+    state_keys, encode_fields, field_digests, plan_save, decode_state
+)
+from backend.services.redis_service import redis_service
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class _Message:
+    def __init__(self, type, content):
+        self.type = type
+        self.content = content
+
+def _stored_state():
+    fields = encode_fields({"context": {"baby_age": 4}, "domain": "sleep"})
+    fields[MESSAGE_COUNT_FIELD] = "5"
+    messages = [json.dumps({"type": "human", "content": "hi"}), json.dumps({"type": "ai", "content": "hello"})]
+    state, loaded = decode_state(fields, messages)
+    return fields, state, loaded
+
+def test_decode_state():
+    """Loaded states hold only their fields and messages; the checkpoint has the stored count."""
+    _, state, loaded = _stored_state()
+    assert state["context"] == {"baby_age": 4} and state["domain"] == "sleep"
+    assert len(state["messages"]) == 2
+    assert set(state) == {"context", "domain", "messages"}
+    assert loaded[:2] == (5, 2)
+    assert decode_state({}, []) is None
+    logger.info("✓ Decode state test passed")
+
+def test_append_sends_only_new_messages_and_changed_fields():
+    """A turn on a loaded state appends its new messages and writes only changed fields."""
+    stored, state, loaded = _stored_state()
+    digests = field_digests({key: value for key, value in stored.items() if key != MESSAGE_COUNT_FIELD})
+    state["messages"].append(_Message("human", "when should she nap?"))
+    state["domain"] = "naps"
+    mode, expected, fields, removed, messages = plan_save(state, encode_fields(state), digests, loaded)
+    assert mode == APPEND and expected == "5"
+    assert list(fields) == ["domain"] and removed == []
+    assert len(messages) == 1 and messages[0].content == "when should she nap?"
+
+    # Without known digests every field is sent, still as an append
+    mode, _, fields, _, messages = plan_save(state, encode_fields(state), None, loaded)
+    assert mode == APPEND and set(fields) == {"context", "domain"} and len(messages) == 1
+
+    # Removed fields are deleted
+    del state["context"]
+    _, _, _, removed, _ = plan_save(state, encode_fields(state), digests, loaded)
+    assert removed == ["context"]
+    logger.info("✓ Append plan test passed")
+
+def test_replace_for_unloaded_or_truncated_states():
+    """States that didn't come from the store, or lost or changed messages, are rewritten."""
+    fresh = {"messages": [_Message("human", "hi")], "context": {}}
+    mode, keep_archive, fields, _, messages = plan_save(fresh, encode_fields(fresh), None, None)
+    assert mode == REPLACE and keep_archive == "0" and len(messages) == 1 and "context" in fields
+
+    _, state, loaded = _stored_state()
+    state["messages"] = state["messages"][:1]
+    mode, keep_archive, _, _, messages = plan_save(state, encode_fields(state), None, loaded)
+    assert mode == REPLACE and keep_archive == "1" and len(messages) == 1
+
+    _, state, loaded = _stored_state()
+    state["messages"][-1] = {"type": "ai", "content": "edited"}
+    mode, _, _, _, messages = plan_save(state, encode_fields(state), None, loaded)
+    assert mode == REPLACE and len(messages) == 2
+    logger.info("✓ Replace plan test passed")
+
+async def _check_round_trip():
+    redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    thread_id = f"test_state_{uuid.uuid4().hex[:8]}"
+    _, messages_key, _ = state_keys(thread_id)
+    state = {"context": {"baby_age": 4}, "messages": [{"type": "human", "content": "hi"}]}
+    assert await redis_service.save_thread_state(thread_id, state)
+    assert set(state) == {"context", "messages"}, "Saving must not add keys to the caller's state"
+
+    for turn in range(2):
+        loaded = await redis_service.get_thread_state(thread_id)
+        assert set(loaded) == {"context", "messages"}
+        loaded["messages"].append({"type": "ai", "content": f"reply {turn}"})
+        # A rewrite would refill the list from the state; an append leaves
+        # the stored messages alone
+        await redis_service._client.lset(messages_key, 0, "marker")
+        assert await redis_service.save_thread_state(thread_id, loaded)
+        assert await redis_service._client.lindex(messages_key, 0) == "marker"
+        assert await redis_service._client.llen(messages_key) == turn + 2
+
+    # A different state for the same thread is rewritten whole
+    await redis_service.save_thread_state(thread_id, {"context": {}, "messages": [{"type": "human", "content": "new"}]})
+    loaded = await redis_service.get_thread_state(thread_id)
+    assert [message["content"] for message in loaded["messages"]] == ["new"]
+    assert set(loaded) == {"context", "messages"}
+
+def test_round_trip_keeps_the_state_shape():
+    """Loaded states have no bookkeeping keys, and saving them again still appends."""
+    asyncio.run(_check_round_trip())
+    logger.info("✓ Round trip test passed")
+
+if __name__ == "__main__":
+    test_decode_state()
+    test_append_sends_only_new_messages_and_changed_fields()
+    test_replace_for_unloaded_or_truncated_states()
+    test_round_trip_keeps_the_state_shape()
@@ -0,0 +1,81 @@
+"""
+Test the per-thread time index against fakeredis (with Lua support): a
+thread written before the index existed is read from its event list once,
+and that read backfills the index, the thread_events_indexed marker and
+the local_id index.
+"""
+
+import os
+import sys
+import uuid
+import logging
+import asyncio
+from datetime import datetime, timedelta
+
+import fakeredis
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import backend.db.routine_db as routine_db
+from backend.services.redis_service import redis_service, RedisKeyPrefix
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat() + "Z"
+
+async def test_new_thread_is_indexed_on_write():
+    """The first event of a thread marks it indexed; reads never scan its event list."""
+    client = redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    thread_id = f"test_index_{uuid.uuid4().hex[:8]}"
+    now = datetime.utcnow().replace(microsecond=0)
+    event = await routine_db.add_event(thread_id, "sleep", _iso(now), local_id="s1")
+
+    assert await client.get(f"{RedisKeyPrefix.THREAD_EVENTS_INDEXED}:{thread_id}") == "1"
+    index_key = f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}"
+    assert await client.zrange(index_key, 0, -1, withscores=True) == [
+        (f"{RedisKeyPrefix.EVENT}:{thread_id}:sleep:{event['event_id']}", float(event["event_ts"]))
+    ]
+    # Reads go through the index, not the event list
+    await client.delete(f"{RedisKeyPrefix.THREAD_EVENTS}:{thread_id}")
+    assert [e["event_id"] for e in await routine_db.get_events(thread_id)] == [event["event_id"]]
+    logger.info("✓ Indexed write test passed")
+
+async def test_unindexed_thread_is_backfilled():
+    """A thread without the index is read from its event list, and the read rebuilds the index."""
+    client = redis_service._client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    thread_id = f"test_backfill_{uuid.uuid4().hex[:8]}"
+    now = datetime.utcnow().replace(microsecond=0)
+    events = [
+        await routine_db.add_event(thread_id, "sleep", _iso(now - timedelta(hours=hours)), local_id=f"s{hours}")
+        for hours in (30, 5, 1)
+    ]
+    index_key = f"{RedisKeyPrefix.THREAD_EVENTS_BY_TIME}:{thread_id}"
+    indexed_key = f"{RedisKeyPrefix.THREAD_EVENTS_INDEXED}:{thread_id}"
+    local_ids_key = f"{RedisKeyPrefix.EVENT_LOCAL_IDS}:{thread_id}"
+    expected_index = await client.zrange(index_key, 0, -1, withscores=True)
+    # Make the thread look like one written before the indexes existed
+    await client.delete(index_key, indexed_key, local_ids_key)
+
+    recent = await routine_db.get_events(thread_id, start_date=now - timedelta(hours=6))
+    assert [e["event_id"] for e in recent] == [e["event_id"] for e in events[1:]]
+
+    assert await client.get(indexed_key) == "1"
+    assert await client.zrange(index_key, 0, -1, withscores=True) == expected_index
+    assert set(await client.hkeys(local_ids_key)) == {"s30", "s5", "s1"}
+
+    # Later reads use the index alone
+    await client.delete(f"{RedisKeyPrefix.THREAD_EVENTS}:{thread_id}")
+    assert [e["event_id"] for e in await routine_db.get_events(thread_id)] == [e["event_id"] for e in events]
+    logger.info("✓ Time index backfill test passed")
+
+async def main():
+    await test_new_thread_is_indexed_on_write()
+    await test_unindexed_thread_is_backfilled()
+
+if __name__ == "__main__":
+    asyncio.run(main())